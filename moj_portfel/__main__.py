@@ -0,0 +1,12 @@
+# coding: utf-8
+"""python -m moj_portfel – wsadowa wycena portfeli (zob. cli.py)."""
+import sys
+from pathlib import Path
+
+# moduły importują się nawzajem płasko (tak jak przy `streamlit run app.py`)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cli import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
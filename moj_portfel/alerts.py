@@ -0,0 +1,212 @@
+# coding: utf-8
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# Alert rules: thresholds compiled to arrays, all evaluated in one vectorized pass
+# ======================================================
+RULE_COLUMNS = ["Ticker", "Field", "Op", "Threshold", "Band"]
+ALERT_COLUMNS = ["Time", "Ticker", "Field", "Op", "Threshold", "Value"]
+FIELDS = ["Price", "PL_Percent", "Trend1w", "Trend1m"]
+TREND_FIELDS = ["Trend1w", "Trend1m"]
+# próg przekroczony, gdy znak * (wartość - próg) > 0
+NUMERIC_OPS = {"above": 1.0, "below": -1.0}
+# trend jako liczba: up = 1, flat = 0, down = -1; "up" = przejście powyżej 0.5, "down" = poniżej -0.5
+TREND_OPS = {"up": (1.0, 0.5), "down": (-1.0, -0.5)}
+TREND_CODES = {"up": 1.0, "flat": 0.0, "down": -1.0}
+# histereza (gdy Band puste): reguła uzbraja się ponownie dopiero po cofnięciu o pasmo
+PRICE_BAND = 0.005  # ułamek progu ceny
+PL_BAND = 0.5  # punkty procentowe
+COOLDOWN = 3600.0  # s – ta sama reguła nie odpala częściej
+LATEST = 100  # ostatnie odpalone alerty trzymane w pamięci (toasty sesji)
+UNSEEN, FIRED, ARMED = -1, 0, 1
+
+
+def rule_ids(rules: pd.DataFrame) -> list[str]:
+    return [f"{t}|{f}|{o}|{x:g}" for t, f, o, x in rules[["Ticker", "Field", "Op", "Threshold"]].itertuples(index=False)]
+
+
+def normalize_rules(rules: pd.DataFrame) -> pd.DataFrame:
+    """Validated, de-duplicated rule frame (RULE_COLUMNS); raises ValueError naming the first bad row."""
+    r = rules.reindex(columns=RULE_COLUMNS).dropna(how="all").reset_index(drop=True)
+    r["Ticker"] = r["Ticker"].fillna("").astype(str).str.strip().str.upper()
+    r["Field"] = r["Field"].fillna("").astype(str).str.strip()
+    r["Op"] = r["Op"].fillna("").astype(str).str.strip().str.lower()
+    r["Threshold"] = pd.to_numeric(r["Threshold"], errors="coerce")
+    r["Band"] = pd.to_numeric(r["Band"], errors="coerce")
+
+    trend = r["Field"].isin(TREND_FIELDS)
+    r.loc[trend, ["Threshold", "Band"]] = [0.0, np.nan]  # reguły trendu nie mają progu
+    bad = (
+        (r["Ticker"] == "")
+        | ~r["Field"].isin(FIELDS)
+        | np.where(trend, ~r["Op"].isin(list(TREND_OPS)), ~r["Op"].isin(list(NUMERIC_OPS)))
+        | r["Threshold"].isna()
+        | (r["Band"] < 0)
+    )
+    if bad.any():
+        row = r[bad].iloc[0]
+        raise ValueError(f"błędna reguła {row['Ticker']!r} {row['Field']!r} {row['Op']!r} {row['Threshold']}")
+    return r.drop_duplicates(subset=RULE_COLUMNS[:4]).reset_index(drop=True)
+
+
+def ticker_values(df: pd.DataFrame) -> pd.DataFrame:
+    """FIELDS per ticker from the valued frame; PL_Percent over all accounts holding the ticker."""
+    g = df.groupby("Ticker", sort=False)
+    out = pd.DataFrame({"Price": g["Price"].first()})
+    purchase = g["PurchaseValue_PLN"].sum(min_count=1).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["PL_Percent"] = np.where(purchase > 0, g["PL_Value_PLN"].sum(min_count=1).to_numpy() / purchase * 100, np.nan)
+    for f in TREND_FIELDS:
+        out[f] = g[f].first().map(TREND_CODES).astype(float)
+    return out
+
+
+class AlertEngine:
+    """Threshold rules on price, P/L % and 1W/1M trend, fired on crossings.
+
+    Rules are compiled to flat arrays (ticker, field, sign, threshold, band) so
+    one evaluation is a gather plus a few comparisons for any number of rules.
+    A rule fires when its condition becomes true while armed, then stays quiet
+    until the value moves back past the band (hysteresis) and at least
+    `cooldown` seconds have passed. Rules and their state live in one JSON
+    file; fired alerts are appended to a JSON-lines log and numbered in
+    memory, so sessions can pick up what fired since they last looked.
+    """
+
+    def __init__(self, path: Path, log: Path, cooldown: float = COOLDOWN):
+        self.path = Path(path)
+        self.log = Path(log)
+        self.cooldown = cooldown
+        self.version = 0  # rośnie przy każdej zmianie listy reguł
+        self.seq = 0  # numer ostatniego odpalonego alertu
+        self._latest: deque[tuple[int, dict]] = deque(maxlen=LATEST)
+        self._lock = threading.Lock()
+        self.rules = pd.DataFrame(columns=RULE_COLUMNS)
+        self._ids: list[str] = []
+        self._state = np.empty(0, dtype=np.int8)
+        self._fired = np.empty(0)
+        self._load()
+
+    # ---------------- storage
+    def _load(self):
+        try:
+            saved = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+            rules = normalize_rules(pd.DataFrame(saved.get("rules", []), columns=RULE_COLUMNS))
+        except Exception:
+            saved, rules = {}, pd.DataFrame(columns=RULE_COLUMNS)
+        self._compile(rules, saved.get("state", {}))
+
+    def _save(self):
+        state = {i: [int(s), float(f)] for i, s, f in zip(self._ids, self._state.tolist(), self._fired.tolist())}
+        data = {"rules": self._records, "state": state}
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception:
+            pass
+
+    def _compile(self, rules: pd.DataFrame, state: dict[str, list]):
+        trend = rules["Field"].isin(TREND_FIELDS).to_numpy()
+        ops = rules["Op"].to_numpy()
+        thr = rules["Threshold"].to_numpy(dtype=float)
+        band = rules["Band"].to_numpy(dtype=float)
+        default_band = np.where(rules["Field"].to_numpy() == "Price", np.abs(thr) * PRICE_BAND, PL_BAND)
+
+        self.rules = rules
+        self._records = rules.astype(object).where(rules.notna(), None).to_dict("records")  # gotowe do zapisu
+        self._ids = rule_ids(rules)
+        self._ticker = rules["Ticker"].to_numpy(dtype=object)
+        self._field = pd.Index(FIELDS).get_indexer(rules["Field"])
+        self._sign = np.where(trend, [TREND_OPS.get(o, (1.0, 0))[0] for o in ops], [NUMERIC_OPS.get(o, 1.0) for o in ops])
+        self._thr = np.where(trend, [TREND_OPS.get(o, (0, 0.0))[1] for o in ops], thr)
+        self._band = np.where(trend, 0.0, np.where(np.isnan(band), default_band, band))
+        # stan przenoszony po identyfikatorze reguły: edycja listy nie uzbraja na nowo pozostałych
+        kept = [state.get(i, (UNSEEN, 0.0)) for i in self._ids]
+        self._state = np.array([s for s, _ in kept], dtype=np.int8)
+        self._fired = np.array([f for _, f in kept], dtype=float)
+
+    def set_rules(self, rules: pd.DataFrame) -> int:
+        """Replace all rules (validated first, nothing changes on error); returns the rule count."""
+        rules = normalize_rules(rules)
+        with self._lock:
+            old = {i: [s, f] for i, s, f in zip(self._ids, self._state.tolist(), self._fired.tolist())}
+            self._compile(rules, old)
+            self._save()
+            self.version += 1
+        return len(rules)
+
+    # ---------------- evaluation
+    def evaluate(self, df: pd.DataFrame, now: float | None = None) -> pd.DataFrame:
+        """Check every rule against the valued frame; returns the alerts fired now (ALERT_COLUMNS)."""
+        now = time.time() if now is None else now
+        values = ticker_values(df)
+        with self._lock:
+            if not self._ids:
+                return pd.DataFrame(columns=ALERT_COLUMNS)
+            rows = values.index.get_indexer(self._ticker)
+            v = np.where(rows >= 0, values.to_numpy(dtype=float)[np.maximum(rows, 0), self._field], np.nan)
+            d = self._sign * (v - self._thr)
+            known = ~np.isnan(d)
+            cond = known & (d > 0)
+
+            state = self._state.copy()
+            first = known & (state == UNSEEN)
+            state[first] = np.where(cond[first], FIRED, ARMED)  # już po drugiej stronie – to nie przejście
+            fire = ~first & cond & (state == ARMED) & (now - self._fired >= self.cooldown)
+            state[fire] = FIRED
+            state[(state == FIRED) & known & (d < -self._band)] = ARMED
+
+            changed = state != self._state
+            self._state = state
+            self._fired[fire] = now
+            idx = np.flatnonzero(fire)
+            alerts = pd.DataFrame(
+                {
+                    "Time": pd.Timestamp.fromtimestamp(now).isoformat(timespec="seconds"),
+                    "Ticker": self._ticker[idx],
+                    "Field": np.array(FIELDS, dtype=object)[self._field[idx]],
+                    "Op": self.rules["Op"].to_numpy()[idx],
+                    "Threshold": self.rules["Threshold"].to_numpy(dtype=float)[idx],
+                    "Value": v[idx],
+                },
+                columns=ALERT_COLUMNS,
+            )
+            # w pamięci i tak zostaje tylko LATEST ostatnich – starszych nie zamieniamy na słowniki
+            first_seq = self.seq + len(alerts) - min(len(alerts), LATEST) + 1
+            self._latest.extend(enumerate(alerts.tail(LATEST).to_dict("records"), first_seq))
+            self.seq += len(alerts)
+            if changed.any():
+                self._save()
+        if len(alerts):
+            self._append_log(alerts)
+        return alerts
+
+    def _append_log(self, alerts: pd.DataFrame):
+        try:
+            with open(self.log, "a", encoding="utf-8") as fh:
+                fh.write(alerts.to_json(orient="records", lines=True, force_ascii=False))
+        except Exception:
+            pass
+
+    def since(self, seq: int) -> tuple[pd.DataFrame, int]:
+        """(alerts fired after number seq that are still held in memory, current number)."""
+        with self._lock:
+            recs = [r for s, r in self._latest if s > seq]
+            return pd.DataFrame(recs, columns=ALERT_COLUMNS), self.seq
+
+    def recent(self, n: int = 20) -> pd.DataFrame:
+        """Last n logged alerts, newest first."""
+        try:
+            with open(self.log, encoding="utf-8") as fh:
+                lines = deque(fh, maxlen=n)
+        except OSError:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        return pd.DataFrame([json.loads(x) for x in reversed(lines) if x.strip()], columns=ALERT_COLUMNS)
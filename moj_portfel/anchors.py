@@ -0,0 +1,114 @@
+# coding: utf-8
+import threading
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from price_store import close_matrix
+
+# ======================================================
+# Trading-day anchors (First1m / First1w) vs intraday last price
+# ======================================================
+# sufiks tickera -> strefa czasowa giełdy; bez sufiksu = USA
+EXCHANGE_TZ = {
+    ".WA": "Europe/Warsaw",
+    ".PL": "Europe/Warsaw",
+    ".DE": "Europe/Berlin",
+    ".F": "Europe/Berlin",
+    ".AS": "Europe/Amsterdam",
+    ".PA": "Europe/Paris",
+    ".MI": "Europe/Rome",
+    ".BR": "Europe/Brussels",
+    ".MC": "Europe/Madrid",
+    ".VI": "Europe/Vienna",
+    ".HE": "Europe/Helsinki",
+    ".LS": "Europe/Lisbon",
+    ".L": "Europe/London",
+    ".SW": "Europe/Zurich",
+    ".ST": "Europe/Stockholm",
+    ".CO": "Europe/Copenhagen",
+    ".OL": "Europe/Oslo",
+    ".PR": "Europe/Prague",
+    ".BD": "Europe/Budapest",
+    ".T": "Asia/Tokyo",
+    ".HK": "Asia/Hong_Kong",
+    ".TO": "America/Toronto",
+    ".AX": "Australia/Sydney",
+}
+DEFAULT_TZ = "America/New_York"
+CRYPTO_SUFFIX = "-USD"  # krypto: handel 24/7, doba liczona w UTC
+
+
+def exchange_tz(ticker: str) -> str:
+    t = ticker.upper()
+    if t.endswith(CRYPTO_SUFFIX):
+        return "UTC"
+    for suffix, tz in EXCHANGE_TZ.items():
+        if t.endswith(suffix):
+            return tz
+    return DEFAULT_TZ
+
+
+def trading_day(ticker: str, now: datetime) -> date:
+    """Exchange-local session date; weekends roll back to Friday (holidays are not modelled)."""
+    day = now.astimezone(ZoneInfo(exchange_tz(ticker))).date()
+    if not ticker.upper().endswith(CRYPTO_SUFFIX):
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+    return day
+
+
+def trading_days(tickers: list[str], now: datetime) -> dict[str, date]:
+    # jedna konwersja na strefę, nie na ticker
+    by_tz: dict[tuple[str, bool], list[str]] = {}
+    for t in tickers:
+        by_tz.setdefault((exchange_tz(t), t.upper().endswith(CRYPTO_SUFFIX)), []).append(t)
+    out = {}
+    for (tz, crypto), group in by_tz.items():
+        day = trading_day(group[0], now)
+        out.update(dict.fromkeys(group, day))
+    return out
+
+
+class AnchorCache:
+    """First1m / First1w per ticker, valid for one trading day of its exchange."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._anchors: dict[str, tuple[date, float, float]] = {}
+
+    def missing(self, tickers: list[str], days: dict[str, date]) -> list[str]:
+        with self._lock:
+            return [t for t in tickers if self._anchors.get(t, (None,))[0] != days[t]]
+
+    def put(self, summary: pd.DataFrame, days: dict[str, date]):
+        rows = zip(summary["Ticker"].tolist(), summary["First1m"].tolist(), summary["First1w"].tolist())
+        with self._lock:
+            for t, first1m, first1w in rows:
+                self._anchors[t] = (days[t], first1m, first1w)
+
+    def get(self, tickers: list[str]) -> pd.DataFrame:
+        with self._lock:
+            values = [self._anchors.get(t, (None, np.nan, np.nan))[1:] for t in tickers]
+        frame = pd.DataFrame(values, columns=["First1m", "First1w"], dtype=float)
+        frame.insert(0, "Ticker", list(tickers))
+        return frame
+
+
+def last_prices(raw: pd.DataFrame | None, tickers: list[str]) -> pd.DataFrame:
+    """Latest non-NaN close per ticker from a small snapshot download (period="1d")."""
+    wide = close_matrix(raw, tickers)
+    if wide.empty:
+        return pd.DataFrame(columns=["Ticker", "Day", "Close"])
+    last = wide.ffill().iloc[-1]
+    day_of_last = wide.notna().iloc[::-1].idxmax()  # znacznik ostatniego słupka z notowaniem
+    frame = pd.DataFrame(
+        {
+            "Ticker": last.index,
+            "Day": pd.DatetimeIndex(day_of_last.reindex(last.index).to_numpy()).strftime("%Y-%m-%d"),
+            "Close": last.to_numpy(dtype=float),
+        }
+    )
+    return frame.dropna(subset=["Close"]).reset_index(drop=True)
@@ -1,23 +1,74 @@
 # coding: utf-8
-import json
+import atexit
+import hashlib
+import os
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Callable
 
-import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-import streamlit.components.v1 as components
-import yfinance as yf
+import streamlit.components.v2 as components
+
+from alerts import FIELDS, NUMERIC_OPS, RULE_COLUMNS, TREND_OPS, AlertEngine
+from anchors import AnchorCache
+from core import EXPORT_COLUMNS, NAME_MAP, Pricer, value_frame
+from export import FORMATS, ExportCache, missing_dependency
+from fx import FxCache, fx_symbols, rates_to
+from history import CloseMatrix, ValueHistory, sync
+from instrumentation import METRICS
+from ledger import ACCOUNTS, KINDS, LEDGER_COLUMNS, Ledger
+from names import NameResolver
+from parsing import PositionParser
+from portfolio_store import DEFAULT_PORTFOLIO, DEFAULT_USER, PortfolioStore
+from price_store import PriceStore
+from providers import PROVIDERS, RECORD_DIR, Provider, make_provider
+from quote_cache import MarketSnapshot, QuoteCache
+from rebalance import (
+    ACCOUNT_COLUMNS,
+    MIN_TRADE,
+    TARGET_COLUMNS,
+    current_targets,
+    default_accounts,
+    rebalance,
+    tracking_error,
+)
+from risk import TRADING_DAYS, ReturnCache, covariance, risk_table, rolling_volatility, simple_returns
+from scheduler import Refresher
+from symbols import SEED_FILE, SymbolIndex, ensure_index
+from table import LIVE_HTML, LIVE_JS, LIVE_STYLE, SORT_COLUMNS, TableFeed, page_count, sort_view
+from valuation import fx_vector
 
 # ======================================================
 # SETTINGS
 # ======================================================
 APP_TITLE = "Portfolio Tracker"
-PASSWORD = st.secrets["PASSWORD"]  # Streamlit Cloud -> Settings -> Secrets
 
-SAVE_FILE = Path("saved_positions.txt")  # proste zapisywanie między sesjami (single-user)
-SETTINGS_FILE = Path("saved_settings.json")
+PORTFOLIOS_FILE = Path("portfolios.sqlite")  # nazwane portfele + ustawienia per użytkownik (WAL)
+SAVE_FILE = Path("saved_positions.txt")  # dawny zapis single-user – importowany raz jako portfel domyślny
+ALERTS_FILE = Path("saved_alerts.json")  # reguły alertów + ich stan (histereza)
+ALERTS_LOG = Path("alerts.jsonl")  # odpalone alerty, jeden JSON na linię (do podpięcia np. powiadomień)
+NAMES_FILE = Path("saved_names.json")  # nazwy/metadane tickerów (Yahoo .info)
+NAME_TIMEOUT = 10.0  # s na jedno wyszukanie nazwy, od jego startu w puli
+NAME_REQUEST_TIMEOUT = 5.0  # s na jedno zapytanie HTTP w tym wyszukaniu
+HISTORY_FILE = Path("price_history.sqlite")  # dzienne zamknięcia, dociągane przyrostowo
+VALUE_HISTORY_DIR = Path("value_history")  # zamknięcia dni roboczych × tickery (memmap) do wykresu wartości
+VALUE_HISTORY_YEARS = 5
+SYMBOLS_DIR = Path("symbols")  # lokalny indeks symboli (kolumny .npy, memmap)
+# listing symboli (CSV: Symbol, Name[, Currency]); podmieniany np. z crona – indeks przebuduje się sam
+SYMBOLS_FILE = Path(os.environ.get("PORTFEL_SYMBOLS_FILE", str(SEED_FILE)))
+SYMBOLS_COMPLETE = os.environ.get("PORTFEL_SYMBOLS_COMPLETE") == "1"  # listing pełny: spoza niego = błędny ticker
+SYMBOLS_TTL = 3600  # s, co ile sprawdzamy, czy listing / cache nazw się zmienił
+LEDGER_DIR = Path("ledger")  # rejestr transakcji (segmenty .npz) + checkpoint ksiąg FIFO
+# s, świeżość ostatniej ceny = interwał wątku odświeżającego w tle; 1W/1M liczone raz na sesję giełdy
+QUOTE_TTL = int(os.environ.get("PORTFEL_REFRESH_SECONDS", "60"))
+LIVE_SECONDS = int(os.environ.get("PORTFEL_LIVE_SECONDS", "5"))  # co ile tabela "na żywo" wysyła zmienione wiersze
+# źródło danych: yahoo | record (Yahoo + zapis odpowiedzi) | replay (z zapisu, bez sieci) | fake (syntetyczne)
+PROVIDER = os.environ.get("PORTFEL_PROVIDER", "yahoo")
+PROVIDER_DIR = Path(os.environ.get("PORTFEL_RECORD_DIR", str(RECORD_DIR)))
+# metryki w formacie Prometheus (np. katalog textfile collectora node exportera)
+METRICS_FILE = Path(os.environ.get("PORTFEL_METRICS_FILE", "portfel_metrics.prom"))
 
 # ======================================================
 # CSS (Light, readable metrics, mobile-friendly)
@@ -102,225 +153,311 @@ def inject_css():
 
 
 # ======================================================
-# Persistence (simple local file)
+# Persistence (portfolios per user, SQLite)
 # ======================================================
-def load_saved_positions() -> str | None:
-    if SAVE_FILE.exists():
+@st.cache_resource
+def get_store() -> PortfolioStore:
+    # jeden magazyn na proces: sesje czytają równolegle, zapisy idą zbiorczo z jednego wątku
+    store = PortfolioStore(PORTFOLIOS_FILE)
+    atexit.register(store.close)  # kolejka trafia na dysk przy zamykaniu serwera
+    return store
+
+
+def portfolio_sidebar(store: PortfolioStore, user: str, default_text: str) -> str:
+    """Portfolio picker + editor for one user; returns the selected portfolio's text."""
+    names = store.portfolios(user)
+    if not names:
+        if user != DEFAULT_USER or not store.import_text(user, DEFAULT_PORTFOLIO, SAVE_FILE):
+            store.save(user, DEFAULT_PORTFOLIO, default_text)
+        names = [DEFAULT_PORTFOLIO]
+
+    pick_key = f"portfolio_{user}"
+    if st.session_state.get(pick_key) not in names:
+        last = store.setting(user, "portfolio")
+        st.session_state[pick_key] = last if last in names else names[0]
+
+    def on_pick():
+        store.set_setting(user, "portfolio", st.session_state[pick_key])
+
+    name = st.sidebar.selectbox("Portfel", names, key=pick_key, on_change=on_pick)
+
+    def on_add():
+        new = st.session_state.get("portfolio_new", "").strip()
+        if not new or new in names:
+            return
+        store.save(user, new, "")
+        store.set_setting(user, "portfolio", new)
+        st.session_state[pick_key] = new
+        st.session_state["portfolio_new"] = ""
+
+    def on_delete():
+        store.delete(user, name)
+        rest = [n for n in names if n != name]
+        store.set_setting(user, "portfolio", rest[0])
+        st.session_state[pick_key] = rest[0]
+
+    with st.sidebar.expander("📁 Portfele"):
+        st.text_input("Nazwa nowego portfela", key="portfolio_new")
+        st.button("➕ Dodaj", on_click=on_add)
+        st.button(f"🗑 Usuń „{name}”", on_click=on_delete, disabled=len(names) < 2)
+
+    # klucz per portfel: przełączenie czyta z magazynu tylko wybrany portfel
+    text_key = f"positions_text_{user}_{name}"
+    if text_key not in st.session_state:
+        st.session_state[text_key] = store.load(user, name) or ""
+
+    def on_positions_change():
+        store.save(user, name, st.session_state[text_key])  # zapis odroczony, zbiorczy (WRITE_DELAY)
+
+    text = st.sidebar.text_area(
+        "Twoje pozycje (1 linia = 1 pozycja)",
+        key=text_key,
+        height=220,
+        on_change=on_positions_change,
+    )
+    if store.last_error:
+        st.sidebar.warning(f"Zapis portfeli się nie powiódł, ponowię: {store.last_error}")
+    return text
+
+
+@st.cache_resource
+def get_ledger() -> Ledger:
+    # jeden rejestr na proces; księgi FIFO aktualizowane tylko dla dopisanych tickerów
+    return Ledger(LEDGER_DIR)
+
+
+def ledger_sidebar(ledger: Ledger):
+    with st.sidebar.expander("➕ Dodaj transakcję"):
+        with st.form("ledger_trade", clear_on_submit=True):
+            day = st.date_input("Data", value=date.today())
+            kind = st.selectbox("Typ", KINDS)
+            ticker = st.text_input("Ticker")
+            qty = st.number_input("Ilość", min_value=0.0, step=1.0, format="%.6f")
+            price = st.number_input("Cena (w walucie notowań)", min_value=0.0, step=0.01, format="%.4f")
+            fee = st.number_input("Prowizja", min_value=0.0, step=0.01)
+            account = st.selectbox("Rachunek", ACCOUNTS)
+            to_account = st.selectbox("Na rachunek (tylko TRANSFER)", ACCOUNTS, index=1)
+            if st.form_submit_button("Zapisz"):
+                trade = {
+                    "Time": pd.Timestamp(day),
+                    "Ticker": ticker,
+                    "Kind": kind,
+                    "Account": account,
+                    "ToAccount": to_account if kind == "TRANSFER" else "",
+                    "Quantity": qty,
+                    "Price": price,
+                    "Fee": fee,
+                }
+                try:
+                    ledger.append(pd.DataFrame([trade]))
+                except ValueError as e:
+                    st.error(f"Nie zapisano: {e}")
+
+    upload = st.sidebar.file_uploader("Import CSV (" + ", ".join(LEDGER_COLUMNS) + ")", type="csv")
+    if upload is not None and st.sidebar.button("📥 Importuj"):
         try:
-            return SAVE_FILE.read_text(encoding="utf-8")
-        except Exception:
-            return None
-    return None
+            n = ledger.append(pd.read_csv(upload))
+            st.sidebar.success(f"Zaimportowano {n:,} transakcji.")
+        except ValueError as e:
+            st.sidebar.error(f"Import przerwany (nic nie zapisano): {e}")
+    st.sidebar.caption(f"Transakcji w rejestrze: {len(ledger):,}")
 
 
-def save_positions(text: str):
-    try:
-        SAVE_FILE.write_text(text or "", encoding="utf-8")
-    except Exception:
-        pass
+@st.cache_resource
+def get_exports() -> ExportCache:
+    # gotowe pliki współdzielone przez sesje – klucz to hash zawartości widoku, nie sesja
+    return ExportCache()
 
 
-def load_settings() -> dict:
-    if SETTINGS_FILE.exists():
-        try:
-            return json.loads(SETTINGS_FILE.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
+@st.cache_resource
+def get_alerts() -> AlertEngine:
+    # wspólny dla sesji: stan reguł (uzbrojona / odpalona) nie może się dublować między kartami
+    return AlertEngine(ALERTS_FILE, ALERTS_LOG)
 
 
-def save_settings(d: dict):
-    try:
-        SETTINGS_FILE.write_text(json.dumps(d, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
+def alerts_sidebar(engine: AlertEngine):
+    with st.sidebar.expander(f"🔔 Alerty ({len(engine.rules)})"):
+        st.caption(
+            "Pole: " + " / ".join(FIELDS) + ". Warunek: " + " / ".join(NUMERIC_OPS) + " (próg; cena w walucie notowań, "
+            "PL_Percent w %), dla trendów " + " / ".join(TREND_OPS) + ". Pasmo: histereza, puste = domyślne."
+        )
+        edited = st.data_editor(
+            engine.rules,
+            num_rows="dynamic",
+            hide_index=True,
+            key=f"alert_rules_{engine.version}",  # po zapisie edytor startuje od zapisanej listy
+            column_config={
+                "Field": st.column_config.SelectboxColumn("Field", options=FIELDS),
+                "Op": st.column_config.SelectboxColumn("Op", options=[*NUMERIC_OPS, *TREND_OPS]),
+                "Threshold": st.column_config.NumberColumn("Threshold"),
+                "Band": st.column_config.NumberColumn("Band", min_value=0.0),
+            },
+        )
+        if st.button("💾 Zapisz reguły"):
+            try:
+                n = engine.set_rules(edited[RULE_COLUMNS])
+                st.success(f"Zapisano {n:,} reguł.")
+            except ValueError as e:
+                st.error(f"Nie zapisano: {e}")
+        recent = engine.recent(10)
+        if not recent.empty:
+            st.caption("Ostatnie alerty")
+            st.dataframe(recent, hide_index=True)
 
 
 # ======================================================
-# Parsing
+# Market data (bulk)
 # ======================================================
-def parse_positions(text: str) -> pd.DataFrame:
-    """
-    Format:
-    TICKER, ILOŚĆ [, CENA_ZAKUPU] [, KONTO]
+@st.cache_resource
+def get_price_store() -> PriceStore:
+    return PriceStore(HISTORY_FILE)
 
-    KONTO: IKE / IKZE / STANDARD
-    """
-    rows = []
-    for line in (text or "").splitlines():
-        line = line.strip()
-        if not line:
-            continue
 
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) < 2:
-            continue
+@st.cache_resource
+def get_provider() -> Provider:
+    # jeden dostawca (i jedna pula połączeń) na proces
+    if PROVIDER not in PROVIDERS:
+        st.error(f"PORTFEL_PROVIDER={PROVIDER!r}: dostępne {', '.join(PROVIDERS)}")
+        st.stop()
+    return make_provider(PROVIDER, PROVIDER_DIR)
 
-        ticker = parts[0].upper()
 
-        try:
-            qty = float(parts[1].replace(",", "."))
-        except ValueError:
-            continue
+@st.cache_resource
+def get_pricer() -> Pricer:
+    # paczki po 50 tickerów, równolegle, z ponowieniami; historia dzienna na dysku
+    return Pricer(get_provider(), get_price_store(), get_anchor_cache())
 
-        purchase_price = np.nan
-        if len(parts) >= 3 and parts[2] != "":
-            try:
-                purchase_price = float(parts[2].replace(",", "."))
-            except ValueError:
-                purchase_price = np.nan
-
-        account = "STANDARD"
-        if len(parts) >= 4:
-            acc = parts[3].upper()
-            if acc.startswith("IKE"):
-                account = "IKE"
-            elif acc.startswith("IKZE"):
-                account = "IKZE"
-
-        rows.append(
-            {
-                "Ticker": ticker,
-                "Quantity": qty,
-                "PurchasePrice": purchase_price,
-                "Account": account,
-            }
-        )
 
-    if not rows:
-        return pd.DataFrame(
-            columns=["Ticker", "Quantity", "PurchasePrice", "Account", "Category", "CurrencyHint"]
-        )
+def _download_history(tickers: list[str], start: date) -> pd.DataFrame:
+    return get_pricer().download_history(tickers, start)
 
-    df = pd.DataFrame(rows)
 
-    def category(row):
-        if row["Account"] in ("IKE", "IKZE"):
-            return row["Account"]
-        if str(row["Ticker"]).endswith("-USD"):
-            return "CRYPTO"
-        return "STOCK"
+@st.cache_resource
+def get_quote_cache() -> QuoteCache:
+    # wspólny dla procesu; każdy ticker ma własny znacznik świeżości
+    return QuoteCache(ttl=QUOTE_TTL)
 
-    def currency_hint(ticker: str) -> str:
-        t = ticker.upper()
-        if t.endswith("-USD"):
-            return "USD"
-        if t.endswith(".WA") or t.endswith(".PL"):
-            return "PLN"
-        if t.endswith(".DE") or t.endswith(".F") or t.endswith(".AS") or t.endswith(".PA") or t.endswith(".MI"):
-            return "EUR"
-        return "USD"
 
-    df["Category"] = df.apply(category, axis=1)
-    df["CurrencyHint"] = df["Ticker"].apply(currency_hint)
-    return df
+@st.cache_resource
+def get_anchor_cache() -> AnchorCache:
+    return AnchorCache()
 
 
-# ======================================================
-# Market data (bulk)
-# ======================================================
-@st.cache_data(ttl=300)
-def get_prices_bulk(tickers: list[str]) -> pd.DataFrame:
-    if not tickers:
-        return pd.DataFrame(columns=["Ticker", "Price", "First1m", "First1w"])
-
-    raw = yf.download(
-        tickers=" ".join(tickers),
-        period="1mo",
-        interval="1d",
-        group_by="ticker",
-        auto_adjust=False,
-        threads=True,
-        progress=False,
-    )
+def get_prices_bulk(tickers: list[str]) -> MarketSnapshot:
+    # stale-while-revalidate: synchronicznie pobieramy tylko tickery widziane pierwszy raz,
+    # przeterminowane odświeży wątek w tle; wszystkie sesje czytają ten sam snapshot (bez kopii)
+    quotes, fetched = get_quote_cache().get(tickers, get_pricer().quotes, serve_stale=True)
+    METRICS.cache("quotes", hit=True, n=len(tickers) - len(fetched))
+    METRICS.cache("quotes", hit=False, n=len(fetched))
+    return quotes
 
-    if raw is None or raw.empty:
-        return pd.DataFrame(columns=["Ticker", "Price", "First1m", "First1w"])
-
-    # single ticker
-    if isinstance(raw.columns, pd.Index) and "Close" in raw.columns:
-        close = raw["Close"].dropna()
-        if close.empty:
-            return pd.DataFrame([{"Ticker": tickers[0], "Price": np.nan, "First1m": np.nan, "First1w": np.nan}])
-        price = float(close.iloc[-1])
-        first1m = float(close.iloc[0])
-        last5 = close.tail(5)
-        first1w = float(last5.iloc[0]) if len(last5) else np.nan
-        return pd.DataFrame([{"Ticker": tickers[0], "Price": price, "First1m": first1m, "First1w": first1w}])
-
-    results = []
-    for t in tickers:
-        try:
-            if (t, "Close") in raw.columns:
-                close = raw[(t, "Close")].dropna()
-            else:
-                close = pd.Series(dtype=float)
-
-            if close.empty:
-                results.append({"Ticker": t, "Price": np.nan, "First1m": np.nan, "First1w": np.nan})
-            else:
-                price = float(close.iloc[-1])
-                first1m = float(close.iloc[0])
-                last5 = close.tail(5)
-                first1w = float(last5.iloc[0]) if len(last5) else np.nan
-                results.append({"Ticker": t, "Price": price, "First1m": first1m, "First1w": first1w})
-        except Exception:
-            results.append({"Ticker": t, "Price": np.nan, "First1m": np.nan, "First1w": np.nan})
 
-    return pd.DataFrame(results)
+def _download_fx(symbols: list[str]) -> pd.DataFrame:
+    return get_pricer().download_fx(symbols)
 
 
-@st.cache_data(ttl=300)
-def fx_rate(symbol: str):
-    try:
-        fx = yf.download(symbol, period="5d", interval="1d", progress=False)
-        if fx is None or fx.empty or "Close" not in fx.columns:
-            return None
-        close = fx["Close"].dropna()
-        if close.empty:
-            return None
-        return float(close.iloc[-1])
-    except Exception:
-        return None
+@st.cache_resource
+def get_fx_cache() -> FxCache:
+    # wszystkie pary w jednym zapytaniu; brakujące kursy krzyżowe liczone przez USD
+    return FxCache(ttl=QUOTE_TTL)
 
 
-# Name lookup – minimal + stable
-NAME_MAP = {
-    "BTC-USD": "Bitcoin",
-    "ETH-USD": "Ethereum",
-    "SOL-USD": "Solana",
-    "ADA-USD": "Cardano",
-    "XRP-USD": "XRP",
-    "DOGE-USD": "Dogecoin",
-}
+def fx_rates(currencies: tuple[str, ...]) -> pd.DataFrame:
+    matrix, fetched = get_fx_cache().get(currencies, _download_fx, serve_stale=True)
+    METRICS.cache("fx", hit=True, n=len(currencies) - len(fetched))
+    METRICS.cache("fx", hit=False, n=len(fetched))
+    return matrix
+
+
+@st.cache_resource
+def get_value_history() -> ValueHistory:
+    start = date.today() - timedelta(days=365 * VALUE_HISTORY_YEARS)
+    return ValueHistory(CloseMatrix(VALUE_HISTORY_DIR, start))
+
 
+@st.cache_resource
+def get_return_cache() -> ReturnCache:
+    # stopy zwrotu trzymanych tickerów w PLN, dopisywane przyrostowo razem z macierzą historii
+    return ReturnCache(get_value_history())
 
-@st.cache_data(ttl=86400)
-def get_name_slow(ticker: str) -> str:
+
+@st.cache_resource
+def get_refresher() -> Refresher:
+    quotes, fx = get_quote_cache(), get_fx_cache()
+    fetch = get_pricer().quotes
+    alerts = get_alerts()
+
+    def evaluate_alerts(portfolios: list[tuple[pd.DataFrame, tuple[str, ...]]]):
+        # po każdym przebiegu jedno sprawdzenie reguł na portfel (bez nazw – reguły ich nie używają)
+        snapshot = quotes.current.frame
+        with METRICS.stage("alerts"):
+            for positions, currencies in portfolios:
+                alerts.evaluate(value_frame(positions, snapshot, fx.matrix(currencies), {}))
+
+    refresher = Refresher(
+        refresh_quotes=lambda tickers: quotes.get(tickers, fetch),
+        refresh_fx=lambda currencies: fx.get(currencies, _download_fx),
+        interval=QUOTE_TTL,
+        on_refresh=evaluate_alerts,
+    )
+    refresher.start()
+    return refresher
+
+
+def get_name_slow(ticker: str) -> dict | None:
     # Nie polegamy na tym w 100% (Yahoo bywa kapryśne), ale jako uzupełnienie jest OK.
-    if ticker in NAME_MAP:
-        return NAME_MAP[ticker]
-    try:
-        t = yf.Ticker(ticker)
-        info = getattr(t, "info", {}) or {}
-        nm = info.get("shortName") or info.get("longName")
-        if nm and isinstance(nm, str):
-            # skróć absurdalnie długie nazwy
-            nm = nm.strip()
-            return nm[:60]
-    except Exception:
-        pass
-    return ticker
-
-
-def compute_trend(price: float, first: float) -> str | None:
-    if np.isnan(price) or np.isnan(first) or first == 0:
+    info = get_provider().info(ticker, timeout=NAME_REQUEST_TIMEOUT)
+    METRICS.request("names", info)
+    nm = info.get("shortName") or info.get("longName")
+    if not nm or not isinstance(nm, str):
         return None
-    if price > first:
-        return "up"
-    if price < first:
-        return "down"
-    return "flat"
+    # skróć absurdalnie długie nazwy
+    return {
+        "name": nm.strip()[:60],
+        "currency": info.get("currency"),
+        "exchange": info.get("exchange"),
+    }
+
+
+@st.cache_resource(ttl=SYMBOLS_TTL)
+def get_symbols() -> SymbolIndex:
+    # przebudowa tylko gdy listing albo cache nazw są nowsze od indeksu; poza tym samo otwarcie memmapów
+    return ensure_index(SYMBOLS_DIR, [SYMBOLS_FILE], NAMES_FILE, complete=SYMBOLS_COMPLETE)
+
+
+def symbols_sidebar(symbols: SymbolIndex, tickers: list[str]):
+    query = st.text_input("🔎 Szukaj tickera", key="symbol_query", placeholder="np. orlen, AAPL, vwce")
+    if query:
+        hits = symbols.search(query)
+        if hits.empty:
+            st.caption("Brak w lokalnym indeksie symboli.")
+        else:
+            st.dataframe(hits[["Symbol", "Name", "Currency"]], hide_index=True)
+
+    # walidacja bez sieci: pełny indeks – każdy nieznany ticker; niepełny – tylko wyglądające na literówkę
+    unknown = symbols.unknown(tickers)
+    hints = {t: symbols.suggest(t) for t in unknown[:20]}
+    if symbols.complete and unknown:
+        st.warning(
+            "Nieznane tickery (brak w indeksie symboli):\n"
+            + "\n".join(f"- `{t}`" + (f" – może `{s}`?" if s else "") for t, s in hints.items())
+            + (f"\n- … i {len(unknown) - 20} więcej" if len(unknown) > 20 else "")
+        )
+    elif any(hints.values()):
+        st.caption("Możliwe literówki: " + ", ".join(f"{t} → {s}" for t, s in hints.items() if s))
+
+
+@st.cache_resource
+def get_name_resolver() -> NameResolver:
+    # jeden pool na proces; cache na dysku przeżywa restart i st.cache_data.clear()
+    return NameResolver(NAMES_FILE, get_name_slow, static=NAME_MAP, timeout=NAME_TIMEOUT)
+
+
+@st.fragment(run_every=2)
+def await_names(resolver: NameResolver, seen_version: int):
+    # nazwy dociągają się w tle – przerysuj stronę, gdy przyjdzie coś nowego
+    if resolver.version != seen_version:
+        st.rerun()
 
 
 def fmt_num(x, digits=2):
@@ -329,110 +466,383 @@ def fmt_num(x, digits=2):
     return f"{x:,.{digits}f}"
 
 
-def badge(trend: str | None) -> str:
-    if trend == "up":
-        return '<span class="badge up">↑</span>'
-    if trend == "down":
-        return '<span class="badge down">↓</span>'
-    if trend == "flat":
-        return '<span class="badge flat">→</span>'
-    return '<span class="badge flat">–</span>'
-
-
 # ======================================================
-# HTML table rendered via components.html (so it never prints <tr> text)
-# Column order requested:
-# Name, Value Since Purchase (VPN) PLN, %, 1M, 1W, Ticker, Category, Currency, Qty, Buy, Price
+# HTML table as a components.v2 element (so it never prints <tr> text)
+# Sortowanie i stronicowanie po stronie serwera – do przeglądarki idzie tylko bieżąca strona,
+# a przy kolejnych przebiegach tylko jej zmienione wiersze (element nie jest przebudowywany)
 # ======================================================
+PAGE_SIZES = [25, 50, 100, 250]
+TABLE_COMPONENT = components.component("portfel_table", html=LIVE_HTML, css=LIVE_STYLE, js=LIVE_JS)
+
+
 def render_table_component(view: pd.DataFrame):
-    css = """
-    <style>
-      body { font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Arial; margin: 0; }
-      .table-wrap{
-        background:#fff; border:1px solid #e5e7eb; border-radius:16px;
-        box-shadow:0 10px 25px rgba(15,23,42,0.05);
-        padding:10px 10px 2px 10px; overflow-x:auto;
-      }
-      table{ width:100%; border-collapse:collapse; min-width: 980px; }
-      th{
-        text-align:left; font-size:0.85rem; color:#334155; background:#f8fafc;
-        border-bottom:1px solid #e5e7eb; padding:10px 10px; position:sticky; top:0;
-        white-space:nowrap;
-      }
-      td{
-        font-size:0.9rem; color:#0f172a; border-bottom:1px solid #eef2f7;
-        padding:10px 10px; white-space:nowrap; vertical-align:middle;
-      }
-      .muted{ color:#64748b; }
-      .right{ text-align:right; }
-      .pos{ color:#166534; font-weight:900; }
-      .neg{ color:#991b1b; font-weight:900; }
-      .badge{ display:inline-block; padding:3px 10px; border-radius:999px; font-size:0.82rem; font-weight:900; }
-      .up{ background:rgba(22,163,74,0.12); color:#166534; }
-      .down{ background:rgba(220,38,38,0.12); color:#991b1b; }
-      .flat{ background:rgba(100,116,139,0.14); color:#475569; }
-    </style>
-    """
+    s1, s2, s3, s4 = st.columns([1.4, 0.8, 0.8, 0.8])
+    with s1:
+        sort_by = st.selectbox("Sortuj wg", list(SORT_COLUMNS), index=1, key="table_sort")
+    with s2:
+        ascending = st.toggle("Rosnąco", value=False, key="table_asc")
+    with s3:
+        page_size = st.selectbox("Wierszy", PAGE_SIZES, index=1, key="table_page_size")
+    pages = page_count(len(view), page_size)
+    if st.session_state.get("table_page", 1) > pages:
+        st.session_state["table_page"] = pages  # po zawężeniu filtrów
+    with s4:
+        page_no = st.number_input("Strona", min_value=1, max_value=pages, value=1, step=1, key="table_page")
+
+    start = (int(page_no) - 1) * page_size
+    page = sort_view(view, sort_by, ascending).iloc[start : start + page_size]
+    st.caption(f"Pozycje {min(start + 1, len(view))}–{start + len(page)} z {len(view)} (strona {page_no}/{pages})")
+
+    if "table_feed" not in st.session_state:
+        st.session_state["table_feed"] = TableFeed()
+    feed = st.session_state["table_feed"]
+    TABLE_COMPONENT(data=feed.push(page), key="positions_table", on_resync_change=feed.reset)
+
+
+GROUP_LABELS = {"Category": "Kategoria", "Account": "Konto"}
+
+
+def synced_value_history(positions: pd.DataFrame) -> ValueHistory:
+    history = get_value_history()
+    symbols = positions["Ticker"].unique().tolist() + fx_symbols(positions["CurrencyHint"].unique())
+    with st.spinner("Pobieram historię notowań…"), METRICS.stage("history_sync"):
+        try:
+            sync(history.matrix, symbols, _download_history, date.today())
+        except Exception:
+            pass  # offline -> liczymy z tego, co już jest na dysku
+    return history
 
-    rows = []
-    for _, r in view.iterrows():
-        vpn = r["PL_Value_PLN"]
-        vpn_cls = "pos" if pd.notna(vpn) and vpn >= 0 else "neg" if pd.notna(vpn) else "muted"
-
-        pct = r["PL_Percent"]
-        pct_txt = fmt_num(pct, 2)
-
-        rows.append(
-            f"""
-            <tr>
-              <td>{r["Name"]}</td>
-              <td class="right {vpn_cls}">{fmt_num(vpn, 2)}</td>
-              <td class="right">{pct_txt}</td>
-              <td>{badge(r["Trend1m"])}</td>
-              <td>{badge(r["Trend1w"])}</td>
-              <td class="muted">{r["Ticker"]}</td>
-              <td>{r["Category"]}</td>
-              <td>{r["Currency"]}</td>
-              <td class="right">{fmt_num(r["Quantity"], 4)}</td>
-              <td class="right">{fmt_num(r["PurchasePrice"], 4)}</td>
-              <td class="right">{fmt_num(r["Price"], 4)}</td>
-            </tr>
-            """
+
+def render_value_history(positions: pd.DataFrame):
+    history = synced_value_history(positions)
+    with METRICS.stage("history"):
+        values = history.values(positions)
+
+    by = st.radio(
+        "Podział", GROUP_LABELS, horizontal=True, key="history_by", format_func=GROUP_LABELS.get
+    )
+    frame = values[by]
+    frame = frame[frame.sum(axis=1).cumsum() > 0]  # od pierwszego dnia z notowaniami
+    if frame.empty:
+        st.info("Brak historii notowań dla tych pozycji.")
+        return
+    long = frame.rename_axis(index="Dzień", columns=by).stack().rename("Value_PLN").reset_index()
+    fig = px.area(
+        long,
+        x="Dzień",
+        y="Value_PLN",
+        color=by,
+        title="Wartość portfela w czasie (PLN, bieżące ilości)",
+        template="plotly_white",
+    )
+    fig.update_layout(paper_bgcolor="white", plot_bgcolor="white", font_color="#0f172a")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+RISK_LEVELS = [0.95, 0.99]
+RISK_YEARS = [1, 3, 5]
+RISK_TOP = 20  # największe pozycje w macierzy korelacji
+RISK_LABELS = {
+    "Volatility": "Zmienność (rocz.)",
+    "MaxDrawdown": "Maks. obsunięcie",
+    "VaR_hist": "VaR hist. 1D",
+    "CVaR_hist": "CVaR hist. 1D",
+    "VaR_param": "VaR param. 1D",
+    "CVaR_param": "CVaR param. 1D",
+    "VaR_hist_PLN": "VaR hist. (PLN)",
+    "CVaR_hist_PLN": "CVaR hist. (PLN)",
+}
+
+
+def render_risk(positions: pd.DataFrame):
+    history = synced_value_history(positions)
+    r1, r2 = st.columns(2)
+    with r1:
+        level = st.selectbox("Poziom ufności", RISK_LEVELS, format_func=lambda x: f"{x:.0%}", key="risk_level")
+    with r2:
+        years = st.selectbox("Okres", RISK_YEARS, index=1, format_func=lambda y: f"{y} l.", key="risk_years")
+
+    with METRICS.stage("risk"):
+        values = history.values(positions)["Account"]
+        values["PORTFEL"] = values.sum(axis=1)
+        values = values.iloc[-(years * TRADING_DAYS + 1) :]
+        values = values[values["PORTFEL"].cumsum() > 0]
+        if len(values) < 3:
+            st.info("Za mało historii notowań, aby policzyć ryzyko.")
+            return
+        table = risk_table(values, level)
+        rolling = pd.DataFrame(
+            rolling_volatility(simple_returns(values.to_numpy())), index=values.index[1:], columns=values.columns
         )
 
-    html = f"""
-    {css}
-    <div class="table-wrap">
-      <table>
-        <thead>
-          <tr>
-            <th>Name</th>
-            <th class="right">Value Since Purchase (VPN) PLN</th>
-            <th class="right">%</th>
-            <th>1M</th>
-            <th>1W</th>
-            <th>Ticker</th>
-            <th>Category</th>
-            <th>Currency</th>
-            <th class="right">Qty</th>
-            <th class="right">Buy</th>
-            <th class="right">Price</th>
-          </tr>
-        </thead>
-        <tbody>
-          {''.join(rows)}
-        </tbody>
-      </table>
-    </div>
-    """
+        # korelacje największych pozycji – stopy z cache (cały zestaw tickerów, przycięty do okresu)
+        held = positions.drop_duplicates("Ticker")
+        returns = get_return_cache().returns(held["Ticker"].tolist(), held["CurrencyHint"].tolist())
+        top = positions.groupby("Ticker")["Value_PLN"].sum().nlargest(RISK_TOP).index.tolist()
+        _, corr = covariance(returns[top].iloc[-len(values) + 1 :].to_numpy())
+
+    shown = table[list(RISK_LABELS)].rename(columns=RISK_LABELS)
+    pct = [c for c in shown.columns if not c.endswith("(PLN)")]
+    shown[pct] = shown[pct] * 100
+    st.dataframe(
+        shown,
+        column_config={
+            **{c: st.column_config.NumberColumn(c, format="%.2f%%") for c in pct},
+            **{c: st.column_config.NumberColumn(c, format="%.0f") for c in shown.columns if c not in pct},
+        },
+    )
+    st.caption(f"VaR/CVaR: jednodniowa strata przy {level:.0%} ufności; obsunięcie i zmienność z {len(values)} sesji.")
+
+    long = rolling.rename_axis(index="Dzień", columns="Konto").stack().rename("Zmienność").reset_index()
+    fig = px.line(long, x="Dzień", y="Zmienność", color="Konto", title="Zmienność krocząca (21 sesji, rocz.)", template="plotly_white")
+    fig.update_layout(paper_bgcolor="white", plot_bgcolor="white", font_color="#0f172a", yaxis_tickformat=".0%")
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = px.imshow(
+        pd.DataFrame(corr, index=top, columns=top),
+        zmin=-1,
+        zmax=1,
+        color_continuous_scale="RdBu",
+        title=f"Korelacja dziennych stóp zwrotu (PLN), {len(top)} największych pozycji",
+    )
+    fig.update_layout(paper_bgcolor="white", plot_bgcolor="white", font_color="#0f172a")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_rebalance(valid: pd.DataFrame, user: str):
+    store = get_store()
+    saved = store.setting(user, "rebalance_targets")
+    targets = pd.DataFrame(saved, columns=TARGET_COLUMNS) if saved else current_targets(valid)
+    # konta z portfela, z zapisanymi dopłatami / zgodą na sprzedaż tam, gdzie są
+    accounts = default_accounts(valid).set_index("Account")
+    saved = store.setting(user, "rebalance_accounts")
+    if saved:
+        accounts.update(pd.DataFrame(saved, columns=ACCOUNT_COLUMNS).set_index("Account"))
+    accounts = accounts.reset_index()
+
+    a, b = st.columns([1.0, 1.2])
+    with a:
+        st.caption("Cele: waga w % na klasę aktywów i walutę (skalowane do sumy 100)")
+        targets = st.data_editor(
+            targets,
+            num_rows="dynamic",
+            hide_index=True,
+            key="rebalance_targets",
+            column_config={
+                "Class": st.column_config.SelectboxColumn("Class", options=["STOCK", "CRYPTO"]),
+                "Weight": st.column_config.NumberColumn("Weight", min_value=0.0, format="%.1f%%"),
+            },
+        )
+    with b:
+        st.caption("Konta: dopłata gotówki (np. pozostały limit IKE/IKZE) i zgoda na sprzedaż")
+        accounts = st.data_editor(
+            accounts,
+            hide_index=True,
+            disabled=["Account"],
+            key="rebalance_accounts",
+            column_config={"Cash_PLN": st.column_config.NumberColumn("Cash_PLN", min_value=0.0, format="%.0f")},
+        )
+        c1, c2 = st.columns(2)
+        min_trade = c1.number_input("Min. transakcja (PLN)", min_value=0.0, value=MIN_TRADE, step=50.0, key="rebalance_min")
+        whole = c2.checkbox("Całe akcje", value=True, key="rebalance_whole")
+
+    if st.button("💾 Zapisz cele"):
+        for key, frame in (("rebalance_targets", targets), ("rebalance_accounts", accounts)):
+            store.set_setting(user, key, frame.astype(object).where(frame.notna(), None).to_dict("records"))
+        st.success("Zapisano cele i ustawienia kont.")
 
-    height = min(820, 150 + 44 * max(1, len(view)))
-    components.html(html, height=height, scrolling=True)
+    try:
+        with METRICS.stage("rebalance"):
+            trades, sleeves = rebalance(valid, targets, accounts, min_trade, whole)
+    except ValueError as e:
+        st.error(f"Nie policzono: {e}")
+        return
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Odchylenie od celu (p.p.)", f"{tracking_error(sleeves, 'Before'):.2f}")
+    m2.metric("Po transakcjach (p.p.)", f"{tracking_error(sleeves):.2f}")
+    m3.metric("Transakcji", f"{len(trades):,}")
+    st.dataframe(
+        sleeves,
+        hide_index=True,
+        column_config={
+            **{c: st.column_config.NumberColumn(c, format="%.2f%%") for c in ["Target", "Before", "After"]},
+            "Trade_PLN": st.column_config.NumberColumn("Trade_PLN", format="%.0f"),
+        },
+    )
+    if trades.empty:
+        st.info("Brak transakcji – portfel jest przy celu (albo ograniczenia kont nie pozwalają go zbliżyć).")
+    else:
+        st.dataframe(trades, hide_index=True, column_config={"Value_PLN": st.column_config.NumberColumn("Value_PLN", format="%.2f")})
+    st.caption(
+        "Kupno tylko w tickerach już trzymanych na danym koncie (największa pozycja koszyka), sprzedaż od największych. "
+        "Udziały liczone od wartości portfela razem z dopłatami."
+    )
+
+
+def render_diagnostics():
+    st.markdown("## 🩺 Diagnostyka")
+    st.caption(f"Liczniki od startu procesu (wspólne dla wszystkich sesji). Plik Prometheus: {METRICS_FILE}")
+    d1, d2 = st.columns(2)
+    with d1:
+        st.dataframe(METRICS.stages_frame().round(1), hide_index=True)
+    with d2:
+        st.dataframe(METRICS.counters_frame(), hide_index=True)
 
 
 # ======================================================
-# App
+# Sections rerun on their own (st.fragment): a filter click never reaches parse / prices / valuation
 # ======================================================
+def valuation_key(positions_key: str, quotes_digest: str, fx: pd.DataFrame, names_version: str) -> str:
+    """Hash of everything the valued frame depends on: positions, their quotes, FX, resolved names."""
+    h = hashlib.blake2b(positions_key.encode("utf-8"), digest_size=16)
+    h.update(quotes_digest.encode("ascii"))
+    h.update(fx.to_numpy(dtype=float).tobytes())
+    h.update("|".join(fx.columns).encode("utf-8"))
+    h.update(names_version.encode("ascii"))
+    return h.hexdigest()
+
+
+def valued_positions(positions: pd.DataFrame, positions_key: str, fx_currencies: tuple[str, ...]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(positions merged with the current quote snapshot and valued in PLN, FX matrix).
+
+    Memoized in the session on valuation_key: reruns over an unchanged snapshot skip the merge and valuation.
+    """
+    tickers = positions["Ticker"].dropna().unique().tolist()
+    with METRICS.stage("fx"):
+        fx = fx_rates(fx_currencies)
+    with st.spinner("Pobieram ceny rynkowe (bulk)…"), METRICS.stage("prices"):
+        bulk = get_prices_bulk(tickers)
+
+    resolver = get_name_resolver()
+    symbols = get_symbols()
+    key = valuation_key(positions_key, bulk.digest(tickers), fx, f"{resolver.version}:{symbols.built}")
+    memo = st.session_state.get("valuation")
+    if memo is not None and memo[0] == key:
+        METRICS.cache("valuation", hit=True)
+        return memo[1], fx
+
+    METRICS.cache("valuation", hit=False)
+    with METRICS.stage("names"):
+        names = resolver.names(tickers, symbols.names, only_listed=symbols.complete)
+        unresolved = sum(1 for t in tickers if names[t] == t)
+        METRICS.cache("names", hit=True, n=len(tickers) - unresolved)
+        METRICS.cache("names", hit=False, n=unresolved)
+    with METRICS.stage("valuation"):
+        df = value_frame(positions, bulk.frame, fx, names)  # merge bierze tylko wiersze portfela
+    st.session_state["valuation"] = (key, df)
+    return df, fx
+
+
+def alert_toasts():
+    # reguły sprawdza wątek w tle po każdym odświeżeniu cen; sesja tylko pokazuje, co odpaliło od jej ostatniego przebiegu
+    engine = get_alerts()
+    fired, seq = engine.since(st.session_state.get("alerts_seen", engine.seq))
+    st.session_state["alerts_seen"] = seq
+    for a in fired.head(5).itertuples(index=False):
+        st.toast(f"🔔 {a.Ticker}: {a.Field} {a.Op} {fmt_num(a.Threshold)} (teraz {fmt_num(a.Value)})")
+    if len(fired) > 5:
+        st.toast(f"🔔 … i {len(fired) - 5} więcej (zob. {ALERTS_LOG})")
+
+
+def render_positions(df: pd.DataFrame, metric_currencies: list[str], revalue: Callable[[], pd.DataFrame] | None = None):
+    # w trybie na żywo fragment co LIVE_SECONDS sam wycenia pozycje z bieżącego snapshotu
+    if revalue is not None:
+        df = revalue()
+        alert_toasts()
+
+    # ---------------- Filters (one consolidated space)
+    st.markdown("## Filtry")
+    with st.container():
+        a, b, c = st.columns([1.2, 1.2, 1.0])
+
+        with a:
+            account_filter = st.multiselect(
+                "Konto",
+                ["STANDARD", "IKE", "IKZE"],
+                default=["STANDARD", "IKE", "IKZE"],
+            )
+        with b:
+            cat_filter = st.multiselect(
+                "Kategoria",
+                ["STOCK", "CRYPTO", "IKE", "IKZE"],
+                default=["STOCK", "CRYPTO", "IKE", "IKZE"],
+            )
+        with c:
+            curr_filter = st.multiselect(
+                "Waluta",
+                metric_currencies,
+                default=metric_currencies,
+            )
+
+    with METRICS.stage("filter"):
+        view = df[
+            df["Account"].isin(account_filter)
+            & df["Category"].isin(cat_filter)
+            & df["Currency"].isin(curr_filter)
+        ]
+
+    missing = view[view["Price"].isna()]["Ticker"].dropna().unique().tolist()
+    if missing:
+        st.warning("Brak danych cenowych dla: " + ", ".join(missing) + ". (Sprawdź ticker w Yahoo Finance.)")
+
+    # ---------------- Table
+    st.markdown("## 📊 Pozycje")
+    with METRICS.stage("table"):
+        render_table_component(view)
+
+    # ---------------- Export
+    # plik budowany dopiero po kliknięciu (paczkami), ten sam widok drugi raz – z ExportCache
+    fmt_col, button_col = st.columns([1, 2])
+    fmt = fmt_col.selectbox("Format", list(FORMATS), key="export_format", label_visibility="collapsed")
+    problem = missing_dependency(fmt)
+    mime, ext = FORMATS[fmt]
+
+    def export_file() -> bytes:
+        return get_exports().get(view[EXPORT_COLUMNS], fmt)
+
+    button_col.download_button(
+        f"⬇️ Pobierz {fmt.upper()}",
+        export_file,
+        file_name=f"portfolio.{ext}",
+        mime=mime,
+        on_click="ignore",
+        disabled=problem is not None,
+        help=problem,
+    )
+
+
+@st.fragment
+def render_charts(df: pd.DataFrame, valid: pd.DataFrame, total_pln: float, user: str):
+    # ---------------- Composition chart
+    st.markdown("## 📈 Struktura portfela")
+    if not valid.empty and total_pln > 0:
+        with METRICS.stage("chart"):
+            grp = (
+                valid.groupby("Category", as_index=False)["Value_PLN"]
+                .sum()
+                .sort_values("Value_PLN", ascending=False)
+            )
+            fig = px.pie(grp, names="Category", values="Value_PLN", title="Udział kategorii (PLN)", template="plotly_white")
+            fig.update_layout(paper_bgcolor="white", plot_bgcolor="white", font_color="#0f172a")
+            st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Brak danych do wykresu struktury.")
+
+    if st.checkbox("📉 Wartość w czasie", key="show_value_history"):
+        render_value_history(df)
+
+    # ---------------- Risk (optional)
+    if st.checkbox("⚠️ Ryzyko", key="show_risk"):
+        st.markdown("## ⚠️ Ryzyko")
+        render_risk(df)
+
+    # ---------------- Rebalancing (optional)
+    if st.checkbox("⚖️ Rebalansowanie", key="show_rebalance"):
+        st.markdown("## ⚖️ Rebalansowanie")
+        render_rebalance(valid, user)
+
+
 def main():
     st.set_page_config(page_title=APP_TITLE, page_icon="💰", layout="wide")
     inject_css()
@@ -449,100 +859,87 @@ def main():
 
     # ---------------- Sidebar: Access
     st.sidebar.header("🔒 Dostęp")
+    user = st.sidebar.text_input("Użytkownik", value=DEFAULT_USER, key="user").strip() or DEFAULT_USER
     pw = st.sidebar.text_input("Hasło", type="password")
-    if pw != PASSWORD:
+    if pw != st.secrets["PASSWORD"]:  # Streamlit Cloud -> Settings -> Secrets
         st.warning("Podaj poprawne hasło, aby zobaczyć portfel.")
         st.stop()
 
     # ---------------- Sidebar: Positions (persisted)
     st.sidebar.markdown("---")
     st.sidebar.header("🧾 Pozycje")
-    st.sidebar.caption("Format: TICKER,ILOŚĆ[,CENA_ZAKUPU][,KONTO]  (KONTO: IKE/IKZE opcjonalnie)")
-
-    default_positions = (
-        "BTC-USD,0.02,35000\n"
-        "ETH-USD,0.5,2000\n"
-        "TSLA,3,250\n"
-        "ETFSP500.WA,10,125,IKZE\n"
-        "ACN,26,320\n"
-        "VWCE.DE,2,100,IKE"
-    )
-
-    if "positions_text" not in st.session_state:
-        saved = load_saved_positions()
-        st.session_state["positions_text"] = saved if (saved and saved.strip()) else default_positions
-
-    def on_positions_change():
-        save_positions(st.session_state["positions_text"])
+    source = st.sidebar.radio("Źródło", ["Lista", "Rejestr transakcji"], horizontal=True, key="positions_source")
+    if source == "Lista":
+        st.sidebar.caption("Format: TICKER,ILOŚĆ[,CENA_ZAKUPU][,KONTO]  (KONTO: IKE/IKZE opcjonalnie)")
+
+        default_positions = (
+            "BTC-USD,0.02,35000\n"
+            "ETH-USD,0.5,2000\n"
+            "TSLA,3,250\n"
+            "ETFSP500.WA,10,125,IKZE\n"
+            "ACN,26,320\n"
+            "VWCE.DE,2,100,IKE"
+        )
 
-    positions_text = st.sidebar.text_area(
-        "Twoje pozycje (1 linia = 1 pozycja)",
-        key="positions_text",
-        height=220,
-        on_change=on_positions_change,
-    )
+        positions_text = portfolio_sidebar(get_store(), user, default_positions)
+    else:
+        ledger_sidebar(get_ledger())
+    symbols_box = st.sidebar.container()  # wyszukiwarka + walidacja tickerów, wypełniana po parsowaniu
 
     st.sidebar.markdown("---")
     if st.sidebar.button("🔄 Odśwież"):
-        st.cache_data.clear()
+        # tylko notowania i kursy – nazwy i historia na dysku zostają
+        get_quote_cache().invalidate()
+        get_fx_cache().invalidate()
         st.rerun()
+    st.sidebar.toggle(f"📺 Tabela na żywo (co {LIVE_SECONDS} s)", key="table_live")
+    alerts_sidebar(get_alerts())
 
     # ---------------- Parse
-    df = parse_positions(positions_text)
+    # parser trzymany w sesji: po edycji jednej linii parsujemy tylko ją
+    symbols = get_symbols()
+    parser = st.session_state.get("position_parser")
+    if parser is None or parser.symbols is not symbols:  # nowy indeks = nowe waluty
+        st.session_state["position_parser"] = PositionParser(symbols)
+    realized = None
+    with METRICS.stage("parse"):
+        if source == "Lista":
+            df, parse_errors = st.session_state["position_parser"].parse(positions_text)
+        else:
+            # z rejestru: ta sama ramka co z parsera, cena zakupu = koszt FIFO otwartych partii
+            # (ramki z rejestru są współdzielone – waluta z indeksu na kopii)
+            df, parse_errors = get_ledger().positions(), []
+            df = df.assign(CurrencyHint=symbols.currency_hint(df["Ticker"]))
+            realized = get_ledger().realized()
+            realized = realized.assign(CurrencyHint=symbols.currency_hint(realized["Ticker"]))
+    if parse_errors:
+        st.sidebar.warning(
+            "Pominięte/niepełne linie:\n"
+            + "\n".join(f"- linia {e.line_no}: `{e.line}` – {e.reason}" for e in parse_errors[:10])
+            + (f"\n- … i {len(parse_errors) - 10} więcej" if len(parse_errors) > 10 else "")
+        )
+    with symbols_box:
+        symbols_sidebar(symbols, df["Ticker"].dropna().unique().tolist())
     if df.empty:
         st.info("Dodaj pozycje w panelu po lewej.")
         return
 
     # ---------------- FX + Prices
-    usd_pln = fx_rate("USDPLN=X")
-    eur_pln = fx_rate("EURPLN=X")
-
+    currencies = tuple(sorted(df["CurrencyHint"].dropna().unique()))
+    # zamknięte pozycje też mają walutę – kurs potrzebny do przeliczenia zrealizowanego P/L
+    fx_currencies = tuple(sorted({*currencies, *(realized["CurrencyHint"] if realized is not None else [])}))
     tickers = df["Ticker"].dropna().unique().tolist()
-    with st.spinner("Pobieram ceny rynkowe (bulk)…"):
-        bulk = get_prices_bulk(tickers)
-
-    df = df.merge(bulk, on="Ticker", how="left")
-    df["Trend1m"] = df.apply(lambda r: compute_trend(r["Price"], r["First1m"]), axis=1)
-    df["Trend1w"] = df.apply(lambda r: compute_trend(r["Price"], r["First1w"]), axis=1)
-    df["Currency"] = df["CurrencyHint"]
-
-    # ---------------- Names
-    # (cache 1/day; for crypto uses map)
-    df["Name"] = df["Ticker"].apply(get_name_slow)
-
-    # ---------------- Values
-    def value_pln(row):
-        if pd.isna(row["Price"]) or pd.isna(row["Quantity"]):
-            return np.nan
-        curr = row["Currency"]
-        if curr == "PLN":
-            return row["Price"] * row["Quantity"]
-        if curr == "USD":
-            return np.nan if usd_pln is None else row["Price"] * row["Quantity"] * usd_pln
-        if curr == "EUR":
-            return np.nan if eur_pln is None else row["Price"] * row["Quantity"] * eur_pln
-        return np.nan
-
-    def purchase_value_pln(row):
-        if pd.isna(row["PurchasePrice"]) or pd.isna(row["Quantity"]):
-            return np.nan
-        curr = row["Currency"]
-        if curr == "PLN":
-            return row["PurchasePrice"] * row["Quantity"]
-        if curr == "USD":
-            return np.nan if usd_pln is None else row["PurchasePrice"] * row["Quantity"] * usd_pln
-        if curr == "EUR":
-            return np.nan if eur_pln is None else row["PurchasePrice"] * row["Quantity"] * eur_pln
-        return np.nan
-
-    df["Value_PLN"] = df.apply(value_pln, axis=1)
-    df["PurchaseValue_PLN"] = df.apply(purchase_value_pln, axis=1)
-    df["PL_Value_PLN"] = df["Value_PLN"] - df["PurchaseValue_PLN"]
-    df["PL_Percent"] = np.where(
-        df["PurchaseValue_PLN"] > 0,
-        df["PL_Value_PLN"] / df["PurchaseValue_PLN"] * 100,
-        np.nan,
-    )
+    refresher = get_refresher()
+    refresher.register(tickers, fx_currencies, df)
+    alert_toasts()
+
+    # ---------------- Names + Values
+    # (nazwy: cache na dysku; brakujące dociągane w tle, do tego czasu pokazujemy ticker)
+    resolver = get_name_resolver()
+    names_version = resolver.version
+    positions_key = positions_text if source == "Lista" else f"ledger:{get_ledger().version}"
+    positions = df
+    df, fx = valued_positions(positions, positions_key, fx_currencies)
 
     valid = df.dropna(subset=["Price"])
 
@@ -557,92 +954,46 @@ def main():
         if not valid.empty
         else {}
     )
-    total_usd_assets_pln = float(by_curr.get("USD", 0.0))
-    total_eur_assets_pln = float(by_curr.get("EUR", 0.0))
-    total_pln_assets_pln = float(by_curr.get("PLN", 0.0))
-
-    k1, k2, k3, k4 = st.columns(4)
-    with k1:
-        st.metric("Total value (PLN)", fmt_num(total_pln, 2))
-    with k2:
-        st.metric("Assets in USD (PLN)", fmt_num(total_usd_assets_pln, 2))
-    with k3:
-        st.metric("Assets in EUR (PLN)", fmt_num(total_eur_assets_pln, 2))
-    with k4:
-        st.metric("Assets in PLN (PLN)", fmt_num(total_pln_assets_pln, 2))
-
-    st.caption("Aktualizacja: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-    # ---------------- Filters (one consolidated space)
-    st.markdown("## Filtry")
-    with st.container():
-        a, b, c = st.columns([1.2, 1.2, 1.0])
-
-        with a:
-            account_filter = st.multiselect(
-                "Konto",
-                ["STANDARD", "IKE", "IKZE"],
-                default=["STANDARD", "IKE", "IKZE"],
-            )
-        with b:
-            cat_filter = st.multiselect(
-                "Kategoria",
-                ["STOCK", "CRYPTO", "IKE", "IKZE"],
-                default=["STOCK", "CRYPTO", "IKE", "IKZE"],
-            )
-        with c:
-            curr_filter = st.multiselect(
-                "Waluta",
-                ["USD", "EUR", "PLN"],
-                default=["USD", "EUR", "PLN"],
-            )
-
-    view = df[
-        df["Account"].isin(account_filter)
-        & df["Category"].isin(cat_filter)
-        & df["Currency"].isin(curr_filter)
-    ].copy()
+    # USD / EUR / PLN zawsze, pozostałe waluty tylko gdy występują w portfelu
+    metric_currencies = list(dict.fromkeys(["USD", "EUR", "PLN", *currencies]))
+    metrics = [("Total value (PLN)", total_pln)] + [
+        (f"Assets in {c} (PLN)", float(by_curr.get(c, 0.0))) for c in metric_currencies
+    ]
+    for start in range(0, len(metrics), 4):
+        cols = st.columns(4)
+        for col, (label, value) in zip(cols, metrics[start : start + 4]):
+            with col:
+                st.metric(label, fmt_num(value, 2))
+    if realized is not None and not realized.empty:
+        realized_pln = float((realized["RealizedPL"] * fx_vector(realized["CurrencyHint"], rates_to(fx))).sum())
+        st.caption(f"Zrealizowany zysk/strata (FIFO, po bieżących kursach): {fmt_num(realized_pln, 2)} PLN")
+
+    # strona renderuje się z ostatniego snapshotu – pokazujemy, ile ma lat
+    age = max(a for a in (get_quote_cache().age(tickers), get_fx_cache().age(currencies), 0.0) if a is not None)
+    fetched_at = datetime.now() - timedelta(seconds=age)
+    st.caption(
+        f"Notowania z {fetched_at.strftime('%Y-%m-%d %H:%M:%S')} ({age:.0f} s temu, odświeżane w tle co {QUOTE_TTL} s)"
+    )
+    if age > 3 * QUOTE_TTL and refresher.last_error:
+        st.caption(f"⚠️ Odświeżanie w tle nie działa: {refresher.last_error}")
 
-    missing = view[view["Price"].isna()]["Ticker"].dropna().unique().tolist()
-    if missing:
-        st.warning("Brak danych cenowych dla: " + ", ".join(missing) + ". (Sprawdź ticker w Yahoo Finance.)")
+    # filtry, tabela i wykresy to osobne fragmenty: klik w nich przelicza tylko swoją sekcję
+    live = st.session_state.get("table_live", False)
+    revalue = (lambda: valued_positions(positions, positions_key, fx_currencies)[0]) if live else None
+    st.fragment(render_positions, run_every=LIVE_SECONDS if live else None)(df, metric_currencies, revalue)
 
-    # ---------------- Table
-    st.markdown("## 📊 Pozycje")
-    render_table_component(view)
+    if resolver.pending():
+        await_names(resolver, names_version)
 
-    # ---------------- Export
-    export_cols = [
-        "Name",
-        "PL_Value_PLN",
-        "PL_Percent",
-        "Trend1m",
-        "Trend1w",
-        "Ticker",
-        "Category",
-        "Currency",
-        "Quantity",
-        "PurchasePrice",
-        "Price",
-        "Value_PLN",
-    ]
-    csv = view[export_cols].to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Pobierz CSV", csv, file_name="portfolio.csv", mime="text/csv")
+    render_charts(df, valid, total_pln, user)
 
-    # ---------------- Composition chart
-    st.markdown("## 📈 Struktura portfela")
-    if not valid.empty and total_pln > 0:
-        grp = (
-            valid.groupby("Category", as_index=False)["Value_PLN"]
-            .sum()
-            .sort_values("Value_PLN", ascending=False)
-        )
-        fig = px.pie(grp, names="Category", values="Value_PLN", title="Udział kategorii (PLN)", template="plotly_white")
-        fig.update_layout(paper_bgcolor="white", plot_bgcolor="white", font_color="#0f172a")
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.info("Brak danych do wykresu struktury.")
+    # ---------------- Diagnostics (optional)
+    if st.sidebar.checkbox("🩺 Diagnostyka", key="show_diagnostics"):
+        render_diagnostics()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        METRICS.write_prometheus(METRICS_FILE)
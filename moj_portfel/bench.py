@@ -0,0 +1,289 @@
+# coding: utf-8
+"""
+Benchmark: parse -> download -> prices -> valuation -> table render, no network.
+
+    python bench.py                       # porównanie z bench_baseline.json
+    python bench.py --sizes 10 1000       # wybrane rozmiary portfela
+    python bench.py --update-baseline     # zapisz bieżące wyniki jako nowy baseline
+
+Kończy się kodem 1, gdy któryś etap jest wolniejszy / cięższy niż baseline * tolerancja.
+"""
+import argparse
+import gc
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import table
+from alerts import AlertEngine
+from core import EXPORT_COLUMNS
+from download import ChunkedDownloader
+from export import write_frame
+from fake_market import FakeMarket
+from fx import fetch_rate_matrix, fx_symbols, rates_to
+from history import CloseMatrix, ValueHistory, sync
+from ledger import Ledger
+from parsing import PositionParser
+from price_store import PriceStore, month_ago, summarize, top_up
+from providers import FakeProvider, RecordingProvider, ReplayProvider
+from quote_cache import QuoteCache
+from rebalance import current_targets, rebalance
+from risk import ReturnCache, covariance, risk_table
+from symbols import SymbolIndex, build_index
+from valuation import value_positions
+
+BASELINE_FILE = Path(__file__).with_name("bench_baseline.json")
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+SUFFIXES = ["", "-USD", ".WA", ".DE", ".PA", ".AS", ".L", ".SW", ".ST", ".T"]
+ACCOUNTS = ["", "IKE", "IKZE"]
+
+# poniżej tych progów różnice to szum pomiarowy
+MIN_SECONDS = 0.05
+MIN_BYTES = 4 * 1024 * 1024
+HISTORY_TICKERS = 500  # wykres wartości: setki tickerów x HISTORY_YEARS lat
+HISTORY_YEARS = 5
+
+
+def synthetic_positions(n: int, seed: int = 0) -> str:
+    """n position lines over a universe of ~n/4 tickers (lots repeat, like broker exports)."""
+    rng = np.random.default_rng(seed)
+    universe = max(5, min(n // 4, 10000))
+    ids = rng.integers(0, universe, n)
+    suffix = np.array(SUFFIXES, dtype=object)[ids % len(SUFFIXES)]
+    qty = rng.uniform(0.01, 500, n).round(4)
+    price = rng.uniform(1, 1000, n).round(2)
+    account = np.array(ACCOUNTS, dtype=object)[rng.integers(0, len(ACCOUNTS), n)]
+    lines = [
+        f"SYM{i}{sfx},{q},{p},{a}".rstrip(",")
+        for i, sfx, q, p, a in zip(ids.tolist(), suffix.tolist(), qty.tolist(), price.tolist(), account.tolist())
+    ]
+    return "\n".join(lines)
+
+
+def timed(fn: Callable):
+    gc.collect()
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def peak_memory(fn: Callable) -> int:
+    # osobny przebieg: tracemalloc sam w sobie spowalnia kod
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(n: int, latency: float, memory: bool) -> dict[str, dict]:
+    today = date.today()
+    text = synthetic_positions(n)
+    market = FakeMarket(latency=latency, today=today)
+    stages: dict[str, dict] = {}
+
+    def record(name, fn):
+        requests, received = market.requests, market.bytes
+        result, seconds = timed(fn)
+        stages[name] = {
+            "seconds": round(seconds, 4),
+            "requests": market.requests - requests,
+            "bytes": market.bytes - received,
+            "peak_bytes": peak_memory(fn) if memory else 0,
+        }
+        return result
+
+    df, _ = record("parse", lambda: PositionParser().parse(text))
+    tickers = df["Ticker"].unique().tolist()
+
+    # indeks symboli z wszystkimi tickerami portfela: waluty przy parsowaniu + jedno wyszukiwanie z paska bocznego
+    with tempfile.TemporaryDirectory() as tmp:
+        listed = pd.Series(tickers)
+        build_index(pd.DataFrame({"Symbol": listed, "Name": "Spółka " + listed, "Currency": "USD", "Exchange": ""}), Path(tmp))
+        symbols = SymbolIndex(Path(tmp))
+        record("symbols", lambda: (symbols.currency_hint(df["Ticker"]), symbols.search("sym1")))
+        del symbols  # memmapy zamknięte przed usunięciem katalogu (Windows)
+
+    # ta sama ścieżka co w aplikacji: paczki po 50, 4 wątki, ponowienia
+    downloader = ChunkedDownloader()
+    record("download", lambda: downloader(lambda c: market.download(c, period="1d", group_by="ticker"), tickers))
+
+    # te same paczki nagrane na dysk i odtworzone bez sieci (tryb replay)
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = RecordingProvider(FakeProvider(market), Path(tmp))
+        downloader(lambda c: recorder.download(c, period="1d"), tickers)
+        replay = ReplayProvider(Path(tmp))
+        record("replay", lambda: ChunkedDownloader(retries=0)(lambda c: replay.download(c, period="1d"), tickers))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "history.sqlite"
+
+        def prices_cold():
+            db.unlink(missing_ok=True)
+            store = PriceStore(db)
+            top_up(store, tickers, lambda t, s: market.download(t, start=s, group_by="ticker"), today)
+            return summarize(store.load(tickers, month_ago(today)), tickers)
+
+        def prices_warm():
+            store = PriceStore(db)
+            top_up(store, tickers, lambda t, s: market.download(t, start=s, group_by="ticker"), today)
+            return summarize(store.load(tickers, month_ago(today)), tickers)
+
+        record("prices_cold", prices_cold)
+        bulk = record("prices_warm", prices_warm)
+
+    def valuation():
+        merged = df.merge(bulk, on="Ticker", how="left")
+        merged["Currency"] = merged["CurrencyHint"]
+        merged["Name"] = merged["Ticker"]
+        fx = fetch_rate_matrix(sorted(merged["Currency"].unique()), lambda s: market.download(s, period="5d"))
+        return value_positions(merged, rates_to(fx))
+
+    view = record("valuation", valuation)
+
+    # wspólny snapshot notowań: 10 sesji czyta te same tablice (bez kopii) – tylko klucz wyceny z własnych wierszy
+    shared = QuoteCache()
+    shared.put(bulk)
+    record("snapshot", lambda: [shared.get(tickers, lambda t: bulk)[0].digest(tickers) for _ in range(10)])
+
+    def render():
+        table._page_cache.clear()
+        page = table.sort_view(view, "VPN (PLN)", False).iloc[:50]
+        return table.TableFeed().push(page)  # pierwsze wysłanie strony, bez cache komórek
+
+    record("render", render)
+
+    # eksport całego widoku do CSV paczkami – koszt, który aplikacja ponosi dopiero po kliknięciu "Pobierz"
+    record("export", lambda: write_frame(view[EXPORT_COLUMNS], "csv", io.BytesIO()))
+
+    # rebalansowanie: cele = bieżące wagi w odwrotnej kolejności koszyków (jeden QP + rozkład na tickery)
+    goal = current_targets(view)
+    goal["Weight"] = goal["Weight"].to_numpy()[::-1]
+    record("rebalance", lambda: rebalance(view, goal))
+
+    # tabela na żywo: pierwsza strona już wysłana, mierzymy kolejne wypchnięcie z kilkoma zmienionymi cenami
+    feed = table.TableFeed()
+    page = table.sort_view(view, "VPN (PLN)", False).iloc[:250]
+    feed.push(page)
+    moved = page.assign(Price=page["Price"].where(np.arange(len(page)) % 25 != 0, page["Price"] * 1.01))
+    record("live_delta", lambda: feed.push(moved))
+
+    # alerty: dwie reguły cenowe na ticker, pierwsze przejście (stan) poza pomiarem, mierzymy kolejne
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = AlertEngine(Path(tmp) / "alerts.json", Path(tmp) / "alerts.jsonl")
+        held = view.drop_duplicates("Ticker")
+        engine.set_rules(
+            pd.concat(
+                [
+                    pd.DataFrame({"Ticker": held["Ticker"], "Field": "Price", "Op": "above", "Threshold": held["Price"] * 1.05}),
+                    pd.DataFrame({"Ticker": held["Ticker"], "Field": "Price", "Op": "below", "Threshold": held["Price"] * 0.95}),
+                ]
+            ).dropna(subset=["Threshold"])
+        )
+        engine.evaluate(view)
+        record("alerts", lambda: engine.evaluate(view.assign(Price=view["Price"] * 1.1)))
+
+    # historia wartości: synchronizacja poza pomiarem, mierzymy odczyt macierzy (memmap) + iloczyn
+    with tempfile.TemporaryDirectory() as tmp:
+        held = df[df["Ticker"].isin(tickers[:HISTORY_TICKERS])]
+        matrix = CloseMatrix(Path(tmp), today.replace(year=today.year - HISTORY_YEARS, day=1))
+        symbols = held["Ticker"].unique().tolist() + fx_symbols(held["CurrencyHint"].unique())
+        sync(matrix, symbols, lambda t, s: market.download(t, start=s, group_by="ticker"), today)
+        record("history", lambda: ValueHistory(CloseMatrix(Path(tmp), today)).values(held))
+
+        def risk():
+            history = ValueHistory(CloseMatrix(Path(tmp), today))
+            risk_frame = risk_table(history.values(held)["Account"])
+            unique = held.drop_duplicates("Ticker")
+            returns = ReturnCache(history).returns(unique["Ticker"].tolist(), unique["CurrencyHint"].tolist())
+            return risk_frame, covariance(returns.iloc[:, :20].to_numpy())
+
+        record("risk", risk)
+
+    # rejestr: n transakcji kupna po tickerach z listy; mierzymy ponowne otwarcie (checkpoint) + pozycje
+    with tempfile.TemporaryDirectory() as tmp:
+        trades = df[["Ticker", "Quantity", "Account"]].assign(
+            Time=pd.Timestamp(today), Kind="BUY", Price=df["PurchasePrice"].fillna(0.0)
+        )
+        Ledger(tmp).append(trades)
+        record("ledger_load", lambda: Ledger(tmp).positions())
+    return stages
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    failures = []
+    for size, stages in results.items():
+        for stage, got in stages.items():
+            ref = baseline.get("results", {}).get(size, {}).get(stage)
+            if not ref:
+                continue
+            if got["seconds"] > ref["seconds"] * tolerance and got["seconds"] - ref["seconds"] > MIN_SECONDS:
+                failures.append(f"{size:>7} {stage:<12} time {ref['seconds']:.3f}s -> {got['seconds']:.3f}s")
+            if got["peak_bytes"] and not ref.get("peak_bytes"):
+                # etap bez pomiaru pamięci w baseline nie może przejść bramki po cichu
+                failures.append(f"{size:>7} {stage:<12} memory: brak baseline (uruchom z --update-baseline bez --no-memory)")
+            elif (
+                got["peak_bytes"]
+                and got["peak_bytes"] > ref["peak_bytes"] * tolerance
+                and got["peak_bytes"] - ref["peak_bytes"] > MIN_BYTES
+            ):
+                failures.append(
+                    f"{size:>7} {stage:<12} memory {ref['peak_bytes'] / 2**20:.1f}MB -> {got['peak_bytes'] / 2**20:.1f}MB"
+                )
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--latency", type=float, default=0.05, help="sztuczne opóźnienie jednego zapytania (s)")
+    ap.add_argument("--tolerance", type=float, default=1.5, help="dopuszczalny mnożnik względem baseline")
+    ap.add_argument("--no-memory", action="store_true", help="pomiń pomiar pamięci (tracemalloc)")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args(argv)
+    if args.update_baseline and args.no_memory:
+        ap.error("baseline musi zawierać pomiar pamięci – uruchom --update-baseline bez --no-memory")
+
+    results = {}
+    print(f"{'size':>7} {'stage':<12} {'seconds':>9} {'peak MB':>9} {'requests':>9} {'KB in':>9}")
+    for n in args.sizes:
+        stages = run_size(n, args.latency, not args.no_memory)
+        results[str(n)] = stages
+        for stage, r in stages.items():
+            print(
+                f"{n:>7} {stage:<12} {r['seconds']:>9.3f} {r['peak_bytes'] / 2**20:>9.1f}"
+                f" {r['requests']:>9} {r['bytes'] / 1024:>9.1f}"
+            )
+
+    if args.update_baseline:
+        payload = {"latency": args.latency, "pandas": pd.__version__, "results": results}
+        args.baseline.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline zapisany: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("Brak baseline – uruchom z --update-baseline.")
+        return 0
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("latency") != args.latency:
+        print(f"Uwaga: baseline mierzony z latency={baseline.get('latency')}, teraz {args.latency}.")
+    failures = compare(results, baseline, args.tolerance)
+    for f in failures:
+        print("REGRESJA", f)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
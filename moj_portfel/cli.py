@@ -0,0 +1,121 @@
+# coding: utf-8
+"""
+Wycena portfeli bez Streamlit (cron, raporty wsadowe dla wielu plików pozycji).
+
+    python -m moj_portfel klient1.txt klient2.txt              # klient1.csv, klient2.csv w bieżącym katalogu
+    python -m moj_portfel portfele/*.txt --format parquet --out raporty/
+    python -m moj_portfel portfel.txt --format xlsx            # arkusz (xlsxwriter albo openpyxl)
+    python -m moj_portfel portfel.txt --format json --out -    # na stdout (wiele plików: kolumna Portfolio)
+    python -m moj_portfel portfele/*.txt --provider replay     # z nagranych odpowiedzi, bez sieci
+
+Pliki w formacie pola "Twoje pozycje": TICKER,ILOŚĆ[,CENA_ZAKUPU][,KONTO].
+Notowania i kursy pobierane raz dla sumy tickerów wszystkich plików; parsowanie,
+wycena i zapis idą w puli procesów, po pliku na zadanie.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from core import EXPORT_COLUMNS, Pricer, load_names, value_frame
+from export import FORMATS, missing_dependency, write_frame
+from parsing import PositionParser
+from price_store import QUOTE_COLUMNS, PriceStore
+from providers import PROVIDERS, RECORD_DIR, make_provider
+from symbols import SymbolIndex
+
+HISTORY_FILE = Path("price_history.sqlite")
+NAMES_FILE = Path("saved_names.json")
+SYMBOLS_DIR = Path("symbols")
+
+
+def _parse(path: Path, symbols: Path | None = None) -> tuple[pd.DataFrame, int]:
+    # indeks otwierany w procesie roboczym (memmap – tanio), nie przesyłany z procesu głównego
+    parser = PositionParser(SymbolIndex(symbols) if symbols is not None else None)
+    positions, errors = parser.parse(path.read_text(encoding="utf-8"))
+    return positions, len(errors)
+
+
+def _value(task: tuple) -> tuple[pd.DataFrame | None, float]:
+    positions, quotes, fx, names, fmt, target = task
+    df = value_frame(positions, quotes, fx, names)[EXPORT_COLUMNS]
+    total = float(df["Value_PLN"].sum(skipna=True))
+    if target is None:
+        return df, total  # zbiorczo na stdout – pisze proces główny
+    write_frame(df, fmt, target)
+    return None, total
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", type=Path, nargs="+", help="pliki pozycji")
+    ap.add_argument("--format", choices=list(FORMATS), default="csv")
+    ap.add_argument("--out", default=".", help="katalog wyników albo '-' (stdout)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesy wyceny")
+    ap.add_argument("--provider", choices=PROVIDERS, default=os.environ.get("PORTFEL_PROVIDER", "yahoo"))
+    ap.add_argument("--record-dir", type=Path, default=Path(os.environ.get("PORTFEL_RECORD_DIR", str(RECORD_DIR))))
+    ap.add_argument("--history", type=Path, default=HISTORY_FILE, help="baza dziennych zamknięć (jak w aplikacji)")
+    ap.add_argument("--names", type=Path, default=NAMES_FILE, help="cache nazw tickerów z aplikacji")
+    ap.add_argument("--symbols", type=Path, default=SYMBOLS_DIR, help="indeks symboli aplikacji (waluty notowań)")
+    args = ap.parse_args(argv)
+
+    missing = [f for f in args.files if not f.is_file()]
+    if missing:
+        print("Brak pliku: " + ", ".join(map(str, missing)), file=sys.stderr)
+        return 1
+    problem = missing_dependency(args.format)
+    if problem:
+        print(f"--format {args.format}: {problem}", file=sys.stderr)
+        return 1
+    to_stdout = args.out == "-"
+    out = Path(args.out)
+    if not to_stdout:
+        out.mkdir(parents=True, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(args.files)))
+    pool: Executor | None = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    run = pool.map if pool is not None else map
+    try:
+        symbols = args.symbols if (args.symbols / "meta.json").exists() else None
+        parsed = list(run(partial(_parse, symbols=symbols), args.files))
+
+        # notowania i kursy raz dla wszystkich portfeli (sieć: wątki w ChunkedDownloader)
+        every = pd.concat([p for p, _ in parsed])
+        tickers = every["Ticker"].dropna().unique().tolist()
+        pricer = Pricer(make_provider(args.provider, args.record_dir), PriceStore(args.history))
+        quotes = pricer.quotes(tickers) if tickers else pd.DataFrame(columns=QUOTE_COLUMNS)
+        fx = pricer.fx(sorted(every["CurrencyHint"].dropna().unique()))
+        names = load_names(args.names)
+
+        tasks = [
+            (
+                positions,
+                quotes[quotes["Ticker"].isin(positions["Ticker"])],  # do procesu idzie tylko potrzebny wycinek
+                fx,
+                {t: names[t] for t in positions["Ticker"].unique() if t in names},
+                args.format,
+                None if to_stdout else out / f"{path.stem}.{args.format}",
+            )
+            for path, (positions, _) in zip(args.files, parsed)
+        ]
+        results = list(run(_value, tasks))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for path, (positions, errors), (_, total) in zip(args.files, parsed, results):
+        print(f"{path}: {len(positions)} pozycji, {total:,.2f} PLN, pominiętych linii: {errors}", file=sys.stderr)
+    if to_stdout:
+        frames = [df for df, _ in results]
+        if len(frames) > 1:
+            frames = [df.assign(Portfolio=path.stem) for path, df in zip(args.files, frames)]
+        write_frame(pd.concat(frames, ignore_index=True), args.format, sys.stdout.buffer)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
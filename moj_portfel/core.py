@@ -0,0 +1,155 @@
+# coding: utf-8
+import json
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from anchors import AnchorCache, last_prices, trading_days
+from download import ChunkedDownloader
+from fx import fetch_rate_matrix, rates_to
+from instrumentation import METRICS
+from parsing import PositionParser
+from price_store import QUOTE_COLUMNS, PriceStore, month_ago, summarize, top_up
+from providers import Provider
+from valuation import value_positions
+
+# ======================================================
+# Streamlit-free pipeline: positions -> quotes + FX -> valued frame
+# (app.py wraps it in st.cache_resource singletons; the CLI uses it directly)
+# ======================================================
+DOWNLOAD_CHUNK = 50  # tickerów na jedno zapytanie do Yahoo
+# kolumny eksportu (CSV w aplikacji, pliki z CLI)
+EXPORT_COLUMNS = [
+    "Name",
+    "PL_Value_PLN",
+    "PL_Percent",
+    "Trend1m",
+    "Trend1w",
+    "Ticker",
+    "Category",
+    "Currency",
+    "Quantity",
+    "PurchasePrice",
+    "Price",
+    "Value_PLN",
+]
+
+# Name lookup – minimal + stable
+NAME_MAP = {
+    "BTC-USD": "Bitcoin",
+    "ETH-USD": "Ethereum",
+    "SOL-USD": "Solana",
+    "ADA-USD": "Cardano",
+    "XRP-USD": "XRP",
+    "DOGE-USD": "Dogecoin",
+}
+
+
+class Pricer:
+    """Last prices, 1W/1M anchors and FX for any ticker set, from one provider.
+
+    Daily history goes to the on-disk PriceStore (topped up once per exchange
+    session); within a session only the one-bar snapshot is downloaded.
+    """
+
+    def __init__(
+        self,
+        provider: Provider,
+        store: PriceStore,
+        anchors: AnchorCache | None = None,
+        downloader: ChunkedDownloader | None = None,
+    ):
+        self.provider = provider
+        self.store = store
+        self.anchors = anchors if anchors is not None else AnchorCache()
+        # lokalne źródło (replay/fake) nie potrzebuje ponowień z opóźnieniem
+        self.downloader = downloader or ChunkedDownloader(DOWNLOAD_CHUNK, retries=0 if provider.offline else 3)
+
+    def download(
+        self, source: str, symbols: list[str], on_chunk: Callable[[pd.DataFrame], None] | None = None, **kwargs
+    ) -> pd.DataFrame:
+        """Chunked, concurrent download; failed chunks are counted and skipped, `on_chunk` sees each as it arrives."""
+
+        def fetch(chunk: list[str]) -> pd.DataFrame:
+            raw = self.provider.download(chunk, **kwargs)
+            METRICS.request(source, raw)
+            return raw
+
+        return self.downloader(
+            fetch,
+            symbols,
+            on_chunk=on_chunk,
+            on_failed=lambda failed: METRICS.inc("download_failed_symbols_total", len(failed), source=source),
+        )
+
+    def download_history(self, tickers: list[str], start: date, on_chunk=None) -> pd.DataFrame:
+        return self.download("prices", tickers, on_chunk, start=start.isoformat(), interval="1d")
+
+    def download_snapshot(self, tickers: list[str], on_chunk=None) -> pd.DataFrame:
+        # tylko bieżąca sesja – po jednym słupku na ticker
+        return self.download("snapshot", tickers, on_chunk, period="1d", interval="1d")
+
+    def download_fx(self, symbols: list[str]) -> pd.DataFrame:
+        return self.download("fx", symbols, period="5d", interval="1d")
+
+    def quotes(self, tickers: list[str]) -> pd.DataFrame:
+        """QUOTE_COLUMNS frame for the tickers (no st.* calls – also runs in the refresh thread)."""
+        today = date.today()
+        days = trading_days(tickers, datetime.now(timezone.utc))
+
+        # 1W / 1M liczymy raz na sesję giełdy: wtedy dociągamy historię dzienną na dysk
+        need_anchors = self.anchors.missing(tickers, days)
+        if need_anchors:
+            try:
+                # każda paczka trafia do PriceStore zaraz po pobraniu, nie dopiero po ostatniej
+                top_up(self.store, need_anchors, self.download_history, today, chunked=True)
+            except Exception:
+                pass  # offline / Yahoo niedostępne -> liczymy z tego, co już jest na dysku
+            summary = summarize(self.store.load(need_anchors, month_ago(today)), need_anchors)
+            # tylko pełne kotwice: ticker z nieudanej paczki spróbujemy znowu przy następnym wywołaniu
+            self.anchors.put(summary[summary[["First1m", "First1w"]].notna().all(axis=1)], days)
+
+        # w ciągu sesji: tylko lekki snapshot ostatniej ceny (historia właśnie pobrana jest już aktualna)
+        fresh = set(need_anchors)
+        poll = [t for t in tickers if t not in fresh]
+        if poll:
+            try:
+                self.download_snapshot(poll, lambda chunk: self.store.upsert(last_prices(chunk, poll)))
+            except Exception:
+                pass
+
+        prices = summarize(self.store.load(tickers, month_ago(today)), tickers)[["Ticker", "Price"]]
+        return prices.merge(self.anchors.get(tickers), on="Ticker", how="left")[QUOTE_COLUMNS]
+
+    def fx(self, currencies) -> pd.DataFrame:
+        """Rate matrix (see fx.rate_matrix) for the currencies, fetched now."""
+        return fetch_rate_matrix(currencies, self.download_fx)
+
+
+def load_names(path: Path) -> dict[str, str]:
+    """Ticker -> name from the app's name cache (saved_names.json), without any lookups."""
+    try:
+        meta = json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return dict(NAME_MAP)
+    names = {t: m["name"] for t, m in meta.items() if isinstance(m, dict) and m.get("name")}
+    return {**names, **NAME_MAP}
+
+
+def value_frame(positions: pd.DataFrame, quotes: pd.DataFrame, fx: pd.DataFrame, names: dict[str, str]) -> pd.DataFrame:
+    """Parsed positions merged with quotes and valued in PLN (ticker where the name is unknown)."""
+    df = positions.merge(quotes, on="Ticker", how="left")
+    df["Currency"] = df["CurrencyHint"]
+    df["Name"] = df["Ticker"].map(names).fillna(df["Ticker"])
+    return value_positions(df, rates_to(fx))
+
+
+def value_text(text: str, pricer: Pricer, names: dict[str, str] | None = None) -> tuple[pd.DataFrame, list]:
+    """(valued frame, parse errors) for one positions text, fetching what it needs."""
+    positions, errors = PositionParser().parse(text)
+    tickers = positions["Ticker"].dropna().unique().tolist()
+    currencies = sorted(positions["CurrencyHint"].dropna().unique())
+    quotes = pricer.quotes(tickers) if tickers else pd.DataFrame(columns=QUOTE_COLUMNS)
+    return value_frame(positions, quotes, pricer.fx(currencies), names or NAME_MAP), errors
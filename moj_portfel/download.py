@@ -0,0 +1,141 @@
+# coding: utf-8
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable
+
+import pandas as pd
+
+# ======================================================
+# Chunked, concurrent bulk downloads with retry + backoff
+# ======================================================
+# fetch(symbols) -> ramka jak z yf.download(group_by="ticker")
+ChunkFetcher = Callable[[list[str]], pd.DataFrame]
+
+CHUNK_SIZE = 50
+WORKERS = 4
+RETRIES = 3
+BACKOFF = 0.5  # s, pierwsze opóźnienie; dalej x2 z losowym rozrzutem
+MAX_BACKOFF = 8.0
+
+
+_request_cap = threading.local()
+
+
+@contextmanager
+def request_timeout(seconds: float | None):
+    """Cap the timeout of each HTTP request this thread sends through shared_session()."""
+    previous = getattr(_request_cap, "seconds", None)
+    _request_cap.seconds = seconds
+    try:
+        yield
+    finally:
+        _request_cap.seconds = previous
+
+
+@functools.cache
+def shared_session():
+    """One pooled HTTP session for every Yahoo request in the process (None -> yfinance default)."""
+    try:
+        from curl_cffi import requests as curl_requests  # zależność yfinance >= 0.2.5x
+    except ImportError:
+        return None
+
+    class Session(curl_requests.Session):
+        # yfinance podaje własny timeout (30 s) w każdym zapytaniu – request_timeout() go skraca
+        def request(self, *args, **kwargs):
+            cap = getattr(_request_cap, "seconds", None)
+            if cap is not None:
+                given = kwargs.get("timeout")
+                kwargs["timeout"] = min(given, cap) if isinstance(given, (int, float)) else cap
+            return super().request(*args, **kwargs)
+
+    return Session(impersonate="chrome")
+
+
+def chunks(symbols: list[str], size: int) -> list[list[str]]:
+    return [symbols[i : i + size] for i in range(0, len(symbols), size)]
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF, cap: float = MAX_BACKOFF, rand=random.random) -> float:
+    # "full jitter": losowo z [0, min(cap, base * 2^attempt)]
+    return rand() * min(cap, base * 2**attempt)
+
+
+def _as_grouped(frame: pd.DataFrame | None, chunk: list[str]) -> pd.DataFrame:
+    """Normalize to (ticker, field) columns; yfinance flattens single-symbol results."""
+    if frame is None or frame.empty:
+        return pd.DataFrame()
+    if isinstance(frame.columns, pd.MultiIndex):
+        return frame
+    return pd.concat({chunk[0]: frame}, axis=1)
+
+
+class ChunkedDownloader:
+    """Splits a symbol list into chunks and fetches them on a bounded pool.
+
+    Failed or empty chunks (Yahoo's usual answer to throttling) are retried with
+    exponential backoff and jitter; chunks that still fail are skipped, so the
+    caller gets whatever arrived instead of nothing.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        workers: int = WORKERS,
+        retries: int = RETRIES,
+        backoff: float = BACKOFF,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def _fetch_chunk(self, fetch: ChunkFetcher, chunk: list[str]) -> pd.DataFrame:
+        for attempt in range(self.retries + 1):
+            try:
+                frame = _as_grouped(fetch(chunk), chunk)
+                if not frame.empty:
+                    return frame
+            except Exception:
+                if attempt == self.retries:
+                    raise
+            if attempt < self.retries:
+                self.sleep(backoff_delay(attempt, self.backoff))
+        return pd.DataFrame()
+
+    def __call__(
+        self,
+        fetch: ChunkFetcher,
+        symbols: list[str],
+        on_chunk: Callable[[pd.DataFrame], None] | None = None,
+        on_failed: Callable[[list[str]], None] | None = None,
+    ) -> pd.DataFrame:
+        symbols = list(dict.fromkeys(symbols))
+        parts: list[pd.DataFrame] = []
+        if not symbols:
+            return pd.DataFrame()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as pool:
+            futures = {pool.submit(self._fetch_chunk, fetch, c): c for c in chunks(symbols, self.chunk_size)}
+            for fut in as_completed(futures):
+                try:
+                    frame = fut.result()
+                except Exception:
+                    frame = pd.DataFrame()
+                if frame.empty:
+                    if on_failed is not None:
+                        on_failed(futures[fut])
+                    continue
+                parts.append(frame)
+                if on_chunk is not None:
+                    on_chunk(frame)  # częściowe wyniki od razu, np. do zapisu na dysk
+
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, axis=1).sort_index()
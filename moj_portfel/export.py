@@ -0,0 +1,166 @@
+# coding: utf-8
+import hashlib
+import importlib.util
+import io
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO
+
+import pandas as pd
+
+from instrumentation import METRICS
+
+# ======================================================
+# Export: chunked writers (CSV / JSON / Parquet / XLSX), built on demand, cached by view hash
+# ======================================================
+EXPORT_CHUNK = 10_000  # wierszy na jeden zapis – pełny plik nigdy nie jest jednym napisem w pamięci
+SPOOL_BYTES = 8 << 20  # większe pliki budowane są w pliku tymczasowym zamiast w pamięci
+EXPORT_CACHE_BYTES = 64 << 20  # gotowych plików trzymanych w ExportCache
+XLSX_MAX_ROWS = 1_048_575  # limit arkusza Excela bez wiersza nagłówka
+# format -> (typ MIME, rozszerzenie)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def missing_dependency(fmt: str) -> str | None:
+    """Why the format cannot be written here (None when it can)."""
+    if fmt == "parquet" and not (_has("pyarrow") or _has("fastparquet")):
+        return "Parquet wymaga pakietu pyarrow (albo fastparquet)"
+    if fmt == "xlsx" and not (_has("xlsxwriter") or _has("openpyxl")):
+        return "XLSX wymaga pakietu xlsxwriter (albo openpyxl)"
+    return None
+
+
+def _chunks(df: pd.DataFrame, size: int = EXPORT_CHUNK):
+    for start in range(0, max(len(df), 1), size):
+        yield start, df.iloc[start : start + size]
+
+
+def _write_csv(df: pd.DataFrame, fh: BinaryIO):
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    for start, chunk in _chunks(df):
+        chunk.to_csv(text, index=False, header=start == 0)
+    text.flush()
+    text.detach()  # strumień zostaje otwarty dla wywołującego
+
+
+def _write_json(df: pd.DataFrame, fh: BinaryIO):
+    # jedna tablica rekordów jak df.to_json(orient="records"), doklejana paczkami
+    fh.write(b"[")
+    sep = b""
+    for _, chunk in _chunks(df):
+        body = chunk.to_json(orient="records", force_ascii=False, indent=1).strip()[1:-1].strip()
+        if body:
+            fh.write(sep + b"\n " + body.encode("utf-8"))
+            sep = b","
+    fh.write(b"\n]")
+
+
+def _write_parquet(df: pd.DataFrame, fh: BinaryIO):
+    if not _has("pyarrow"):
+        df.to_parquet(fh, index=False)  # fastparquet – bez zapisu paczkami
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # schemat z całej ramki: paczka z samymi pustymi wartościami nie zmienia typu kolumny
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fh, schema) as writer:
+        for _, chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))  # grupa wierszy
+
+
+def _write_xlsx(df: pd.DataFrame, fh: BinaryIO):
+    if len(df) > XLSX_MAX_ROWS:
+        raise ValueError(f"za dużo wierszy dla XLSX ({len(df):,} > {XLSX_MAX_ROWS:,}) – użyj CSV albo Parquet")
+    if not _has("xlsxwriter"):
+        with pd.ExcelWriter(fh, engine="openpyxl") as writer:
+            for start, chunk in _chunks(df):
+                chunk.to_excel(writer, sheet_name="Portfel", index=False, header=start == 0, startrow=start + (start > 0))
+        return
+    import xlsxwriter
+
+    # constant_memory: wiersze zrzucane na dysk zaraz po zapisaniu, nie cały arkusz w pamięci;
+    # działa tylko przy zapisie wiersz po wierszu (to_excel pisze kolumnami – komórki by ginęły)
+    workbook = xlsxwriter.Workbook(fh, {"constant_memory": True})
+    sheet = workbook.add_worksheet("Portfel")
+    sheet.write_row(0, 0, [str(c) for c in df.columns])
+    for start, chunk in _chunks(df):
+        rows = chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()  # NaN -> pusta komórka
+        for i, row in enumerate(rows, start=start + 1):
+            sheet.write_row(i, 0, row)
+    workbook.close()
+
+
+WRITERS = {"csv": _write_csv, "json": _write_json, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+def write_frame(df: pd.DataFrame, fmt: str, target: Path | BinaryIO) -> None:
+    """Write the frame in FORMATS to a path or a binary stream, EXPORT_CHUNK rows at a time."""
+    if fmt not in WRITERS:
+        raise ValueError(f"nieznany format {fmt!r} (dostępne: {', '.join(FORMATS)})")
+    if isinstance(target, (str, Path)):
+        with open(target, "wb") as fh:
+            WRITERS[fmt](df, fh)
+        return
+    # strumień (np. stdout) może nie umieć seek – plik składamy obok i przepisujemy
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        WRITERS[fmt](df, spool)
+        spool.seek(0)
+        shutil.copyfileobj(spool, target)
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Content hash of a frame (columns + values, not the index)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ExportCache:
+    """Built export files by (frame hash, format), least recently used dropped past `max_bytes`.
+
+    Nothing is serialized until get() is called, i.e. until someone downloads;
+    asking again for an unchanged view returns the stored bytes.
+    """
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._size = 0
+
+    def get(self, df: pd.DataFrame, fmt: str) -> bytes:
+        key = (frame_hash(df), fmt)
+        with self._lock:
+            data = self._files.get(key)
+            if data is not None:
+                self._files.move_to_end(key)
+        METRICS.cache("export", data is not None)
+        if data is not None:
+            return data
+
+        with METRICS.stage("export"), tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            WRITERS[fmt](df, spool)
+            spool.seek(0)
+            data = spool.read()
+        with self._lock:
+            if key not in self._files and len(data) <= self.max_bytes:
+                self._files[key] = data
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, old = self._files.popitem(last=False)
+                    self._size -= len(old)
+        return data
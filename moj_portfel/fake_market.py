@@ -0,0 +1,107 @@
+# coding: utf-8
+import threading
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# Offline, deterministic stand-in for yfinance (benchmarks, load tests)
+# ======================================================
+# przybliżone kursy, żeby wyceny w PLN miały sensowny rząd wielkości
+USD_QUOTES = {"PLN": 4.0, "EUR": 0.92, "GBP": 0.79, "CHF": 0.88, "SEK": 10.5, "JPY": 150.0}
+
+
+def _seed(symbol: str) -> int:
+    return zlib.crc32(symbol.encode("utf-8"))
+
+
+def _level(symbol: str) -> float:
+    seed = _seed(symbol)
+    if symbol.endswith("=X"):
+        pair = symbol[:-2]
+        base, quote = pair[:3], pair[3:]
+        usd = {"USD": 1.0, **USD_QUOTES}
+        return usd.get(quote, 1.0 + seed % 50) / usd.get(base, 1.0 + seed % 7)
+    return 5.0 + seed % 500
+
+
+def close_matrix(symbols: list[str], days: pd.DatetimeIndex) -> np.ndarray:
+    """Deterministic closes (days x symbols): the same (symbol, day) always gets the same price."""
+    level = np.array([_level(s) for s in symbols], dtype=float)
+    phase = np.array([(_seed(s) % 360) * np.pi / 180 for s in symbols], dtype=float)
+    ordinal = days.to_numpy().astype("datetime64[D]").astype(np.int64).astype(float)
+    return level * (1.0 + 0.02 * np.sin(ordinal[:, None] / 7.0 + phase))
+
+
+class FakeMarket:
+    """Drop-in for `yf.download` / `yf.Ticker` with configurable per-request latency.
+
+    Counts requests and (approximate) payload bytes, so callers can assert on
+    network cost without a network.
+    """
+
+    def __init__(self, latency: float = 0.0, today: date | None = None, missing: set[str] | None = None):
+        self.latency = latency
+        self.today = pd.Timestamp(today or date.today())
+        self.missing = set(missing or ())
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _hit(self, payload: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes += payload
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _days(self, start=None, period=None) -> pd.DatetimeIndex:
+        if start is not None:
+            first = pd.Timestamp(start)
+        else:
+            if period == "1d":  # jak Yahoo: ostatnia sesja, także w weekend
+                return pd.bdate_range(self.today - pd.DateOffset(days=7), self.today)[-1:]
+            offsets = {"5d": pd.DateOffset(days=7), "1mo": pd.DateOffset(months=1)}
+            first = self.today - offsets.get(period or "1mo", pd.DateOffset(months=1))
+        return pd.bdate_range(first, self.today)
+
+    def download(self, tickers, start=None, period=None, group_by=None, **kwargs) -> pd.DataFrame:
+        symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+        days = self._days(start, period)
+        known = [s for s in symbols if s not in self.missing]
+
+        # ~ 6 kolumn OHLCV x 8 bajtów na słupek
+        self._hit(48 * len(days) * len(known))
+        if not known or days.empty:
+            return pd.DataFrame()
+
+        close = close_matrix(known, days)
+        fields = {
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": np.full_like(close, 1000.0),
+        }
+        data = np.stack(list(fields.values()), axis=2).reshape(len(days), -1)
+        frame = pd.DataFrame(data, index=days, columns=pd.MultiIndex.from_product([known, list(fields)]))
+
+        if len(symbols) == 1 and group_by != "ticker":
+            return frame[known[0]]
+        return frame
+
+    def Ticker(self, symbol: str):
+        market = self
+
+        class _Ticker:
+            @property
+            def info(self):
+                market._hit(2048)
+                if symbol in market.missing:
+                    return {}
+                return {"shortName": f"Synthetic {symbol}", "currency": None, "exchange": "FAKE"}
+
+        return _Ticker()
@@ -0,0 +1,151 @@
+# coding: utf-8
+import threading
+import time
+from typing import Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+from price_store import extract_closes
+
+# ======================================================
+# FX: one batched request, crosses triangulated through USD
+# ======================================================
+BASE_CURRENCY = "PLN"
+
+# waluty "groszowe": Yahoo notuje np. LSE w pensach (GBp)
+SUBUNITS = {"GBp": ("GBP", 0.01), "ZAc": ("ZAR", 0.01), "ILA": ("ILS", 0.01)}
+
+# download(symbols) -> surowa ramka z yf.download(group_by="ticker")
+FxDownloader = Callable[[list[str]], pd.DataFrame]
+
+
+def major(currency: str) -> str:
+    return SUBUNITS.get(currency, (currency, 1.0))[0]
+
+
+def fx_symbols(currencies: Iterable[str], base: str = BASE_CURRENCY) -> list[str]:
+    """Yahoo pairs needed to price `currencies` in `base`.
+
+    Direct pairs (GBPPLN=X) are preferred; USD legs (USDGBP=X) are always
+    requested too, so any cross missing on Yahoo can be triangulated.
+    """
+    majors = sorted({major(c) for c in currencies} | {base})
+    symbols = [f"{c}{base}=X" for c in majors if c not in (base, "USD")]
+    symbols += [f"USD{c}=X" for c in majors if c != "USD"]
+    return list(dict.fromkeys(symbols))
+
+
+def last_quotes(raw: pd.DataFrame | None, symbols: list[str]) -> dict[str, float]:
+    closes = extract_closes(raw, symbols)
+    if closes.empty:
+        return {}
+    last = closes.sort_values("Day").groupby("Ticker")["Close"].last()
+    return {s: float(v) for s, v in last.items() if v > 0}
+
+
+def rate_matrix(quotes: dict[str, float], currencies: Iterable[str], base: str = BASE_CURRENCY) -> pd.DataFrame:
+    """Cross-rate matrix: matrix.loc[a, b] = units of b for 1 unit of a (NaN when unknown)."""
+    codes = sorted(set(currencies) | {base, "USD"})
+
+    # cena 1 USD w każdej walucie głównej
+    usd_in = {"USD": 1.0}
+    for c in {major(c) for c in codes} - {"USD"}:
+        usd_in[c] = quotes.get(f"USD{c}=X", np.nan)
+
+    # bezpośrednia para do waluty bazowej ma pierwszeństwo przed triangulacją
+    to_base = {}
+    for c in {major(c) for c in codes}:
+        if c == base:
+            to_base[c] = 1.0
+        elif f"{c}{base}=X" in quotes:
+            to_base[c] = quotes[f"{c}{base}=X"]
+        else:
+            to_base[c] = usd_in.get(base, np.nan) / usd_in.get(c, np.nan)
+
+    return matrix_from_base({c: to_base[major(c)] * SUBUNITS.get(c, (c, 1.0))[1] for c in codes})
+
+
+def matrix_from_base(in_base: dict[str, float]) -> pd.DataFrame:
+    """Cross-rate matrix from each currency's value in the base currency."""
+    codes = sorted(in_base)
+    v = np.array([in_base[c] for c in codes], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = v[:, None] / v[None, :]
+    return pd.DataFrame(matrix, index=codes, columns=codes)
+
+
+def fetch_rate_matrix(currencies: Iterable[str], download: FxDownloader, base: str = BASE_CURRENCY) -> pd.DataFrame:
+    currencies = list(currencies)
+    symbols = fx_symbols(currencies, base)
+    try:
+        quotes = last_quotes(download(symbols), symbols)
+    except Exception:
+        quotes = {}
+    return rate_matrix(quotes, currencies, base)
+
+
+def rates_to(matrix: pd.DataFrame, base: str = BASE_CURRENCY) -> dict[str, float | None]:
+    """Column of the matrix as {currency: rate or None}, the shape value_positions expects."""
+    col = matrix[base]
+    return {c: (None if np.isnan(v) else float(v)) for c, v in col.items()}
+
+
+class FxCache:
+    """Rate to the base currency per currency, each with its own freshness (like QuoteCache)."""
+
+    def __init__(self, ttl: float = 300, base: str = BASE_CURRENCY):
+        self.ttl = ttl
+        self.base = base
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._rates: dict[str, tuple[float, float]] = {}  # waluta -> (czas pobrania, kurs do bazowej)
+
+    def stale(self, currencies: Iterable[str]) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [c for c in dict.fromkeys(currencies) if now - self._rates.get(c, (-np.inf,))[0] > self.ttl]
+
+    def missing(self, currencies: Iterable[str]) -> list[str]:
+        with self._lock:
+            return [c for c in dict.fromkeys(currencies) if c not in self._rates]
+
+    def age(self, currencies: Iterable[str]) -> float | None:
+        now = time.monotonic()
+        with self._lock:
+            times = [self._rates[c][0] for c in currencies if c in self._rates]
+        return now - min(times) if times else None
+
+    def invalidate(self):
+        with self._lock:
+            self._rates.clear()
+
+    def get(
+        self, currencies: Iterable[str], download: FxDownloader, serve_stale: bool = False
+    ) -> tuple[pd.DataFrame, list[str]]:
+        """Cross-rate matrix for `currencies` and the currencies that had to be fetched."""
+        currencies = list(currencies)
+        todo = self.missing if serve_stale else self.stale
+        fetched: list[str] = []
+        if todo(currencies):
+            with self._fetch_lock:
+                fetched = todo(currencies)
+                if fetched:
+                    col = fetch_rate_matrix(fetched, download, self.base)[self.base]
+                    now = time.monotonic()
+                    with self._lock:
+                        for c in fetched:
+                            rate = float(col.get(c, np.nan))
+                            if np.isfinite(rate):
+                                self._rates[c] = (now, rate)
+                            elif c not in self._rates:
+                                # nieudane pobranie: ostatni dobry kurs zostaje (ze starym czasem – następne
+                                # przejście spróbuje znowu); waluta bez kursu czeka na ponowienie po ttl
+                                self._rates[c] = (now, np.nan)
+        return self.matrix(currencies), fetched
+
+    def matrix(self, currencies: Iterable[str]) -> pd.DataFrame:
+        with self._lock:
+            in_base = {c: self._rates.get(c, (0.0, np.nan))[1] for c in currencies}
+        in_base[self.base] = 1.0
+        return matrix_from_base(in_base)
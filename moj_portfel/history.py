@@ -0,0 +1,275 @@
+# coding: utf-8
+import hashlib
+import json
+import threading
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fx import BASE_CURRENCY, SUBUNITS, major
+from price_store import Downloader, close_matrix
+
+# ======================================================
+# Value history: dense business-day × symbol close matrix (memory-mapped)
+# ======================================================
+GROUP_COLUMNS = ["Account", "Category"]
+SERIES_CACHE_SIZE = 16  # portfeli (różnych zestawów pozycji) trzymanych w pamięci
+
+
+def _ffill(block: np.ndarray, seed: np.ndarray | None = None) -> np.ndarray:
+    """Forward-fill NaN down the rows; `seed` is the already filled row just above `block`."""
+    if seed is not None:
+        block = np.vstack([seed[None, :], block])
+    idx = np.where(np.isnan(block), 0, np.arange(len(block))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = block[idx, np.arange(block.shape[1])]
+    return out[1:] if seed is not None else out
+
+
+class CloseMatrix:
+    """Raw daily closes: rows = business days from `start`, columns = symbols (NaN = no bar).
+
+    One float64 file, memory-mapped for reads. New days are appended to the
+    file; new symbols rewrite it once under a new name (meta.json points at
+    the current one, so a crash never leaves a half-written matrix).
+    """
+
+    def __init__(self, path: Path, start: date):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._map: np.ndarray | None = None
+
+        meta = self._read_meta()
+        self.start = date.fromisoformat(meta["start"]) if meta else start
+        self.symbols: list[str] = meta.get("symbols", [])
+        self.rows: int = meta.get("rows", 0)
+        self.synced: dict[str, str] = meta.get("synced", {})  # symbol -> dzień ostatniej synchronizacji
+        self._file: str = meta.get("file", "closes-0.f8")
+        self._col = {s: i for i, s in enumerate(self.symbols)}
+
+        self.version = 0
+        self._changes: list[tuple[int, int]] = []  # (wersja, pierwszy zmieniony wiersz)
+
+    # ---------------- storage
+    def _read_meta(self) -> dict:
+        f = self.path / "meta.json"
+        try:
+            return json.loads(f.read_text(encoding="utf-8")) if f.exists() else {}
+        except Exception:
+            return {}
+
+    def _save_meta(self):
+        meta = {"start": self.start.isoformat(), "file": self._file, "rows": self.rows, "symbols": self.symbols, "synced": self.synced}
+        tmp = self.path / "meta.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        tmp.replace(self.path / "meta.json")
+
+    def array(self) -> np.ndarray:
+        """Read-only (rows, symbols) view; a memmap, so only the touched pages are read."""
+        with self._lock:
+            if self._map is None:
+                shape = (self.rows, len(self.symbols))
+                if 0 in shape:
+                    self._map = np.full(shape, np.nan)
+                else:
+                    self._map = np.memmap(self.path / self._file, dtype=np.float64, mode="r", shape=shape)
+            return self._map
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(np.busday_offset(np.datetime64(self.start, "D"), np.arange(self.rows), roll="forward"))
+
+    def _add_symbols(self, new: list[str]):
+        grown = np.full((self.rows, len(self.symbols) + len(new)), np.nan)
+        if self.rows and self.symbols:
+            # stary plik czytamy lokalnie – bez zapamiętania w self._map (miałaby stary kształt)
+            old = np.memmap(self.path / self._file, dtype=np.float64, mode="r", shape=(self.rows, len(self.symbols)))
+            grown[:, : len(self.symbols)] = old
+            del old
+        name = f"closes-{int(self._file.split('-')[1].split('.')[0]) + 1}.f8"
+        grown.tofile(self.path / name)
+        previous, self._file = self._file, name
+        self.symbols = self.symbols + new
+        self._col = {s: i for i, s in enumerate(self.symbols)}
+        self._save_meta()
+        (self.path / previous).unlink(missing_ok=True)
+
+    def _grow(self, rows: int):
+        row_bytes = len(self.symbols) * 8
+        with open(self.path / self._file, "ab") as f:
+            f.truncate(self.rows * row_bytes)  # ogon po przerwanym zapisie
+            np.full((rows - self.rows, len(self.symbols)), np.nan).tofile(f)
+        self.rows = rows
+
+    def write(self, wide: pd.DataFrame):
+        """Store closes from a wide frame (index = day, columns = symbols); NaN cells are ignored."""
+        if wide.empty:
+            return
+        days = pd.DatetimeIndex(wide.index)
+        if days.tz is not None:
+            days = days.tz_localize(None)
+        d = days.to_numpy().astype("datetime64[D]")
+        start = np.datetime64(self.start, "D")
+        keep = np.is_busday(d) & (d >= start)  # weekendowe słupki krypto pomijamy – oś to dni robocze
+        values = wide.to_numpy(dtype=float)[keep]
+        pos = np.busday_count(start, d[keep])
+        has = ~np.isnan(values).all(axis=1)
+        if not has.any():
+            return
+        values, pos = values[has], pos[has]
+
+        with self._lock:
+            self._map = None
+            new = [s for s in dict.fromkeys(wide.columns) if s not in self._col]
+            if new:
+                self._add_symbols(new)
+            if pos.max() + 1 > self.rows:
+                self._grow(int(pos.max()) + 1)
+
+            cols = np.array([self._col[s] for s in wide.columns])
+            mm = np.memmap(self.path / self._file, dtype=np.float64, mode="r+", shape=(self.rows, len(self.symbols)))
+            cells = np.ix_(pos, cols)
+            mm[cells] = np.where(np.isnan(values), mm[cells], values)
+            mm.flush()
+            del mm
+
+            self.version += 1
+            self._changes.append((self.version, 0 if new else int(pos.min())))
+            self._save_meta()
+            self._map = None  # następny odczyt mapuje plik w nowym kształcie
+
+    def first_change_since(self, version: int) -> int:
+        """First row written after `version` (self.rows when nothing changed)."""
+        with self._lock:
+            return min((row for v, row in self._changes if v > version), default=self.rows)
+
+    def last_days(self, symbols: list[str]) -> dict[str, date]:
+        known = [s for s in symbols if s in self._col]
+        if not known or not self.rows:
+            return {}
+        valid = ~np.isnan(self.array()[:, [self._col[s] for s in known]])
+        last = self.rows - 1 - valid[::-1].argmax(axis=0)
+        days = self.days
+        return {s: days[r].date() for s, r, ok in zip(known, last.tolist(), valid.any(axis=0).tolist()) if ok}
+
+    def mark_synced(self, symbols: list[str], today: date):
+        with self._lock:
+            self.synced.update(dict.fromkeys(symbols, today.isoformat()))
+            self._save_meta()
+
+
+def sync(matrix: CloseMatrix, symbols: list[str], download: Downloader, today: date) -> None:
+    """Once a day per symbol: full history for new symbols, only the missing tail for the rest.
+
+    The last stored bar is fetched again, like in price_store.top_up.
+    """
+    todo = [s for s in dict.fromkeys(symbols) if matrix.synced.get(s) != today.isoformat()]
+    if not todo:
+        return
+    last = matrix.last_days(todo)
+    groups: dict[date, list[str]] = {}
+    for s in todo:
+        groups.setdefault(last.get(s, matrix.start), []).append(s)
+    done: list[str] = []
+    for start, group in groups.items():
+        wide = close_matrix(download(group, start), group)
+        matrix.write(wide)
+        # tylko symbole, które dostały słupki – nieudana / pusta paczka zostaje do ponowienia
+        done += [s for s in group if s in wide.columns and wide[s].notna().any()]
+    matrix.mark_synced(done, today)
+
+
+def fx_history(filled: np.ndarray, col: dict[str, int], currencies: list[str], base: str = BASE_CURRENCY) -> np.ndarray:
+    """(days, currencies) rates to `base` from the pair columns; direct pair first, else through USD."""
+    nan = np.full(len(filled), np.nan)
+    pair = lambda s: filled[:, col[s]] if s in col else nan
+    out = np.empty((len(filled), len(currencies)))
+    for i, c in enumerate(currencies):
+        m, factor = SUBUNITS.get(c, (c, 1.0))
+        if major(c) == base:
+            rate = np.ones(len(filled))
+        else:
+            via_usd = pair(f"USD{base}=X") / (1.0 if m == "USD" else pair(f"USD{m}=X"))
+            direct = pair(f"{m}{base}=X")
+            rate = np.where(np.isnan(direct), via_usd, direct)
+        out[:, i] = rate * factor
+    return out
+
+
+class ValueHistory:
+    """Daily PLN value of a portfolio per account and per category, on top of a CloseMatrix.
+
+    Forward-filled closes and the value series are both extended from the
+    first row a write touched, so a new day costs one row, not the history.
+    """
+
+    def __init__(self, matrix: CloseMatrix, base: str = BASE_CURRENCY):
+        self.matrix = matrix
+        self.base = base
+        self._lock = threading.RLock()
+        self._filled = np.empty((0, 0))
+        self._version = 0
+        self._series: dict[str, tuple[int, int, np.ndarray]] = {}  # klucz portfela -> (wersja, l. symboli, wartości)
+
+    def filled(self) -> np.ndarray:
+        with self._lock:
+            m = self.matrix
+            version = m.version
+            if version != self._version or self._filled.shape != (m.rows, len(m.symbols)):
+                first = m.first_change_since(self._version) if self._filled.shape[1] == len(m.symbols) else 0
+                first = min(first, len(self._filled))
+                raw = m.array()
+                tail = _ffill(np.asarray(raw[first:]), self._filled[first - 1] if first else None)
+                self._filled = np.vstack([self._filled[:first], tail]) if first else tail
+                self._version = version
+            return self._filled
+
+    def pln_closes(self, tickers: list[str], currencies: list[str], first: int = 0) -> np.ndarray:
+        """(days[first:], tickers) closes in the base currency; NaN before a ticker's first bar."""
+        with self._lock:
+            filled = self.filled()
+            col = {s: i for i, s in enumerate(self.matrix.symbols)}
+        cols = np.array([col.get(t, -1) for t in tickers], dtype=np.int64)
+        block = filled[first:]
+        closes = np.where(cols >= 0, block[:, np.maximum(cols, 0)], np.nan)
+        unique = sorted(set(currencies))
+        fx = fx_history(block, col, unique, self.base)
+        return closes * fx[:, pd.Index(unique).get_indexer(currencies)]
+
+    def values(self, positions: pd.DataFrame) -> pd.DataFrame:
+        """Value of today's quantities on every day; columns = (Account|Category, group).
+
+        One product: (closes × FX)[days, tickers] @ quantities[tickers, groups].
+        Tickers without a close on a day count as 0.
+        """
+        pos = positions[["Ticker", "Quantity", "CurrencyHint", *GROUP_COLUMNS]].reset_index(drop=True)
+        key = hashlib.blake2b(pd.util.hash_pandas_object(pos, index=False).to_numpy().tobytes(), digest_size=16).hexdigest()
+
+        filled = self.filled()
+        m = self.matrix
+        groups = pd.MultiIndex.from_tuples(
+            [(g, v) for g in GROUP_COLUMNS for v in sorted(pos[g].dropna().unique())], names=["By", "Group"]
+        )
+        with self._lock:
+            version, width, series = self._series.get(key, (0, -1, np.empty((0, len(groups)))))
+            first = m.first_change_since(version) if width == len(m.symbols) else 0
+            first = min(first, len(series))
+            if first < len(filled):
+                # ilości zsumowane po tickerze: wiersz = ticker (para ticker/waluta), kolumna = konto / kategoria
+                keys = pos[["Ticker", "CurrencyHint"]]
+                codes, uniq = pd.factorize(pd.MultiIndex.from_frame(keys))
+                q = np.zeros((len(uniq), len(groups)))
+                qty = pos["Quantity"].to_numpy(dtype=float)
+                for j, (g, v) in enumerate(groups):
+                    np.add.at(q[:, j], codes, np.where(pos[g].to_numpy() == v, qty, 0.0))
+                closes = self.pln_closes(list(uniq.get_level_values(0)), list(uniq.get_level_values(1)), first)
+                tail = np.nan_to_num(closes) @ q
+                series = np.vstack([series[:first], tail])
+            self._series.pop(key, None)
+            self._series[key] = (m.version, len(m.symbols), series)
+            while len(self._series) > SERIES_CACHE_SIZE:
+                self._series.pop(next(iter(self._series)))  # najdawniej używany portfel
+        return pd.DataFrame(series, index=m.days[: len(series)], columns=groups)
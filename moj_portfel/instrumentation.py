@@ -0,0 +1,114 @@
+# coding: utf-8
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# ======================================================
+# Per-stage timings + network / cache counters (Prometheus text format)
+# ======================================================
+PREFIX = "portfel"
+
+HELP = {
+    "stage_seconds": ("summary", "Wall time of app stages."),
+    "network_requests_total": ("counter", "Requests sent to the market data provider."),
+    "received_bytes_total": ("counter", "Approximate payload received (decoded frame size)."),
+    "cache_requests_total": ("counter", "Cache lookups by result (hit/miss)."),
+    "download_failed_symbols_total": ("counter", "Symbols whose download chunk failed after all retries."),
+}
+
+
+def payload_bytes(payload) -> int:
+    if isinstance(payload, pd.DataFrame):
+        return int(payload.memory_usage(index=True, deep=False).sum())
+    if isinstance(payload, dict):
+        return len(json.dumps(payload, default=str))
+    return 0
+
+
+class Metrics:
+    """Process-wide registry shared by all sessions (module-level singleton below)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._stages: dict[str, list[float]] = {}  # stage -> [count, sum, last]
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                rec = self._stages.setdefault(name, [0, 0.0, 0.0])
+                rec[0] += 1
+                rec[1] += dt
+                rec[2] = dt
+
+    def request(self, source: str, payload) -> None:
+        self.inc("network_requests_total", source=source)
+        self.inc("received_bytes_total", payload_bytes(payload), source=source)
+
+    def cache(self, cache: str, hit: bool, n: int = 1) -> None:
+        if n:
+            self.inc("cache_requests_total", n, cache=cache, result="hit" if hit else "miss")
+
+    def stages_frame(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [
+                {"Stage": k, "Last (ms)": v[2] * 1000, "Avg (ms)": v[1] / v[0] * 1000, "Runs": v[0]}
+                for k, v in self._stages.items()
+            ]
+        return pd.DataFrame(rows, columns=["Stage", "Last (ms)", "Avg (ms)", "Runs"])
+
+    def counters_frame(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [
+                {"Metric": name, "Labels": ", ".join(f"{k}={v}" for k, v in labels), "Value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return pd.DataFrame(rows, columns=["Metric", "Labels", "Value"])
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            stages = sorted(self._stages.items())
+
+        lines = []
+        kind, text = HELP["stage_seconds"]
+        lines += [f"# HELP {PREFIX}_stage_seconds {text}", f"# TYPE {PREFIX}_stage_seconds {kind}"]
+        for name, (count, total, _) in stages:
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {count}')
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                kind, text = HELP.get(name, ("counter", name))
+                lines += [f"# HELP {PREFIX}_{name} {text}", f"# TYPE {PREFIX}_{name} {kind}"]
+            lbl = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{PREFIX}_{name}{{{lbl}}} {value:.15g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        # atomowo: node exporter (textfile collector) nie może zobaczyć połowy pliku
+        try:
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_text(self.to_prometheus(), encoding="utf-8")
+            tmp.replace(path)
+        except Exception:
+            pass
+
+
+METRICS = Metrics()
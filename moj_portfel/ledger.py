@@ -0,0 +1,473 @@
+# coding: utf-8
+import threading
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from parsing import POSITION_COLUMNS
+from valuation import category, currency_hint
+
+# ======================================================
+# Transaction ledger (append-only columnar segments + FIFO books)
+# ======================================================
+LEDGER_COLUMNS = ["Time", "Ticker", "Kind", "Account", "ToAccount", "Quantity", "Price", "Fee"]
+KINDS = ["BUY", "SELL", "TRANSFER"]
+ACCOUNTS = ["STANDARD", "IKE", "IKZE"]
+BUY, SELL, TRANSFER = range(len(KINDS))
+
+# kolumny jednego segmentu na dysku (ticker = kod w słowniku segmentu)
+_ARRAYS = {
+    "time": np.int64,  # ns od epoki, UTC
+    "ticker": np.int32,
+    "kind": np.int8,
+    "account": np.int8,
+    "to": np.int8,  # konto docelowe przeniesienia, -1 dla kupna/sprzedaży
+    "qty": np.float64,
+    "price": np.float64,
+    "fee": np.float64,
+}
+# tablice checkpointu: partie (ticker, konto, ilość, koszt), P/L (ticker, konto, wartość), (ticker, czas)
+_LOT_TYPES = (np.int32, np.int8, np.float64, np.float64)
+_PL_TYPES = (np.int32, np.int8, np.float64)
+_LAST_TYPES = (np.int32, np.int64)
+COMPACT_AFTER = 64  # segmentów; potem scalamy w jeden plik
+CHECKPOINT_EVERY = 10_000  # transakcji między zapisami stanu ksiąg
+EPS = 1e-9  # resztki po sprzedaży ułamkowej
+
+
+def _encode(values: pd.Series, labels: list[str], what: str) -> np.ndarray:
+    v = values.fillna("").astype(str).str.strip().str.upper()
+    codes = pd.Categorical(v, categories=labels).codes
+    if (codes < 0).any():
+        raise ValueError(f"nieznany {what}: {v[codes < 0].iloc[0]!r}")
+    return codes.astype(np.int8)
+
+
+def _concat(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    if not parts:
+        return {k: np.empty(0, dtype=t) for k, t in _ARRAYS.items()}
+    return {k: np.concatenate([p[k] for p in parts]) for k in _ARRAYS}
+
+
+def _take(cols: dict[str, np.ndarray], idx: np.ndarray) -> dict[str, np.ndarray]:
+    return {k: v[idx] for k, v in cols.items()}
+
+
+class _Book:
+    """FIFO lots and realized P/L of one ticker, per account.
+
+    Lots are (quantity, unit cost incl. fees); a transfer moves the oldest lots
+    with their cost and queues them behind the destination's own lots.
+    """
+
+    __slots__ = ("lots", "qty", "realized", "last")
+
+    def __init__(self):
+        self.lots: dict[int, deque[tuple[float, float]]] = {}
+        self.qty: dict[int, float] = {}
+        self.realized: dict[int, float] = {}
+        self.last = np.iinfo(np.int64).min  # czas ostatniej zaksięgowanej transakcji
+
+    def copy(self) -> "_Book":
+        book = _Book()
+        book.lots = {a: deque(lots) for a, lots in self.lots.items()}
+        book.qty = dict(self.qty)
+        book.realized = dict(self.realized)
+        book.last = self.last
+        return book
+
+    def _consume(self, account: int, qty: float) -> list[tuple[float, float]]:
+        held = self.qty.get(account, 0.0)
+        if qty > held + EPS:
+            raise ValueError(f"zbycie {qty:g} przy stanie {held:g} na rachunku {ACCOUNTS[account]}")
+        lots, taken = self.lots[account], []
+        while qty > EPS and lots:
+            q, cost = lots[0]
+            if q <= qty + EPS:
+                lots.popleft()
+                taken.append((q, cost))
+                qty -= q
+            else:
+                lots[0] = (q - qty, cost)
+                taken.append((qty, cost))
+                qty = 0.0
+        self.qty[account] = held - sum(q for q, _ in taken) if lots else 0.0
+        return taken
+
+    def apply(self, kind: int, account: int, to: int, qty: float, price: float, fee: float):
+        if kind == BUY:
+            self.lots.setdefault(account, deque()).append((qty, (qty * price + fee) / qty))
+            self.qty[account] = self.qty.get(account, 0.0) + qty
+        else:
+            taken = self._consume(account, qty)
+            cost = sum(q * c for q, c in taken)
+            if kind == SELL:
+                pl = qty * price - fee - cost
+            else:
+                self.lots.setdefault(to, deque()).extend(taken)
+                self.qty[to] = self.qty.get(to, 0.0) + sum(q for q, _ in taken)
+                pl = -fee
+            self.realized[account] = self.realized.get(account, 0.0) + pl
+
+
+class _State:
+    """Book state read from a checkpoint; a ticker becomes a _Book only when a trade touches it."""
+
+    def __init__(self, lots: tuple, realized: tuple, last: tuple):
+        # (ticker, account, qty, cost), (ticker, account, value), (ticker, time) – posortowane po tickerze
+        self.lots, self.realized, self.last = (self._by_ticker(x) for x in (lots, realized, last))
+        self.codes = set(self.last[0].tolist())
+
+    @staticmethod
+    def _by_ticker(arrays: tuple) -> tuple:
+        order = np.argsort(arrays[0], kind="stable")  # stabilnie: kolejność FIFO partii zostaje
+        return tuple(a[order] for a in arrays)
+
+    @staticmethod
+    def _rows(arrays: tuple, code: int):
+        lo, hi = np.searchsorted(arrays[0], [code, code + 1]).tolist()
+        return zip(*(a[lo:hi].tolist() for a in arrays[1:]))
+
+    @staticmethod
+    def without(arrays: tuple, codes: list[int]) -> tuple:
+        keep = ~np.isin(arrays[0], np.array(codes, dtype=np.int32))
+        return tuple(a[keep] for a in arrays)
+
+    def book(self, code: int) -> _Book:
+        book = _Book()
+        for a, q, c in self._rows(self.lots, code):
+            book.lots.setdefault(a, deque()).append((q, c))
+            book.qty[a] = book.qty.get(a, 0.0) + q
+        for a, v in self._rows(self.realized, code):
+            book.realized[a] = v
+        for (when,) in self._rows(self.last, code):
+            book.last = when
+        return book
+
+
+class Ledger:
+    """Buys, sells and account transfers in append-only numpy segments (one .npz per append).
+
+    Per-ticker FIFO books are updated only for the tickers an append touches;
+    a back-dated trade replays just that ticker's history. Book state is
+    checkpointed every `checkpoint_every` rows, so a restart reads the
+    checkpoint arrays and replays only the rows written after it.
+    """
+
+    def __init__(self, path: Path, compact_after: int = COMPACT_AFTER, checkpoint_every: int = CHECKPOINT_EVERY):
+        self.path = Path(path)
+        self.compact_after = compact_after
+        self.checkpoint_every = checkpoint_every
+        self.version = 0  # rośnie przy każdym dopisaniu – klucz cache dla widoków
+
+        self._lock = threading.RLock()
+        self._symbols: list[str] = []
+        self._codes: dict[str, int] = {}
+        self._segments: list[tuple[Path, dict[str, np.ndarray]]] = []
+        self._all: dict[str, np.ndarray] | None = None  # sklejone segmenty, liczone leniwie
+        self._rows = 0
+        self._books: dict[int, _Book] = {}  # tickery zmienione od checkpointu (albo wszystkie bez niego)
+        self._state: _State | None = None
+        self._checkpointed = 0
+        self._positions: tuple[int, pd.DataFrame] | None = None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    # ---------------- storage
+    def _code(self, symbol: str) -> int:
+        code = self._codes.get(symbol)
+        if code is None:
+            code = self._codes[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return code
+
+    def _remap(self, symbols: np.ndarray, local: np.ndarray) -> np.ndarray:
+        remap = np.array([self._code(s) for s in symbols.tolist()], dtype=np.int32)
+        return remap[local] if len(remap) else local.astype(np.int32)
+
+    def _columns(self) -> dict[str, np.ndarray]:
+        if self._all is None:
+            self._all = _concat([cols for _, cols in self._segments])
+        return self._all
+
+    def _write(self, cols: dict[str, np.ndarray], path: Path):
+        uniq, local = np.unique(cols["ticker"], return_inverse=True)
+        symbols = np.array([self._symbols[c] for c in uniq.tolist()], dtype=str)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, symbols=symbols, **{**cols, "ticker": local.astype(np.int32)})
+        tmp.replace(path)
+
+    def _load(self):
+        for f in sorted(self.path.glob("seg-*.npz")):
+            if int(f.stem[4:]) < self._rows:
+                continue  # pozostałość sprzed scalenia – te wiersze są już w pierwszym segmencie
+            with np.load(f) as z:
+                cols = {k: z[k].astype(t, copy=False) for k, t in _ARRAYS.items()}
+                cols["ticker"] = self._remap(z["symbols"], cols["ticker"])
+            self._segments.append((f, cols))
+            self._rows += len(cols["time"])
+
+        start = self._restore()
+        for f, cols in self._segments:
+            first = int(f.stem[4:])
+            if first + len(cols["time"]) <= start:
+                continue
+            if first < start:  # checkpoint w środku segmentu (np. po scaleniu)
+                cols = _take(cols, np.arange(start - first, len(cols["time"])))
+                first = start
+            self._books.update(self._plan(cols, upto=first))
+
+    def _restore(self) -> int:
+        """Books from the last checkpoint; returns the number of rows it covers (0 = full replay)."""
+        f = self.path / "state.npz"
+        if not f.exists():
+            return 0
+        try:
+            with np.load(f) as z:
+                rows = int(z["rows"])
+                if rows > self._rows:
+                    return 0
+                symbols = z["symbols"]
+                lots = (self._remap(symbols, z["lot_ticker"]), z["lot_account"], z["lot_qty"], z["lot_cost"])
+                pl = (self._remap(symbols, z["pl_ticker"]), z["pl_account"], z["pl_value"])
+                last = (self._remap(symbols, z["last_ticker"]), z["last_time"])
+        except Exception:
+            return 0  # uszkodzony stan -> przeliczamy wszystko od zera
+
+        self._state = _State(lots, pl, last)
+        self._checkpointed = rows
+        return rows
+
+    def _book(self, code: int) -> _Book | None:
+        book = self._books.get(code)
+        if book is None and self._state is not None and code in self._state.codes:
+            book = self._books[code] = self._state.book(code)
+        return book
+
+    def _book_arrays(self) -> tuple[tuple, tuple, tuple]:
+        """(lots, realized, last) of all books: touched ones from memory, the rest straight from the checkpoint."""
+        books = self._books.items()
+        tables = [
+            ([(t, a, q, c) for t, b in books for a, queue in b.lots.items() for q, c in queue], _LOT_TYPES),
+            ([(t, a, v) for t, b in books for a, v in b.realized.items()], _PL_TYPES),
+            ([(t, b.last) for t, b in books], _LAST_TYPES),
+        ]
+        out = []
+        for i, (rows, types) in enumerate(tables):
+            columns = list(zip(*rows)) or [()] * len(types)
+            arrays = tuple(np.array(col, dtype=t) for col, t in zip(columns, types))
+            if self._state is not None:
+                rest = _State.without((self._state.lots, self._state.realized, self._state.last)[i], list(self._books))
+                arrays = tuple(np.concatenate([x, y]) for x, y in zip(arrays, rest))
+            out.append(arrays)
+        return tuple(out)
+
+    def checkpoint(self):
+        with self._lock:
+            (lot_t, lot_a, lot_q, lot_c), (pl_t, pl_a, pl_v), (last_t, last_time) = self._book_arrays()
+            tmp = self.path / "state.tmp"
+            with open(tmp, "wb") as fh:
+                np.savez(
+                    fh,
+                    rows=np.int64(self._rows),
+                    symbols=np.array(self._symbols, dtype=str),
+                    lot_ticker=lot_t,
+                    lot_account=lot_a,
+                    lot_qty=lot_q,
+                    lot_cost=lot_c,
+                    pl_ticker=pl_t,
+                    pl_account=pl_a,
+                    pl_value=pl_v,
+                    last_ticker=last_t,
+                    last_time=last_time,
+                )
+            tmp.replace(self.path / "state.npz")
+            self._checkpointed = self._rows
+
+    def compact(self):
+        """Merge all segments into one file (rows keep their order)."""
+        with self._lock:
+            if len(self._segments) < 2:
+                return
+            cols = self._columns()
+            target = self.path / f"seg-{0:010d}.npz"
+            self._write(cols, target)
+            for f, _ in self._segments[1:]:
+                f.unlink(missing_ok=True)
+            self._segments = [(target, cols)]
+            self.checkpoint()
+
+    # ---------------- books
+    def _plan(self, cols: dict[str, np.ndarray], upto: int) -> dict[int, _Book]:
+        """Updated books for the tickers in `cols`, which follow the first `upto` rows.
+
+        Nothing is modified; a sell or transfer beyond the holding raises ValueError.
+        """
+        n = len(cols["time"])
+        order = np.lexsort((np.arange(n), cols["time"], cols["ticker"]))
+        cols = _take(cols, order)
+        bounds = np.flatnonzero(np.diff(cols["ticker"])) + 1
+        out: dict[int, _Book] = {}
+        for lo, hi in zip(np.r_[0, bounds].tolist(), np.r_[bounds, n].tolist()):
+            code = int(cols["ticker"][lo])
+            book = self._book(code)
+            group = _take(cols, slice(lo, hi))
+            if book is not None and group["time"][0] < book.last:
+                # transakcja z datą wsteczną: FIFO tego tickera liczymy od początku
+                history = _take(self._columns(), slice(0, upto))
+                mine = _take(history, np.flatnonzero(history["ticker"] == code))
+                group = _concat([mine, group])
+                group = _take(group, np.argsort(group["time"], kind="stable"))
+                book = _Book()
+            else:
+                book = book.copy() if book is not None else _Book()
+            rows = zip(*(group[k].tolist() for k in ("kind", "account", "to", "qty", "price", "fee")))
+            for row in rows:
+                try:
+                    book.apply(*row)
+                except ValueError as e:
+                    raise ValueError(f"{self._symbols[code]}: {e}") from None
+            book.last = max(book.last, int(group["time"][-1]))  # grupa posortowana po czasie
+            out[code] = book
+        return out
+
+    def _normalize(self, trades: pd.DataFrame) -> dict[str, np.ndarray]:
+        missing = {"Time", "Ticker", "Kind", "Quantity"} - set(trades.columns)
+        if missing:
+            raise ValueError(f"brak kolumn: {', '.join(sorted(missing))}")
+        n = len(trades)
+        column = lambda name, default: trades[name] if name in trades else pd.Series([default] * n, index=trades.index)
+
+        time = pd.to_datetime(trades["Time"], utc=True, errors="coerce")
+        if time.isna().any():
+            raise ValueError(f"niepoprawna data: {trades['Time'][time.isna()].iloc[0]!r}")
+        tickers = trades["Ticker"].fillna("").astype(str).str.strip().str.upper()
+        if (tickers == "").any():
+            raise ValueError("pusty ticker")
+        local, symbols = pd.factorize(tickers)
+        kind = _encode(trades["Kind"], KINDS, "typ transakcji")
+        account = _encode(column("Account", "").replace("", "STANDARD").fillna("STANDARD"), ACCOUNTS, "rachunek")
+        to = np.full(n, -1, dtype=np.int8)
+        transfer = kind == TRANSFER
+        if transfer.any():
+            to[transfer] = _encode(column("ToAccount", "")[transfer], ACCOUNTS, "rachunek docelowy")
+            if (to[transfer] == account[transfer]).any():
+                raise ValueError("przeniesienie na ten sam rachunek")
+
+        qty = pd.to_numeric(trades["Quantity"], errors="coerce").to_numpy(dtype=float)
+        price = pd.to_numeric(column("Price", 0.0), errors="coerce").to_numpy(dtype=float, copy=True)
+        fee = pd.to_numeric(column("Fee", 0.0), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+        price[transfer] = np.nan_to_num(price[transfer])
+        if not (np.isfinite(qty) & (qty > 0)).all():
+            raise ValueError("ilość musi być dodatnią liczbą")
+        if not (np.isfinite(price) & (price >= 0)).all() or (fee < 0).any():
+            raise ValueError("cena i prowizja muszą być nieujemne")
+
+        return {
+            "time": time.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(np.int64),
+            "ticker": np.array([self._code(t) for t in symbols.tolist()], dtype=np.int32)[local],
+            "kind": kind,
+            "account": account,
+            "to": to,
+            "qty": qty,
+            "price": price,
+            "fee": fee,
+        }
+
+    def append(self, trades: pd.DataFrame) -> int:
+        """Validate and store trades (LEDGER_COLUMNS; Account/ToAccount/Price/Fee optional).
+
+        All-or-nothing: an invalid row or an oversold position raises ValueError
+        and leaves the ledger unchanged.
+        """
+        if trades.empty:
+            return 0
+        with self._lock:
+            cols = self._normalize(trades)
+            books = self._plan(cols, upto=self._rows)
+
+            f = self.path / f"seg-{self._rows:010d}.npz"
+            self._write(cols, f)
+            self._segments.append((f, cols))
+            self._rows += len(cols["time"])
+            self._all = None
+            self._books.update(books)
+            self.version += 1
+
+            if len(self._segments) > self.compact_after:
+                self.compact()
+            elif self._rows - self._checkpointed >= self.checkpoint_every:
+                self.checkpoint()
+        return len(cols["time"])
+
+    # ---------------- views
+    def positions(self) -> pd.DataFrame:
+        """Open positions in the `parse_positions` shape; PurchasePrice = FIFO cost of the remaining lots."""
+        with self._lock:
+            if self._positions is not None and self._positions[0] == self.version:
+                return self._positions[1]
+            rows = [
+                (t, a, qty, sum(q * c for q, c in book.lots[a]))
+                for t, book in self._books.items()
+                for a, qty in book.qty.items()
+            ]
+            agg = pd.DataFrame.from_records(rows, columns=["t", "a", "qty", "cost"])
+            if self._state is not None:
+                t, a, q, c = _State.without(self._state.lots, list(self._books))
+                rest = pd.DataFrame({"t": t, "a": a, "qty": q, "cost": q * c}).groupby(["t", "a"], as_index=False).sum()
+                agg = pd.concat([agg, rest], ignore_index=True)
+            agg = agg[agg["qty"] > EPS]
+
+            df = pd.DataFrame(
+                {
+                    "Ticker": np.array(self._symbols, dtype=object)[agg["t"].to_numpy(dtype=np.int64)],
+                    "Quantity": agg["qty"].to_numpy(dtype=float),
+                    "PurchasePrice": (agg["cost"] / agg["qty"]).to_numpy(dtype=float),
+                    "Account": np.array(ACCOUNTS, dtype=object)[agg["a"].to_numpy(dtype=np.int64)],
+                }
+            )
+            df["Category"] = category(df["Ticker"], df["Account"])
+            df["CurrencyHint"] = currency_hint(df["Ticker"])
+            df = df[POSITION_COLUMNS].sort_values(["Ticker", "Account"], ignore_index=True)
+            self._positions = (self.version, df)
+            return df
+
+    def realized(self) -> pd.DataFrame:
+        """Realized P/L per ticker and account, in the ticker's quote currency."""
+        with self._lock:
+            _, (t, a, v), _ = self._book_arrays()
+            symbols = np.array(self._symbols, dtype=object)
+        df = pd.DataFrame(
+            {
+                "Ticker": symbols[t] if len(symbols) else np.empty(0, dtype=object),
+                "Account": np.array(ACCOUNTS, dtype=object)[a],
+                "RealizedPL": v,
+            }
+        )
+        df["CurrencyHint"] = currency_hint(df["Ticker"])
+        return df.sort_values(["Ticker", "Account"], ignore_index=True)
+
+    def transactions(self) -> pd.DataFrame:
+        with self._lock:
+            cols = self._columns()
+            symbols = np.array(self._symbols, dtype=object)
+        accounts = np.array([*ACCOUNTS, ""], dtype=object)  # -1 -> ""
+        return pd.DataFrame(
+            {
+                "Time": pd.to_datetime(cols["time"]),
+                "Ticker": symbols[cols["ticker"]] if len(symbols) else np.empty(0, dtype=object),
+                "Kind": np.array(KINDS, dtype=object)[cols["kind"]],
+                "Account": accounts[cols["account"]],
+                "ToAccount": accounts[cols["to"]],
+                "Quantity": cols["qty"],
+                "Price": cols["price"],
+                "Fee": cols["fee"],
+            }
+        )
@@ -0,0 +1,139 @@
+# coding: utf-8
+import json
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+# ======================================================
+# Name / metadata resolution (bounded pool + persistent cache)
+# ======================================================
+# lookup(ticker) -> {"name": ..., "currency": ..., ...} albo None
+Lookup = Callable[[str], dict | None]
+
+RETRY_AFTER = 3600  # nieudane / zbyt wolne zapytania ponawiamy najwcześniej po godzinie
+
+
+class NameResolver:
+    """Resolves ticker names in the background and never blocks the caller.
+
+    `names()` answers from the on-disk cache at once and queues the misses
+    on a small worker pool; callers show the ticker until the name arrives
+    (watch `version` to know when to re-render). `timeout` counts from the
+    moment a worker starts the lookup, so a long queue never expires.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lookup: Lookup,
+        static: dict[str, str] | None = None,
+        workers: int = 8,
+        timeout: float = 10.0,
+    ):
+        self.path = Path(path)
+        self.lookup = lookup
+        self.static = dict(static or {})
+        self.timeout = timeout
+        self.version = 0
+
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="names")
+        self._pending: dict[str, float | None] = {}  # ticker -> start zapytania (None = czeka w kolejce)
+        self._failed: dict[str, float] = {}  # ticker -> czas porażki
+        self._dirty = False
+        self._meta: dict[str, dict] = self._load()
+
+    def _load(self) -> dict[str, dict]:
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                return data if isinstance(data, dict) else {}
+            except Exception:
+                return {}
+        return {}
+
+    def _flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._meta, ensure_ascii=False, indent=2)
+            self._dirty = False
+        try:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception:
+            pass
+
+    def metadata(self, ticker: str) -> dict:
+        with self._lock:
+            return dict(self._meta.get(ticker, {}))
+
+    def pending(self) -> int:
+        self._expire()
+        with self._lock:
+            return len(self._pending)
+
+    def names(self, tickers: list[str], listed: Mapping[str, str] | None = None, only_listed: bool = False) -> dict[str, str]:
+        """Known names now (ticker as fallback); unknown ones are queued.
+
+        listed: names from a local symbol index, used before any lookup;
+        only_listed: the index is complete, so symbols missing from it are
+        never looked up.
+        """
+        self._expire()
+        now = time.monotonic()
+        out, todo = {}, []
+        with self._lock:
+            for t in tickers:
+                if t in self.static:
+                    out[t] = self.static[t]
+                    continue
+                nm = self._meta.get(t, {}).get("name") or (listed.get(t) if listed is not None else None)
+                out[t] = nm or t
+                if nm or t in self._pending or now - self._failed.get(t, -RETRY_AFTER) < RETRY_AFTER:
+                    continue
+                if only_listed and listed is not None and t not in listed:
+                    continue
+                self._pending[t] = None
+                todo.append(t)
+        for t in todo:
+            self._pool.submit(self._lookup, t).add_done_callback(lambda f, t=t: self._done(t, f))
+        return out
+
+    def _lookup(self, ticker: str) -> dict | None:
+        with self._lock:
+            if ticker in self._pending:
+                self._pending[ticker] = time.monotonic()  # limit czasu liczymy od startu, nie od zlecenia
+        return self.lookup(ticker)
+
+    def _expire(self):
+        # zapytanie ponad limit czasu: zwalniamy je jako porażkę, wynik i tak zapiszemy, jeśli dotrze
+        now = time.monotonic()
+        with self._lock:
+            for t, started in list(self._pending.items()):
+                if started is not None and now - started > self.timeout:
+                    del self._pending[t]
+                    self._failed[t] = now
+                    self.version += 1
+
+    def _done(self, ticker: str, fut: Future):
+        try:
+            meta = fut.result()
+        except Exception:
+            meta = None
+        with self._lock:
+            self._pending.pop(ticker, None)
+            if meta and meta.get("name"):
+                self._meta[ticker] = meta
+                self._failed.pop(ticker, None)
+                self._dirty = True
+            else:
+                self._failed[ticker] = time.monotonic()
+            self.version += 1
+            idle = not self._pending
+        if idle:
+            self._flush()
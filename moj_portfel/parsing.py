@@ -0,0 +1,122 @@
+# coding: utf-8
+import csv
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from symbols import SymbolIndex
+from valuation import category, currency_hint
+
+# ======================================================
+# Parsing (bulk tokenizer + per-line cache)
+# ======================================================
+POSITION_COLUMNS = ["Ticker", "Quantity", "PurchasePrice", "Account", "Category", "CurrencyHint"]
+
+
+class ParseError(NamedTuple):
+    line_no: int  # numeracja od 1, jak w polu tekstowym
+    line: str
+    reason: str
+
+
+# wynik dla jednej linii: (ticker, qty, cena, konto) albo None + powód
+_Parsed = tuple[tuple[str, float, float, str] | None, str | None]
+
+
+def _account(raw: pd.Series) -> np.ndarray:
+    # kilka różnych wartości na całą listę – klasyfikujemy unikaty, nie wiersze
+    codes, uniques = pd.factorize(raw.fillna(""))
+    acc = pd.Series(uniques, dtype=object).str.strip().str.upper()
+    labels = np.select(
+        [acc.str.startswith("IKE").to_numpy(dtype=bool), acc.str.startswith("IKZE").to_numpy(dtype=bool)],
+        ["IKE", "IKZE"],
+        default="STANDARD",
+    )
+    return labels[codes] if len(labels) else np.full(len(raw), "STANDARD", dtype=object)
+
+
+def tokenize(lines: list[str]) -> list[_Parsed]:
+    """Parse stripped, non-empty lines in one pass: csv reader + typed column conversion."""
+    if not lines:
+        return []
+    # QUOTE_NONE: przecinek zawsze rozdziela pola, tak jak zwykły split(",")
+    fields = list(csv.reader(lines, quoting=csv.QUOTE_NONE, skipinitialspace=True))
+    width = np.fromiter((len(f) for f in fields), dtype=np.int64, count=len(fields))
+    padded = [(f + ["", "", ""])[:4] for f in fields]
+    cols = np.array(padded, dtype=object).reshape(len(fields), 4)
+
+    tickers = pd.Series(cols[:, 0]).str.strip().str.upper()
+    qty_raw = pd.Series(cols[:, 1]).str.strip()
+    price_raw = pd.Series(cols[:, 2]).str.strip()
+    qty = pd.to_numeric(qty_raw, errors="coerce").to_numpy(dtype=float)
+    price = pd.to_numeric(price_raw, errors="coerce").to_numpy(dtype=float)
+    accounts = _account(pd.Series(cols[:, 3]))
+
+    bad_width = width < 2
+    bad_qty = ~bad_width & np.isnan(qty) & (qty_raw.str.lower() != "nan").to_numpy(dtype=bool)
+    bad_price = (
+        (price_raw != "").to_numpy(dtype=bool)
+        & np.isnan(price)
+        & (price_raw.str.lower() != "nan").to_numpy(dtype=bool)
+    )
+
+    rows = list(zip(tickers.tolist(), qty.tolist(), price.tolist(), accounts.tolist()))
+    out: list[_Parsed] = [(row, None) for row in rows]
+    for i in np.flatnonzero(bad_width | bad_qty | bad_price):
+        if bad_width[i]:
+            out[i] = (None, "brak ilości (format: TICKER,ILOŚĆ[,CENA_ZAKUPU][,KONTO])")
+        elif bad_qty[i]:
+            out[i] = (None, f"niepoprawna ilość: {qty_raw.iat[i]!r}")
+        else:
+            out[i] = (rows[i], f"niepoprawna cena zakupu: {price_raw.iat[i]!r} (pominięta)")
+    return out
+
+
+class PositionParser:
+    """Keeps parsed lines keyed by their text, so an edit re-parses only the changed lines.
+
+    With a symbol index, listed tickers take their currency from it instead of
+    the suffix guess.
+    """
+
+    def __init__(self, symbols: SymbolIndex | None = None):
+        self.symbols = symbols
+        self._cache: dict[str, _Parsed] = {}
+
+    def parse(self, text: str) -> tuple[pd.DataFrame, list[ParseError]]:
+        lines = [ln.strip() for ln in (text or "").splitlines()]
+
+        fresh = list(dict.fromkeys(ln for ln in lines if ln and ln not in self._cache))
+        cache = {ln: self._cache[ln] for ln in lines if ln in self._cache}
+        cache.update(zip(fresh, tokenize(fresh)))
+        self._cache = cache  # tylko bieżące linie – pamięć nie rośnie z historią edycji
+
+        rows, errors = [], []
+        for no, ln in enumerate(lines, start=1):
+            if not ln:
+                continue
+            row, reason = cache[ln]
+            if row is not None:
+                rows.append(row)
+            if reason:
+                errors.append(ParseError(no, ln, reason))
+
+        if not rows:
+            return pd.DataFrame(columns=POSITION_COLUMNS), errors
+
+        df = pd.DataFrame.from_records(rows, columns=["Ticker", "Quantity", "PurchasePrice", "Account"])
+        df["Category"] = category(df["Ticker"], df["Account"])
+        hint = currency_hint if self.symbols is None else self.symbols.currency_hint
+        df["CurrencyHint"] = hint(df["Ticker"])
+        return df, errors
+
+
+def parse_positions(text: str) -> pd.DataFrame:
+    """
+    Format:
+    TICKER, ILOŚĆ [, CENA_ZAKUPU] [, KONTO]
+
+    KONTO: IKE / IKZE / STANDARD
+    """
+    return PositionParser().parse(text)[0]
@@ -0,0 +1,188 @@
+# coding: utf-8
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+# ======================================================
+# Named portfolios + settings per user (SQLite WAL, debounced batched writes)
+# ======================================================
+DEFAULT_USER = "default"
+DEFAULT_PORTFOLIO = "Główny"
+WRITE_DELAY = 1.0  # s ciszy po ostatniej zmianie, zanim kolejka trafi na dysk
+MAX_WRITE_DELAY = 5.0  # s – przy ciągłym pisaniu zapis i tak nie czeka dłużej
+
+_DELETED = object()  # znacznik usunięcia portfela w kolejce zapisów
+
+
+class PortfolioStore:
+    """Portfolio texts and JSON settings keyed by user, in one SQLite file.
+
+    The database runs in WAL mode, so any number of sessions read while one
+    write is in progress. Saves are queued in memory (the newest value per key
+    wins) and a background thread writes the whole queue in one transaction
+    once the keys have been quiet for `delay` seconds, or after `max_delay`
+    under continuous edits. Reads see queued values immediately. A failed
+    write keeps its entries queued for the next attempt and is reported in
+    `last_error`.
+    """
+
+    def __init__(self, path: Path, delay: float = WRITE_DELAY, max_delay: float = MAX_WRITE_DELAY):
+        self.path = Path(path)
+        self.delay = delay
+        self.max_delay = max_delay
+        self.last_error: str | None = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # jeden zapis naraz (wątek w tle albo flush())
+        self._portfolios: dict[tuple[str, str], object] = {}  # (user, name) -> tekst | _DELETED
+        self._settings: dict[tuple[str, str], object] = {}  # (user, key) -> wartość
+        self._first = self._last = 0.0
+        self._closed = False
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")  # trwałe w pliku bazy
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS portfolios ("
+                " user TEXT NOT NULL, name TEXT NOT NULL, text TEXT NOT NULL, updated REAL NOT NULL,"
+                " PRIMARY KEY (user, name)) WITHOUT ROWID"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS settings ("
+                " user TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (user, key)) WITHOUT ROWID"
+            )
+        self._writer = threading.Thread(target=self._run, name="portfolio-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=10)
+        con.execute("PRAGMA synchronous=NORMAL")  # w WAL: commit atomowy, fsync przy checkpoincie
+        return con
+
+    # ---------------- reads (queued values first)
+    def portfolios(self, user: str) -> list[str]:
+        """Portfolio names of the user, sorted (texts are not read)."""
+        with closing(self._connect()) as con:
+            names = {n for (n,) in con.execute("SELECT name FROM portfolios WHERE user = ?", (user,))}
+        with self._cond:
+            for (u, name), text in self._portfolios.items():
+                if u == user:
+                    (names.discard if text is _DELETED else names.add)(name)
+        return sorted(names)
+
+    def load(self, user: str, name: str) -> str | None:
+        """Text of one portfolio, None when there is no such portfolio."""
+        with self._cond:
+            text = self._portfolios.get((user, name))
+        if text is not None:
+            return None if text is _DELETED else text
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT text FROM portfolios WHERE user = ? AND name = ?", (user, name)).fetchone()
+        return row[0] if row else None
+
+    def setting(self, user: str, key: str, default=None):
+        with self._cond:
+            if (user, key) in self._settings:
+                return self._settings[(user, key)]
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT value FROM settings WHERE user = ? AND key = ?", (user, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    # ---------------- writes (queued, debounced)
+    def save(self, user: str, name: str, text: str):
+        self._queue(self._portfolios, (user, name), text or "")
+
+    def delete(self, user: str, name: str):
+        self._queue(self._portfolios, (user, name), _DELETED)
+
+    def set_setting(self, user: str, key: str, value):
+        json.dumps(value)  # TypeError od razu, a nie w wątku zapisu
+        self._queue(self._settings, (user, key), value)
+
+    def _queue(self, pending: dict, key: tuple[str, str], value):
+        with self._cond:
+            if self._closed:
+                raise ValueError("magazyn portfeli jest zamknięty")
+            now = time.monotonic()
+            if not self._portfolios and not self._settings:
+                self._first = now
+            self._last = now
+            pending[key] = value
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._portfolios or self._settings or self._closed):
+                    self._cond.wait()
+                # debounce: czekamy na ciszę, ale najwyżej max_delay od pierwszej zmiany w kolejce
+                while not self._closed:
+                    due = min(self._last + self.delay, self._first + self.max_delay)
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                closed = self._closed
+            if not self.flush() and not closed:
+                with self._cond:
+                    self._cond.wait(self.max_delay)  # dysk niedostępny – nie ponawiamy w pętli bez przerwy
+            if closed:
+                return
+
+    def flush(self) -> bool:
+        """Write everything queued now, in one transaction; False when the write failed."""
+        with self._flush_lock:
+            with self._cond:
+                portfolios, self._portfolios = self._portfolios, {}
+                settings, self._settings = self._settings, {}
+            if not portfolios and not settings:
+                return True
+            now = time.time()
+            try:
+                with closing(self._connect()) as con, con:
+                    con.executemany(
+                        "DELETE FROM portfolios WHERE user = ? AND name = ?",
+                        [k for k, v in portfolios.items() if v is _DELETED],
+                    )
+                    con.executemany(
+                        "INSERT OR REPLACE INTO portfolios (user, name, text, updated) VALUES (?, ?, ?, ?)",
+                        [(u, n, v, now) for (u, n), v in portfolios.items() if v is not _DELETED],
+                    )
+                    con.executemany(
+                        "INSERT OR REPLACE INTO settings (user, key, value) VALUES (?, ?, ?)",
+                        [(u, k, json.dumps(v, ensure_ascii=False)) for (u, k), v in settings.items()],
+                    )
+            except sqlite3.Error as e:
+                with self._cond:
+                    # nowsze wartości dopisane w trakcie zapisu mają pierwszeństwo
+                    self._portfolios = {**portfolios, **self._portfolios}
+                    self._settings = {**settings, **self._settings}
+                    self._first = self._last = time.monotonic()
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+            self.last_error = None
+            return True
+
+    def close(self):
+        """Flush the queue and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        self.flush()
+
+    def import_text(self, user: str, name: str, path: Path) -> bool:
+        """One-off import of a plain positions file (e.g. the old saved_positions.txt) when `name` is free."""
+        path = Path(path)
+        if self.load(user, name) is not None or not path.exists():
+            return False
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            return False
+        if not text.strip():
+            return False
+        self.save(user, name, text)
+        self.flush()
+        return True
@@ -0,0 +1,166 @@
+# coding: utf-8
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# On-disk daily close history (SQLite, obok portfolios.sqlite)
+# ======================================================
+QUOTE_COLUMNS = ["Ticker", "Price", "First1m", "First1w"]
+
+# download(tickers, start) -> surowa ramka z yf.download(group_by="ticker")
+Downloader = Callable[[list[str], date], pd.DataFrame]
+# download(tickers, start, on_chunk) – każda pobrana paczka od razu trafia do on_chunk
+StreamingDownloader = Callable[[list[str], date, Callable[[pd.DataFrame], None]], pd.DataFrame]
+
+# starsze SQLite pozwalają na 999 parametrów w jednym zapytaniu
+SQL_CHUNK = 900
+
+
+def _chunks(items: list[str], size: int = SQL_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def month_ago(today: date) -> date:
+    # odpowiednik period="1mo" w Yahoo
+    return (pd.Timestamp(today) - pd.DateOffset(months=1)).date()
+
+
+class PriceStore:
+    """Daily closes per ticker, one row per (ticker, day)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS closes ("
+                " ticker TEXT NOT NULL, day TEXT NOT NULL, close REAL NOT NULL,"
+                " PRIMARY KEY (ticker, day)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def last_days(self, tickers: list[str]) -> dict[str, date]:
+        if not tickers:
+            return {}
+        rows = []
+        with closing(self._connect()) as con:
+            for chunk in _chunks(tickers):
+                marks = ",".join("?" * len(chunk))
+                rows += con.execute(
+                    f"SELECT ticker, MAX(day) FROM closes WHERE ticker IN ({marks}) GROUP BY ticker",
+                    chunk,
+                ).fetchall()
+        return {t: date.fromisoformat(d) for t, d in rows}
+
+    def upsert(self, closes: pd.DataFrame):
+        """closes: long frame with Ticker, Day (YYYY-MM-DD), Close."""
+        if closes.empty:
+            return
+        rows = closes[["Ticker", "Day", "Close"]].itertuples(index=False, name=None)
+        with closing(self._connect()) as con, con:
+            con.executemany("INSERT OR REPLACE INTO closes (ticker, day, close) VALUES (?, ?, ?)", rows)
+
+    def load(self, tickers: list[str], since: date) -> pd.DataFrame:
+        """Wide frame: index = day, columns = tickers (NaN where a ticker has no bar)."""
+        if not tickers:
+            return pd.DataFrame()
+        with closing(self._connect()) as con:
+            long = pd.concat(
+                [
+                    pd.read_sql_query(
+                        "SELECT ticker, day, close FROM closes"
+                        f" WHERE day >= ? AND ticker IN ({','.join('?' * len(chunk))})",
+                        con,
+                        params=[since.isoformat(), *chunk],
+                    )
+                    for chunk in _chunks(tickers)
+                ],
+                ignore_index=True,
+            )
+        wide = long.pivot(index="day", columns="ticker", values="close").sort_index()
+        return wide.reindex(columns=tickers)
+
+
+def close_matrix(raw: pd.DataFrame | None, tickers: list[str]) -> pd.DataFrame:
+    """yf.download output -> wide Close frame (index = bar timestamp, columns = tickers found)."""
+    if raw is None or raw.empty:
+        return pd.DataFrame()
+
+    # single ticker
+    if not isinstance(raw.columns, pd.MultiIndex):
+        if "Close" not in raw.columns:
+            return pd.DataFrame()
+        return raw[["Close"]].set_axis([tickers[0]], axis=1)
+
+    if "Close" not in raw.columns.get_level_values(1):
+        return pd.DataFrame()
+    wide = raw.xs("Close", axis=1, level=1)
+    return wide.loc[:, wide.columns.isin(tickers)]
+
+
+def extract_closes(raw: pd.DataFrame | None, tickers: list[str]) -> pd.DataFrame:
+    """yf.download output -> long Ticker/Day/Close frame (NaN bars dropped)."""
+    wide = close_matrix(raw, tickers)
+    if wide.empty:
+        return pd.DataFrame(columns=["Ticker", "Day", "Close"])
+    wide = wide.set_axis(pd.DatetimeIndex(wide.index).strftime("%Y-%m-%d"), axis=0)
+    long = wide.rename_axis(index="Day", columns="Ticker").stack().rename("Close").reset_index()
+    long = long.dropna(subset=["Close"])
+    long["Close"] = long["Close"].astype(float)
+    return long[["Ticker", "Day", "Close"]]
+
+
+def top_up(
+    store: PriceStore, tickers: list[str], download: Downloader | StreamingDownloader, today: date, chunked: bool = False
+) -> None:
+    """Download only the bars after the last stored day of each ticker.
+
+    The last stored bar is fetched again, because intraday it is still moving.
+    Tickers sharing the same start day go out in one request. With `chunked`
+    the download is a StreamingDownloader and every chunk is stored as it
+    arrives instead of once the whole group is in.
+    """
+    window_start = month_ago(today)
+    last = store.last_days(tickers)
+
+    groups: dict[date, list[str]] = {}
+    for t in tickers:
+        start = max(last.get(t, window_start), window_start)
+        groups.setdefault(start, []).append(t)
+
+    for start, group in groups.items():
+        if chunked:
+            download(group, start, lambda chunk, group=group: store.upsert(extract_closes(chunk, group)))
+        else:
+            store.upsert(extract_closes(download(group, start), group))
+
+
+def summarize(closes: pd.DataFrame, tickers: list[str]) -> pd.DataFrame:
+    """Price (last close), First1m (first close in the window), First1w (5th close from the end)."""
+    closes = closes.reindex(columns=tickers).astype(float)
+    if closes.empty:
+        return pd.DataFrame({"Ticker": tickers, "Price": np.nan, "First1m": np.nan, "First1w": np.nan})
+
+    valid = closes.notna().to_numpy()
+    values = closes.to_numpy()
+    count = valid.sum(axis=0)
+    # numer sesji liczony od końca (1 = ostatnia) – tylko wśród dni z notowaniem
+    from_end = valid[::-1].cumsum(axis=0)[::-1]
+    last = valid & (from_end == 1)
+    first = valid & (from_end == count)
+    fifth = valid & (from_end == np.minimum(count, 5))
+
+    def pick(mask: np.ndarray) -> np.ndarray:
+        return values.max(axis=0, initial=-np.inf, where=mask)
+
+    out = pd.DataFrame({"Ticker": tickers, "Price": pick(last), "First1m": pick(first), "First1w": pick(fifth)})
+    out.loc[count == 0, ["Price", "First1m", "First1w"]] = np.nan
+    return out[QUOTE_COLUMNS]
@@ -0,0 +1,209 @@
+# coding: utf-8
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+import pandas as pd
+
+from download import request_timeout, shared_session
+
+# ======================================================
+# Market data providers: Yahoo (pooled session), record to disk, replay from disk, fake
+# ======================================================
+PROVIDERS = ["yahoo", "record", "replay", "fake"]
+RECORD_DIR = Path("recorded")  # surowe odpowiedzi (tryb record) i źródło dla trybu replay
+REPLAY_CACHE_SIZE = 32  # wczytanych plików odpowiedzi trzymanych w pamięci
+
+
+class Provider(Protocol):
+    """What the app needs from a market data source.
+
+    download() returns a frame shaped like yf.download(group_by="ticker"):
+    columns (symbol, field), index = bar timestamps. info() returns the
+    Yahoo .info dict of one symbol ({} when unknown).
+    """
+
+    offline: bool
+
+    def download(self, symbols: list[str], **kwargs) -> pd.DataFrame: ...
+
+    def info(self, symbol: str, timeout: float | None = None) -> dict: ...
+
+
+class YahooProvider:
+    """yfinance over one pooled HTTP session shared by every request in the process."""
+
+    offline = False
+
+    def __init__(self, session=None):
+        import yfinance as yf  # dopiero przy pierwszym użyciu Yahoo (replay/fake działają bez niego)
+
+        self._yf = yf
+        self.session = session if session is not None else shared_session()
+
+    def download(self, symbols: list[str], **kwargs) -> pd.DataFrame:
+        return self._yf.download(
+            tickers=" ".join(symbols),
+            group_by="ticker",
+            auto_adjust=False,
+            threads=True,
+            progress=False,
+            session=self.session,
+            **kwargs,
+        )
+
+    def info(self, symbol: str, timeout: float | None = None) -> dict:
+        # timeout: limit na każde zapytanie HTTP tego wyszukania (domyślnie 30 s z yfinance)
+        with request_timeout(timeout):
+            return getattr(self._yf.Ticker(symbol, session=self.session), "info", {}) or {}
+
+
+class FakeProvider:
+    """FakeMarket behind the provider interface (deterministic prices, no network)."""
+
+    offline = True
+
+    def __init__(self, market=None):
+        from fake_market import FakeMarket
+
+        self.market = market if market is not None else FakeMarket()
+
+    def download(self, symbols: list[str], **kwargs) -> pd.DataFrame:
+        return self.market.download(symbols, group_by="ticker", **kwargs)
+
+    def info(self, symbol: str, timeout: float | None = None) -> dict:
+        return self.market.Ticker(symbol).info
+
+
+def _shape(kwargs: dict) -> str:
+    """Request parameters that decide the bars (interval, period); start/end only narrow them."""
+    return json.dumps({k: str(v) for k, v in sorted(kwargs.items()) if k not in ("start", "end")})
+
+
+class RecordingProvider:
+    """Passes requests to `inner` and saves every non-empty response under `path`.
+
+    One pickle per download plus a line in index.jsonl (symbols + parameters),
+    infos in info.json – the layout ReplayProvider reads.
+    """
+
+    def __init__(self, inner: Provider, path: Path = RECORD_DIR):
+        self.inner = inner
+        self.offline = inner.offline
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def download(self, symbols: list[str], **kwargs) -> pd.DataFrame:
+        frame = self.inner.download(symbols, **kwargs)
+        if frame is None or frame.empty:
+            return frame
+        if not isinstance(frame.columns, pd.MultiIndex):  # pojedynczy symbol bez grupowania
+            frame = pd.concat({symbols[0]: frame}, axis=1)
+        digest = hashlib.blake2b(f"{symbols}{_shape(kwargs)}".encode("utf-8"), digest_size=6).hexdigest()
+        name = f"{time.time_ns()}-{digest}.pkl"
+        frame.to_pickle(self.path / name)
+        entry = {"file": name, "symbols": list(dict.fromkeys(frame.columns.get_level_values(0))), "shape": _shape(kwargs)}
+        with self._lock, open(self.path / "index.jsonl", "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry) + "\n")
+        return frame
+
+    def info(self, symbol: str, timeout: float | None = None) -> dict:
+        info = self.inner.info(symbol, timeout)
+        if info:
+            with self._lock:
+                f = self.path / "info.json"
+                saved = json.loads(f.read_text(encoding="utf-8")) if f.exists() else {}
+                saved[symbol] = info
+                tmp = f.with_suffix(".tmp")
+                tmp.write_text(json.dumps(saved, default=str), encoding="utf-8")
+                tmp.replace(f)
+        return info
+
+
+class ReplayProvider:
+    """Serves recorded responses without touching the network.
+
+    A symbol is taken from the newest recording with the same interval/period,
+    whichever chunk it arrived in; `start`/`end` cut the recorded bars. Symbols
+    never recorded come back missing, like a failed Yahoo chunk.
+    """
+
+    offline = True
+
+    def __init__(self, path: Path = RECORD_DIR):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._seen = 0  # wczytane bajty index.jsonl
+        self._latest: dict[tuple[str, str], str] = {}  # (shape, symbol) -> plik
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._info: dict | None = None
+
+    def _refresh(self):
+        f = self.path / "index.jsonl"
+        if not f.exists() or f.stat().st_size == self._seen:
+            return
+        with open(f, encoding="utf-8") as fh:
+            fh.seek(self._seen)
+            for line in fh:
+                if line.endswith("\n"):
+                    entry = json.loads(line)
+                    for s in entry["symbols"]:
+                        self._latest[(entry["shape"], s)] = entry["file"]
+                    self._seen += len(line.encode("utf-8"))
+
+    def _frame(self, name: str) -> pd.DataFrame:
+        frame = self._frames.pop(name, None)
+        if frame is None:
+            frame = pd.read_pickle(self.path / name)
+        self._frames[name] = frame
+        while len(self._frames) > REPLAY_CACHE_SIZE:
+            self._frames.pop(next(iter(self._frames)))
+        return frame
+
+    def download(self, symbols: list[str], **kwargs) -> pd.DataFrame:
+        shape = _shape(kwargs)
+        with self._lock:
+            self._refresh()
+            files: dict[str, list[str]] = {}
+            for s in dict.fromkeys(symbols):
+                name = self._latest.get((shape, s))
+                if name is not None:
+                    files.setdefault(name, []).append(s)
+            parts = [self._frame(name).loc[:, syms] for name, syms in files.items()]
+        if not parts:
+            return pd.DataFrame()
+        frame = pd.concat(parts, axis=1).sort_index()
+        days = pd.DatetimeIndex(frame.index)
+        if days.tz is not None:
+            days = days.tz_localize(None)
+        keep = np.ones(len(frame), dtype=bool)
+        if "start" in kwargs:
+            keep &= days >= pd.Timestamp(kwargs["start"])
+        if "end" in kwargs:
+            keep &= days < pd.Timestamp(kwargs["end"])
+        return frame[keep]
+
+    def info(self, symbol: str, timeout: float | None = None) -> dict:
+        with self._lock:
+            if self._info is None:
+                f = self.path / "info.json"
+                self._info = json.loads(f.read_text(encoding="utf-8")) if f.exists() else {}
+            return dict(self._info.get(symbol, {}))
+
+
+def make_provider(name: str = "yahoo", path: Path = RECORD_DIR) -> Provider:
+    """Provider by name (PROVIDERS); raises ValueError for unknown names."""
+    if name == "yahoo":
+        return YahooProvider()
+    if name == "record":
+        return RecordingProvider(YahooProvider(), path)
+    if name == "replay":
+        return ReplayProvider(path)
+    if name == "fake":
+        return FakeProvider()
+    raise ValueError(f"nieznany dostawca danych {name!r} (dostępne: {', '.join(PROVIDERS)})")
@@ -0,0 +1,164 @@
+# coding: utf-8
+import hashlib
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from price_store import QUOTE_COLUMNS
+
+# ======================================================
+# Per-ticker quote cache (each symbol has its own freshness), published as one shared snapshot
+# ======================================================
+# fetch(tickers) -> ramka z kolumnami QUOTE_COLUMNS (jedno zapytanie bulk)
+QuoteFetcher = Callable[[list[str]], pd.DataFrame]
+
+_FIELDS = QUOTE_COLUMNS[1:]
+# wszystko w float64: trend porównuje cenę z kotwicą 1M/1W wprost, a float32 zmieniłby "flat" w "up"/"down"
+_DTYPES = {c: np.float64 for c in _FIELDS}
+
+
+class MarketSnapshot:
+    """Quotes of every ticker the process has seen, as one immutable columnar frame.
+
+    QuoteCache publishes a snapshot whole and never changes it afterwards, so
+    all sessions read the same arrays without a lock and without a copy. A
+    refresh builds the next snapshot beside it and swaps the reference.
+    Ticker is categorical over the lookup index (the strings are stored
+    once).
+    """
+
+    def __init__(self, tickers: pd.Index, columns: dict[str, np.ndarray], fetched: np.ndarray, version: int = 0):
+        self.index = tickers
+        self.fetched = fetched  # czas pobrania (monotonic) na wiersz
+        self.version = version
+        for arr in (fetched, *columns.values()):
+            arr.flags.writeable = False
+        ticker = pd.Categorical.from_codes(np.arange(len(tickers)), categories=tickers)
+        self.frame = pd.DataFrame({"Ticker": ticker, **columns}, copy=False)  # widoki na tablice powyżej
+
+    @classmethod
+    def empty(cls, version: int = 0) -> "MarketSnapshot":
+        columns = {c: np.empty(0, dtype=d) for c, d in _DTYPES.items()}
+        return cls(pd.Index([], dtype=object), columns, np.empty(0), version)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rows(self, tickers: list[str]) -> np.ndarray:
+        """Row per ticker, -1 for symbols never fetched."""
+        return self.index.get_indexer(list(tickers))
+
+    def fetched_at(self, tickers: list[str]) -> np.ndarray:
+        rows = self.rows(tickers)
+        return np.where(rows >= 0, self.fetched[np.maximum(rows, 0)] if len(self) else 0.0, -np.inf)
+
+    def quotes_column(self, column: str, tickers: list[str]) -> np.ndarray:
+        rows = self.rows(tickers)
+        col = self.frame[column].to_numpy()
+        return np.where(rows >= 0, col[np.maximum(rows, 0)] if len(self) else np.nan, np.nan)
+
+    def quotes(self, tickers: list[str]) -> pd.DataFrame:
+        """Quotes in `tickers` order (a copy of just those rows); NaN for symbols never fetched."""
+        frame = pd.DataFrame({"Ticker": list(tickers)})
+        for c in _FIELDS:
+            frame[c] = self.quotes_column(c, tickers)
+        return frame
+
+    def digest(self, tickers: list[str]) -> str:
+        """Hash of the quotes of these tickers – changes exactly when one of them does."""
+        h = hashlib.blake2b(digest_size=16)
+        for c in _FIELDS:
+            h.update(self.quotes_column(c, tickers).tobytes())
+        return h.hexdigest()
+
+    def updated(self, quotes: pd.DataFrame, now: float) -> "MarketSnapshot":
+        """Next snapshot with these rows replaced or appended; this one stays untouched."""
+        quotes = quotes.drop_duplicates("Ticker", keep="last")
+        new = pd.Index(quotes["Ticker"].tolist(), dtype=object)
+        index = self.index.append(new[~new.isin(self.index)])
+        rows = index.get_indexer(new)
+        columns = {}
+        for c, dtype in _DTYPES.items():
+            col = np.full(len(index), np.nan, dtype=dtype)
+            col[: len(self)] = self.frame[c].to_numpy()
+            col[rows] = quotes[c].to_numpy(dtype=dtype)
+            columns[c] = col
+        fetched = np.full(len(index), now)
+        fetched[: len(self)] = self.fetched
+        fetched[rows] = now
+        return MarketSnapshot(index, columns, fetched, self.version + 1)
+
+    def without(self, tickers: list[str]) -> "MarketSnapshot":
+        keep = ~self.index.isin(list(tickers))
+        columns = {c: self.frame[c].to_numpy()[keep] for c in _DTYPES}
+        return MarketSnapshot(self.index[keep], columns, self.fetched[keep], self.version + 1)
+
+
+class QuoteCache:
+    """Quotes keyed by ticker, not by the whole ticker list.
+
+    Adding, removing or reordering positions only fetches the symbols that
+    are missing or older than `ttl`; everything else is served from the
+    current MarketSnapshot, which is shared by every caller.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._lock = threading.Lock()  # tylko publikacja – odczyt bierze bieżącą referencję bez blokady
+        self._fetch_lock = threading.Lock()  # równoległe sesje nie pobierają tych samych tickerów dwa razy
+        self._snapshot = MarketSnapshot.empty()
+
+    @property
+    def current(self) -> MarketSnapshot:
+        return self._snapshot
+
+    def stale(self, tickers: list[str]) -> list[str]:
+        tickers = list(dict.fromkeys(tickers))
+        old = time.monotonic() - self.current.fetched_at(tickers) > self.ttl
+        return [t for t, o in zip(tickers, old) if o]
+
+    def missing(self, tickers: list[str]) -> list[str]:
+        tickers = list(dict.fromkeys(tickers))
+        return [t for t, r in zip(tickers, self.current.rows(tickers)) if r < 0]
+
+    def age(self, tickers: list[str]) -> float | None:
+        """Seconds since the oldest of these quotes was fetched (None when none is cached)."""
+        times = self.current.fetched_at(tickers)
+        times = times[np.isfinite(times)]
+        return time.monotonic() - times.min() if len(times) else None
+
+    def invalidate(self, tickers: list[str] | None = None):
+        with self._lock:
+            snap = self._snapshot
+            self._snapshot = MarketSnapshot.empty(snap.version + 1) if tickers is None else snap.without(tickers)
+
+    def put(self, quotes: pd.DataFrame):
+        now = time.monotonic()
+        with self._lock:
+            self._snapshot = self._snapshot.updated(quotes, now)
+
+    def get(
+        self, tickers: list[str], fetch: QuoteFetcher, serve_stale: bool = False
+    ) -> tuple[MarketSnapshot, list[str]]:
+        """Snapshot holding `tickers` and the list of symbols that had to be fetched.
+
+        With `serve_stale` only never-seen symbols are fetched; expired ones are
+        returned as they are and left to the background refresher.
+        """
+        todo = self.missing if serve_stale else self.stale
+        fetched: list[str] = []
+        if todo(tickers):
+            with self._fetch_lock:
+                fetched = todo(tickers)  # ktoś mógł je pobrać, gdy czekaliśmy
+                if fetched:
+                    # symbol bez notowań też zapamiętujemy (NaN), żeby nie pytać o niego co chwilę
+                    quotes = fetch(fetched).drop_duplicates("Ticker").set_index("Ticker")
+                    self.put(quotes.reindex(fetched).rename_axis("Ticker").reset_index())
+        return self.current, fetched
+
+    def snapshot(self, tickers: list[str]) -> pd.DataFrame:
+        """Cached quotes in `tickers` order; NaN for symbols never fetched."""
+        return self.current.quotes(tickers)
@@ -0,0 +1,214 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+
+from valuation import category
+
+# ======================================================
+# Rebalancing: trades toward target weights per (asset class, currency), per-account constraints
+# ======================================================
+TARGET_COLUMNS = ["Class", "Currency", "Weight"]  # Weight w %, normalizowane do sumy 100
+ACCOUNT_COLUMNS = ["Account", "Cash_PLN", "AllowSells"]  # Cash_PLN: dopłata (np. limit IKE/IKZE), AllowSells: czy wolno sprzedawać
+TRADE_COLUMNS = ["Account", "Ticker", "Name", "Side", "Quantity", "Price", "Currency", "Value_PLN"]
+SLEEVE_COLUMNS = ["Class", "Currency", "Target", "Before", "After", "Trade_PLN"]
+TAX_ACCOUNTS = ["IKE", "IKZE"]  # domyślnie bez sprzedaży
+MIN_TRADE = 100.0  # PLN – mniejsze transakcje są pomijane
+# kary w funkcji celu (udziały jako ułamki): sprzedaż tylko gdy zmniejsza odchylenie o więcej niż SELL_COST,
+# zakup/sprzedaż tego samego w jednym koncie nigdy się nie opłaca
+SELL_COST = 1e-4
+BUY_COST = 1e-6
+ADMM_RHO = 0.1
+ADMM_ALPHA = 1.6
+ADMM_TOL = 1e-9
+ADMM_MAX_ITER = 20_000
+
+
+def asset_class(df: pd.DataFrame) -> pd.Series:
+    """STOCK / CRYPTO by ticker, whatever the account (the Category column puts IKE/IKZE first)."""
+    return category(df["Ticker"], pd.Series("STANDARD", index=df.index))
+
+
+def current_targets(df: pd.DataFrame) -> pd.DataFrame:
+    """Today's weights as TARGET_COLUMNS – a starting point to edit."""
+    held = df[df["Value_PLN"] > 0]
+    w = held.groupby([asset_class(held), held["Currency"]])["Value_PLN"].sum()
+    w = (w / w.sum() * 100).round(1) if len(w) else w
+    return w.rename_axis(["Class", "Currency"]).rename("Weight").reset_index()[TARGET_COLUMNS]
+
+
+def default_accounts(df: pd.DataFrame) -> pd.DataFrame:
+    accounts = sorted(df["Account"].dropna().unique(), key=lambda a: (a in TAX_ACCOUNTS, a))
+    return pd.DataFrame({"Account": accounts, "Cash_PLN": 0.0, "AllowSells": [a not in TAX_ACCOUNTS for a in accounts]})
+
+
+def normalize_targets(targets: pd.DataFrame) -> pd.DataFrame:
+    """Validated targets with Weight as fractions summing to 1; raises ValueError."""
+    t = targets.reindex(columns=TARGET_COLUMNS).dropna(how="all").copy()
+    t["Class"] = t["Class"].fillna("").astype(str).str.strip().str.upper()
+    t["Currency"] = t["Currency"].fillna("").astype(str).str.strip().str.upper()
+    t["Weight"] = pd.to_numeric(t["Weight"], errors="coerce")
+    bad = (t["Class"] == "") | (t["Currency"] == "") | t["Weight"].isna() | (t["Weight"] < 0)
+    if bad.any():
+        row = t[bad].iloc[0]
+        raise ValueError(f"błędny cel {row['Class']!r} {row['Currency']!r} {row['Weight']}")
+    t = t.groupby(["Class", "Currency"], as_index=False)["Weight"].sum()
+    total = t["Weight"].sum()
+    if total <= 0:
+        raise ValueError("suma wag docelowych musi być dodatnia")
+    return t.assign(Weight=t["Weight"] / total)
+
+
+def _solve_qp(P: np.ndarray, q: np.ndarray, A: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """min ½xᵀPx + qᵀx  s.t.  lo ≤ Ax ≤ hi  (ADMM as in OSQP; the problem here has tens of variables)."""
+    n, m = len(q), len(lo)
+    sigma = 1e-6
+    rho = np.full(m, ADMM_RHO)
+    rho[lo == hi] *= 1e3  # wiersze równości (zmienne przypięte do zera)
+    K = np.linalg.inv(P + sigma * np.eye(n) + A.T @ (rho[:, None] * A))
+    x, z, y = np.zeros(n), np.clip(np.zeros(m), lo, hi), np.zeros(m)
+    for it in range(ADMM_MAX_ITER):
+        x_t = K @ (sigma * x - q + A.T @ (rho * z - y))
+        z_t = A @ x_t
+        x = ADMM_ALPHA * x_t + (1 - ADMM_ALPHA) * x
+        z_relaxed = ADMM_ALPHA * z_t + (1 - ADMM_ALPHA) * z
+        z_new = np.clip(z_relaxed + y / rho, lo, hi)
+        y = y + rho * (z_relaxed - z_new)
+        z = z_new
+        if it % 25 == 0:
+            primal = np.abs(A @ x - z).max(initial=0.0)
+            dual = np.abs(P @ x + q + A.T @ y).max(initial=0.0)
+            if primal < ADMM_TOL and dual < ADMM_TOL:
+                break
+    return np.clip(A @ x, lo, hi)[m - n :]  # zmienne z wierszy jednostkowych – dokładnie w granicach
+
+
+def rebalance(
+    df: pd.DataFrame,
+    targets: pd.DataFrame,
+    accounts: pd.DataFrame | None = None,
+    min_trade: float = MIN_TRADE,
+    whole_shares: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Trade list (TRADE_COLUMNS) and per-sleeve summary (SLEEVE_COLUMNS, weights in %).
+
+    df is the valued frame. A sleeve is (asset class, currency); the trade in
+    each (account, sleeve) comes from one quadratic program over those few
+    aggregates: squared distance of the post-trade weights from the targets,
+    with each account's buys limited to its cash (Cash_PLN plus what it sells)
+    and sells to its holdings, or to none when AllowSells is off. Trades only
+    use tickers the account already holds in the sleeve: a buy goes to the
+    largest of them, a sell takes from the largest down. STOCK quantities are
+    rounded to whole shares (buys down, sells up); buys under `min_trade` PLN
+    are dropped and smaller sells raised to it. Buys are then scaled down
+    wherever an account would still spend more than its cash plus sells.
+    """
+    targets = normalize_targets(targets)
+    accounts = (default_accounts(df) if accounts is None else accounts).reindex(columns=ACCOUNT_COLUMNS)
+    accounts = accounts.dropna(subset=["Account"]).drop_duplicates("Account").set_index("Account")
+    cash_in = pd.to_numeric(accounts["Cash_PLN"], errors="coerce").fillna(0.0)
+    if (cash_in < 0).any():
+        raise ValueError("dopłata na konto nie może być ujemna")
+
+    pos = df[(df["Value_PLN"] > 0) & (df["Quantity"] > 0)].copy()
+    pos["Class"] = asset_class(pos)
+    acc_names = list(dict.fromkeys([*pos["Account"].unique(), *cash_in.index]))
+    sleeves = pd.MultiIndex.from_frame(
+        pd.concat([pos[["Class", "Currency"]], targets[["Class", "Currency"]]]).drop_duplicates().sort_values(["Class", "Currency"])
+    )
+    S, A = len(sleeves), len(acc_names)
+    total = float(pos["Value_PLN"].sum() + cash_in.sum())
+    if total <= 0 or S == 0:
+        return pd.DataFrame(columns=TRADE_COLUMNS), pd.DataFrame(columns=SLEEVE_COLUMNS)
+
+    # macierz stanów: konto × koszyk (PLN)
+    a_idx = pd.Index(acc_names).get_indexer(pos["Account"])
+    s_idx = sleeves.get_indexer(pd.MultiIndex.from_frame(pos[["Class", "Currency"]]))
+    held = np.zeros((A, S))
+    np.add.at(held, (a_idx, s_idx), pos["Value_PLN"].to_numpy(dtype=float))
+    cash = cash_in.reindex(acc_names, fill_value=0.0).to_numpy(dtype=float)
+    sells = accounts["AllowSells"].reindex(acc_names).fillna(True).astype(bool).to_numpy()
+
+    target = targets.set_index(["Class", "Currency"])["Weight"].reindex(sleeves, fill_value=0.0).to_numpy()
+    before = held.sum(axis=0) / total
+    gap = target - before
+
+    # zmienne: zakupy b i sprzedaże s dla każdej pary (konto, koszyk), jako ułamki wartości portfela
+    n = A * S
+    acct_of = np.repeat(np.arange(A), S)
+    sleeve_of = np.tile(np.arange(S), A)
+    B = np.zeros((S, n))
+    B[sleeve_of, np.arange(n)] = 1.0
+    M = np.hstack([B, -B])  # zmiana udziału koszyka = B(b - s)
+    P = M.T @ M
+    q = -M.T @ gap + np.concatenate([np.full(n, BUY_COST), np.full(n, SELL_COST)])
+
+    h = held.ravel() / total
+    buy_cap = np.where(h > 0, ((cash + np.where(sells, held.sum(axis=1), 0.0)) / total)[acct_of], 0.0)
+    sell_cap = np.where(sells[acct_of], h, 0.0)
+    E = np.zeros((A, 2 * n))  # budżet konta: zakupy - sprzedaże ≤ dopłata
+    E[acct_of, np.arange(n)] = 1.0
+    E[acct_of, n + np.arange(n)] = -1.0
+    Acons = np.vstack([E, np.eye(2 * n)])
+    lo = np.concatenate([np.full(A, -np.inf), np.zeros(2 * n)])
+    hi = np.concatenate([cash / total, buy_cap, sell_cap])
+    bs = _solve_qp(P, q, Acons, lo, hi)
+    trade = ((bs[:n] - bs[n:]) * total).reshape(A, S)  # PLN na (konto, koszyk)
+
+    trade[np.abs(trade) < min_trade] = 0.0
+
+    # na tickery: zakup w największej pozycji koszyka na koncie, sprzedaż od największych w dół
+    pos = pos.assign(_g=a_idx * S + s_idx).sort_values(["_g", "Value_PLN"], ascending=[True, False])
+    g = pos["_g"].to_numpy()
+    held_value = pos["Value_PLN"].to_numpy(dtype=float)
+    amount = trade.ravel()[g]
+    before_me = pos.groupby("_g")["Value_PLN"].cumsum().to_numpy() - held_value
+    first = np.r_[True, g[1:] != g[:-1]]
+    value = np.where(amount > 0, np.where(first, amount, 0.0), -np.clip(-amount - before_me, 0.0, held_value))
+
+    held_qty = pos["Quantity"].to_numpy(dtype=float)
+    unit = held_value / held_qty  # PLN za sztukę
+    qty = value / unit
+    whole = (pos["Class"] == "STOCK").to_numpy() & whole_shares
+    qty = np.where(whole, np.floor(qty), qty)  # zakupy w dół, sprzedaże w górę (co do wielkości)
+    # sprzedaż poniżej minimum podnosimy do minimum, nie pomijamy – inaczej zabrakłoby gotówki na zakupy
+    small_sell = (qty < 0) & (-qty * unit < min_trade)
+    lifted = min_trade / unit
+    qty = np.where(small_sell, -np.where(whole, np.ceil(lifted), lifted), qty)
+    qty = np.maximum(qty, -held_qty)  # nigdy więcej niż w portfelu
+    value = qty * unit
+    keep = (value < 0) | (value >= max(min_trade, 1e-9))
+
+    # próg minimum mógł usunąć sprzedaże, z których płaciliśmy za zakupy – budżet konta sprawdzamy jeszcze raz
+    acct = g // S
+    buys, net = np.zeros(A), np.zeros(A)
+    np.add.at(buys, acct[keep], np.maximum(value[keep], 0.0))
+    np.add.at(net, acct[keep], value[keep])
+    over = np.maximum(net - cash, 0.0)
+    if (over > 1e-9).any():
+        scale = np.divide(buys - over, buys, out=np.zeros(A), where=buys > 0).clip(0.0, 1.0)
+        qty = np.where(qty > 0, qty * scale[acct], qty)
+        qty = np.where(whole & (qty > 0), np.floor(qty), qty)
+        value = qty * unit
+        keep = (value < 0) | (value >= max(min_trade, 1e-9))
+
+    trades = pos.loc[keep, ["Account", "Ticker", "Name", "Price", "Currency"]].assign(
+        Side=np.where(value[keep] > 0, "BUY", "SELL"),
+        Quantity=np.abs(qty[keep]),
+        Value_PLN=np.abs(value[keep]),
+    )
+    trades = trades.sort_values(["Account", "Side", "Value_PLN"], ascending=[True, False, False])[TRADE_COLUMNS]
+
+    done = np.zeros(S)
+    np.add.at(done, (g % S)[keep], value[keep])
+    summary = sleeves.to_frame(index=False).assign(
+        Target=target * 100,
+        Before=before * 100,
+        After=(held.sum(axis=0) + done) / total * 100,
+        Trade_PLN=done,
+    )
+    return trades.reset_index(drop=True), summary[SLEEVE_COLUMNS]
+
+
+def tracking_error(summary: pd.DataFrame, column: str = "After") -> float:
+    """Root of summed squared weight gaps to target, in percentage points."""
+    return float(np.sqrt(((summary[column] - summary["Target"]) ** 2).sum()))
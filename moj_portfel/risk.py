@@ -0,0 +1,130 @@
+# coding: utf-8
+import threading
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from history import ValueHistory
+
+# ======================================================
+# Risk: returns, volatility, correlation, drawdown, VaR / CVaR (batched NumPy)
+# ======================================================
+TRADING_DAYS = 252
+ROLLING_WINDOW = 21  # ~1 miesiąc sesji
+RISK_COLUMNS = ["Volatility", "MaxDrawdown", "VaR_hist", "CVaR_hist", "VaR_param", "CVaR_param"]
+
+
+def simple_returns(prices: np.ndarray) -> np.ndarray:
+    """Day-over-day returns down the rows; 0 where either day has no (positive) price."""
+    prev, cur = prices[:-1], prices[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = cur / prev - 1.0
+    return np.where(np.isfinite(r) & (prev > 0), r, 0.0)
+
+
+def volatility(returns: np.ndarray) -> np.ndarray:
+    """Annualized standard deviation per column."""
+    if len(returns) < 2:
+        return np.full(returns.shape[1:], np.nan)
+    return returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+
+def rolling_volatility(returns: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+    """Annualized volatility over a sliding window (cumulative sums, no per-window loop); NaN until full."""
+    out = np.full(returns.shape, np.nan)
+    if len(returns) < window:
+        return out
+    zero = np.zeros((1, *returns.shape[1:]))
+    c1 = np.concatenate([zero, returns.cumsum(axis=0)])
+    c2 = np.concatenate([zero, (returns**2).cumsum(axis=0)])
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    var = np.maximum(s2 - s1**2 / window, 0.0) / (window - 1)
+    out[window - 1 :] = np.sqrt(var * TRADING_DAYS)
+    return out
+
+
+def max_drawdown(values: np.ndarray) -> np.ndarray:
+    """Deepest fall from a running peak per column, as a negative fraction (0 = never below a peak)."""
+    peak = np.maximum.accumulate(np.nan_to_num(values), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, values / peak - 1.0, 0.0)
+    return np.nanmin(dd, axis=0) if len(values) else np.full(values.shape[1:], np.nan)
+
+
+def var_cvar(returns: np.ndarray, level: float = 0.95) -> dict[str, np.ndarray]:
+    """One-day VaR / CVaR per column as positive loss fractions, historical and normal (parametric)."""
+    tail = 1.0 - level
+    q = np.quantile(returns, tail, axis=0)
+    beyond = returns <= q
+    with np.errstate(invalid="ignore"):
+        cvar_hist = -(returns * beyond).sum(axis=0) / beyond.sum(axis=0)
+
+    mu = returns.mean(axis=0)
+    sigma = returns.std(axis=0, ddof=1)
+    z = NormalDist().inv_cdf(tail)
+    return {
+        "VaR_hist": -q,
+        "CVaR_hist": cvar_hist,
+        "VaR_param": -(mu + sigma * z),
+        "CVaR_param": -(mu - sigma * NormalDist().pdf(z) / tail),
+    }
+
+
+def covariance(returns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(covariance, correlation) of the columns from one matrix product."""
+    x = returns - returns.mean(axis=0)
+    cov = x.T @ x / max(len(returns) - 1, 1)
+    sd = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(sd, sd)
+    return cov, corr
+
+
+def risk_table(values: pd.DataFrame, level: float = 0.95) -> pd.DataFrame:
+    """Risk of each value series (columns = accounts, portfolio, ...), one row per series.
+
+    VaR/CVaR are one-day losses as fractions; *_PLN columns scale them by the last value.
+    """
+    v = values.to_numpy(dtype=float)
+    r = simple_returns(v)
+    out = pd.DataFrame(index=values.columns)
+    out["Volatility"] = volatility(r)
+    out["MaxDrawdown"] = max_drawdown(v)
+    if len(r):
+        for name, arr in var_cvar(r, level).items():
+            out[name] = arr
+    else:
+        out[RISK_COLUMNS[2:]] = np.nan
+    last = v[-1] if len(v) else np.full(len(values.columns), np.nan)
+    for name in RISK_COLUMNS[2:]:
+        out[f"{name}_PLN"] = out[name].to_numpy() * last
+    return out
+
+
+class ReturnCache:
+    """Base-currency daily returns of a ticker set, cached per set and extended from the first changed row."""
+
+    def __init__(self, history: ValueHistory, size: int = 4):
+        self.history = history
+        self.size = size
+        self._lock = threading.Lock()
+        self._cache: dict[tuple, tuple[int, int, np.ndarray, np.ndarray]] = {}  # (wersja, l. symboli, ceny, stopy)
+
+    def returns(self, tickers: list[str], currencies: list[str]) -> pd.DataFrame:
+        key = (tuple(tickers), tuple(currencies))
+        m = self.history.matrix
+        with self._lock:
+            empty = np.empty((0, len(tickers)))
+            version, width, prices, rets = self._cache.pop(key, (0, -1, empty, empty))
+            first = m.first_change_since(version) if width == len(m.symbols) else 0
+            first = min(first, len(prices))
+            if first < m.rows or len(prices) < m.rows:
+                prices = np.vstack([prices[:first], self.history.pln_closes(tickers, currencies, first)])
+                start = max(first - 1, 0)  # stopa z dnia `first` zależy też od ceny z dnia wcześniej
+                rets = np.vstack([rets[:start], simple_returns(prices[start:])])
+            self._cache[key] = (m.version, len(m.symbols), prices, rets)
+            while len(self._cache) > self.size:
+                self._cache.pop(next(iter(self._cache)))
+        return pd.DataFrame(rets, index=m.days[1 : len(prices)], columns=tickers)
@@ -0,0 +1,93 @@
+# coding: utf-8
+import threading
+import time
+from typing import Callable, Iterable
+
+import pandas as pd
+
+# ======================================================
+# Background refresh (stale-while-revalidate)
+# ======================================================
+IDLE_EXPIRY = 3600  # s – portfel nieoglądany dłużej niż godzinę przestaje być odświeżany
+
+
+class Refresher:
+    """Daemon thread that keeps quotes and FX warm for every portfolio seen recently.
+
+    Pages register what they display and render from the last good snapshot;
+    the thread does the Yahoo round trips on its own schedule. After each pass
+    `on_refresh` gets the (positions, currencies) of every registered portfolio,
+    so work that follows a price update (alerts) runs even with no page open.
+    """
+
+    def __init__(
+        self,
+        refresh_quotes: Callable[[list[str]], object],
+        refresh_fx: Callable[[tuple[str, ...]], object],
+        interval: float = 60,
+        on_refresh: Callable[[list[tuple[pd.DataFrame, tuple[str, ...]]]], object] | None = None,
+    ):
+        self.refresh_quotes = refresh_quotes
+        self.refresh_fx = refresh_fx
+        self.on_refresh = on_refresh
+        self.interval = interval
+        self.last_run: float | None = None  # time.time() ostatniego udanego przebiegu
+        self.last_error: str | None = None
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # tickery -> (ostatnio widziany, waluty, pozycje)
+        self._portfolios: dict[frozenset, tuple[float, tuple[str, ...], pd.DataFrame | None]] = {}
+        self._thread: threading.Thread | None = None
+
+    def register(self, tickers: Iterable[str], currencies: Iterable[str], positions: pd.DataFrame | None = None):
+        key = frozenset(tickers)
+        with self._lock:
+            new = key not in self._portfolios
+            self._portfolios[key] = (time.monotonic(), tuple(sorted(set(currencies))), positions)
+        if new and positions is not None and self.on_refresh is not None:
+            self._wake.set()  # nowy portfel: alerty sprawdzone od razu, nie dopiero po interwale
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="portfel-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _work(self) -> tuple[list[str], tuple[str, ...], list[tuple[pd.DataFrame, tuple[str, ...]]]]:
+        now = time.monotonic()
+        with self._lock:
+            for key, (seen, _, _) in list(self._portfolios.items()):
+                if now - seen > IDLE_EXPIRY:
+                    del self._portfolios[key]
+            tickers = sorted(set().union(*self._portfolios)) if self._portfolios else []
+            currencies = tuple(sorted({c for _, cs, _ in self._portfolios.values() for c in cs}))
+            portfolios = [(p, cs) for _, cs, p in self._portfolios.values() if p is not None]
+        return tickers, currencies, portfolios
+
+    def run_once(self):
+        tickers, currencies, portfolios = self._work()
+        if currencies:
+            self.refresh_fx(currencies)
+        if tickers:
+            self.refresh_quotes(tickers)  # cache sam wybierze tylko nieświeże tickery
+        if portfolios and self.on_refresh is not None:
+            self.on_refresh(portfolios)
+        self.last_run = time.time()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:  # wątek nie może umrzeć przez jeden zły przebieg
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._wake.wait(self.interval)
+            self._wake.clear()
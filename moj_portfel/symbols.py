@@ -0,0 +1,289 @@
+# coding: utf-8
+import difflib
+import json
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from valuation import currency_hint
+
+# ======================================================
+# Symbol index: sorted fixed-width columns in .npy files, memory-mapped, prefix + fuzzy search
+# ======================================================
+SYMBOL_COLUMNS = ["Symbol", "Name", "Currency", "Exchange"]
+SEED_FILE = Path(__file__).resolve().parent / "symbols_seed.csv"  # dołączona lista startowa
+TOKEN_BYTES = 16  # słowa nazw przycięte do tylu bajtów (wystarcza do wyszukiwania po prefiksie)
+FUZZY_CANDIDATES = 400  # najwyżej tyle symboli porównujemy przy wyszukiwaniu przybliżonym
+FUZZY_CUTOFF = 0.6
+
+
+def read_listing(path: Path) -> pd.DataFrame:
+    """SYMBOL_COLUMNS from a CSV with Symbol, Name and optionally Currency."""
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    raw.columns = [c.strip().capitalize() for c in raw.columns]
+    if "Symbol" not in raw or "Name" not in raw:
+        raise ValueError(f"{path}: wymagane kolumny Symbol i Name")
+    return _normalize(raw)
+
+
+def names_listing(path: Path) -> pd.DataFrame:
+    """Symbols already resolved by the app (saved_names.json: Yahoo name + currency)."""
+    try:
+        meta = json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return pd.DataFrame(columns=SYMBOL_COLUMNS)
+    rows = [
+        {"Symbol": t, "Name": m["name"], "Currency": m.get("currency") or ""}
+        for t, m in meta.items()
+        if isinstance(m, dict) and m.get("name")
+    ]
+    return _normalize(pd.DataFrame(rows, columns=["Symbol", "Name", "Currency"]))
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame({"Symbol": df["Symbol"].astype(str).str.strip().str.upper()})
+    out["Name"] = df["Name"].astype(str).str.strip()
+    currency = df["Currency"].astype(str).str.strip() if "Currency" in df else pd.Series("", index=df.index)
+    out["Currency"] = currency.where(currency != "", currency_hint(out["Symbol"]))
+    out["Exchange"] = np.where(out["Symbol"].str.contains(".", regex=False), out["Symbol"].str.rsplit(".", n=1).str[-1], "")
+    return out[out["Symbol"] != ""][SYMBOL_COLUMNS]
+
+
+def _fixed(values: pd.Series) -> np.ndarray:
+    encoded = values.str.encode("utf-8")
+    width = max(1, int(encoded.str.len().max())) if len(encoded) else 1
+    return encoded.to_numpy().astype(f"S{width}")
+
+
+def build_index(listing: pd.DataFrame, path: Path, complete: bool = False, sources: list[str] | None = None) -> int:
+    """Write the index for a SYMBOL_COLUMNS frame (later rows win on duplicates); returns the row count.
+
+    Files get a new version suffix and meta.json is switched last, so readers
+    with an open index keep their (old) files until they reopen.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    df = listing.drop_duplicates("Symbol", keep="last").sort_values("Symbol", kind="stable").reset_index(drop=True)
+
+    names = df["Name"].str.encode("utf-8")
+    offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(names.str.len().to_numpy(dtype=np.int64))
+    blob = np.frombuffer(b"".join(names), dtype=np.uint8)
+
+    # słowa nazw (małe litery) -> wiersz, posortowane: wyszukiwanie "apple", "orlen" po prefiksie
+    words = df["Name"].str.lower().str.findall(r"\w+").explode().dropna()
+    words = words[words.str.len() > 1]
+    tokens = words.str.encode("utf-8").str[:TOKEN_BYTES].to_numpy().astype(f"S{TOKEN_BYTES}")
+    token_rows = words.index.to_numpy(dtype=np.int32)
+    order = np.argsort(tokens, kind="stable")
+
+    old = _read_meta(path)
+    version = int(old.get("version", 0)) + 1
+    arrays = {
+        "symbol": _fixed(df["Symbol"]),
+        "currency": _fixed(df["Currency"]),
+        "exchange": _fixed(df["Exchange"]),
+        "name_offsets": offsets,
+        "names": blob,
+        "tokens": tokens[order],
+        "token_rows": token_rows[order],
+    }
+    for key, arr in arrays.items():
+        np.save(path / f"{key}-{version}.npy", arr)
+    meta = {"version": version, "rows": len(df), "complete": complete, "built": time.time(), "sources": sources or []}
+    tmp = path / "meta.tmp"
+    tmp.write_text(json.dumps(meta), encoding="utf-8")
+    tmp.replace(path / "meta.json")
+    for f in path.glob("*.npy"):
+        if not f.stem.endswith(f"-{version}"):
+            try:
+                f.unlink()
+            except OSError:
+                pass  # np. otwarte w innym procesie (Windows) – usuniemy przy następnej przebudowie
+    return len(df)
+
+
+def _read_meta(path: Path) -> dict:
+    f = Path(path) / "meta.json"
+    try:
+        return json.loads(f.read_text(encoding="utf-8")) if f.exists() else {}
+    except Exception:
+        return {}
+
+
+def ensure_index(path: Path, listings: list[Path], names: Path | None = None, complete: bool = False) -> "SymbolIndex":
+    """Open the index at `path`, rebuilding it first when a source file changed (or it does not exist).
+
+    listings: CSV files with Symbol, Name[, Currency] (a missing currency is
+    guessed from the suffix); names: the app's name cache, whose symbols are
+    added where the listings do not have them. `complete` marks the listings
+    as covering every tradable symbol.
+    """
+    path = Path(path)
+    listings = [Path(p) for p in listings if Path(p).exists()]
+    names = Path(names) if names is not None and Path(names).exists() else None
+    sources = [*listings, *([names] if names else [])]
+    meta = _read_meta(path)
+    stale = (
+        not meta
+        or meta.get("complete") != complete
+        or meta.get("sources") != [str(s) for s in sources]
+        or any(s.stat().st_mtime > meta.get("built", 0) for s in sources)
+    )
+    if stale:
+        # nazwy z Yahoo pierwsze: przy duplikatach wygrywa listing
+        frames = ([names_listing(names)] if names else []) + [read_listing(p) for p in listings]
+        listing = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SYMBOL_COLUMNS)
+        build_index(listing, path, complete=complete, sources=[str(s) for s in sources])
+    return SymbolIndex(path)
+
+
+class _NameView(Mapping):
+    """index.names: read-only symbol -> name mapping backed by the memory-mapped columns."""
+
+    def __init__(self, index: "SymbolIndex"):
+        self._index = index
+
+    def __getitem__(self, symbol: str) -> str:
+        i = self._index.row(symbol)
+        if i < 0:
+            raise KeyError(symbol)
+        return self._index.name(i)
+
+    def __contains__(self, symbol) -> bool:
+        return isinstance(symbol, str) and self._index.row(symbol) >= 0
+
+    def __iter__(self):
+        return (s.decode("utf-8") for s in self._index.symbol)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class SymbolIndex:
+    """Read-only symbol universe over memory-mapped .npy columns (see build_index).
+
+    Symbols are sorted, so exact and prefix lookups are binary searches on
+    the mapped array; name words have their own sorted token column. Only the
+    pages a lookup touches are read from disk. `complete` says whether the
+    listing claims to cover every tradable symbol.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        meta = _read_meta(self.path)
+        self.complete = bool(meta.get("complete", False))
+        self.built = float(meta.get("built", 0.0))
+        version = meta.get("version")
+
+        def load(key: str, dtype) -> np.ndarray:
+            if version is None:
+                return np.empty(0, dtype=dtype)
+            return np.load(self.path / f"{key}-{version}.npy", mmap_mode="r")
+
+        self.symbol = load("symbol", "S1")
+        self.currency = load("currency", "S1")
+        self.exchange = load("exchange", "S1")
+        self._offsets = load("name_offsets", np.int64)
+        self._names = load("names", np.uint8)
+        self._tokens = load("tokens", f"S{TOKEN_BYTES}")
+        self._token_rows = load("token_rows", np.int32)
+        self.names = _NameView(self)
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.row(symbol) >= 0
+
+    def row(self, symbol: str) -> int:
+        """Row of the symbol, -1 when it is not listed."""
+        key = symbol.strip().upper().encode("utf-8")
+        i = int(np.searchsorted(self.symbol, key))
+        return i if i < len(self.symbol) and self.symbol[i] == key else -1
+
+    def rows(self, symbols) -> np.ndarray:
+        """Vectorized row(): one searchsorted for the whole list."""
+        keys = pd.Series(symbols, dtype=object).astype(str).str.strip().str.upper().str.encode("utf-8").to_numpy()
+        if not len(self.symbol) or not len(keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        keys = keys.astype(f"S{max(self.symbol.itemsize, max(len(k) for k in keys))}")
+        i = np.minimum(np.searchsorted(self.symbol, keys), len(self.symbol) - 1)
+        return np.where(self.symbol[i] == keys, i, -1)
+
+    def name(self, i: int) -> str:
+        return bytes(self._names[self._offsets[i] : self._offsets[i + 1]]).decode("utf-8", errors="replace")
+
+    def get(self, symbol: str) -> dict | None:
+        i = self.row(symbol)
+        if i < 0:
+            return None
+        return {
+            "symbol": self.symbol[i].decode(),
+            "name": self.name(i),
+            "currency": self.currency[i].decode(),
+            "exchange": self.exchange[i].decode(),
+        }
+
+    def currency_hint(self, tickers: pd.Series) -> pd.Series:
+        """Listed currency per ticker, valuation.currency_hint (suffix guess) for the rest."""
+        rows = self.rows(tickers)
+        listed = pd.Series(
+            np.where(rows >= 0, self.currency[np.maximum(rows, 0)].astype(str) if len(self) else "", ""),
+            index=tickers.index,
+            dtype=object,
+        )
+        return listed.where(rows >= 0, currency_hint(tickers))
+
+    def unknown(self, tickers: list[str]) -> list[str]:
+        rows = self.rows(tickers)
+        return [t for t, r in zip(tickers, rows) if r < 0]
+
+    # ---------------- search
+    def _prefix_rows(self, column: np.ndarray, prefix: bytes, limit: int) -> np.ndarray:
+        lo = int(np.searchsorted(column, prefix, side="left"))
+        hi = int(np.searchsorted(column, prefix + b"\xff", side="left"))
+        return np.arange(lo, min(hi, lo + limit))
+
+    def frame(self, rows) -> pd.DataFrame:
+        rows = list(rows)
+        return pd.DataFrame(
+            {
+                "Symbol": [self.symbol[i].decode() for i in rows],
+                "Name": [self.name(i) for i in rows],
+                "Currency": [self.currency[i].decode() for i in rows],
+                "Exchange": [self.exchange[i].decode() for i in rows],
+            },
+            columns=SYMBOL_COLUMNS,
+        )
+
+    def search(self, query: str, limit: int = 10) -> pd.DataFrame:
+        """Symbols starting with the query, then names with a word starting with it, then close symbols."""
+        q = query.strip()
+        if not q or not len(self):
+            return pd.DataFrame(columns=SYMBOL_COLUMNS)
+        found = dict.fromkeys(self._prefix_rows(self.symbol, q.upper().encode("utf-8"), limit).tolist())
+        if len(found) < limit:
+            word = q.lower().split()[0].encode("utf-8")[:TOKEN_BYTES]
+            hits = self._prefix_rows(self._tokens, word, 4 * limit)
+            found.update(dict.fromkeys(self._token_rows[hits].tolist()))
+        if len(found) < limit:
+            found.update(dict.fromkeys(self._fuzzy_rows(q.upper(), limit)))
+        return self.frame(list(found)[:limit])
+
+    def _fuzzy_rows(self, q: str, limit: int) -> list[int]:
+        # kandydaci: ten sam pierwszy znak (literówki dalej w symbolu), porównanie difflib tylko na nich
+        rows = self._prefix_rows(self.symbol, q[:1].encode("utf-8"), len(self))
+        if len(rows) > FUZZY_CANDIDATES:
+            lengths = np.char.str_len(self.symbol[rows[0] : rows[-1] + 1])
+            rows = rows[np.abs(lengths - len(q)) <= 1][:FUZZY_CANDIDATES]
+        cand = {self.symbol[i].decode(): int(i) for i in rows}
+        return [cand[s] for s in difflib.get_close_matches(q, list(cand), n=limit, cutoff=FUZZY_CUTOFF)]
+
+    def suggest(self, symbol: str) -> str | None:
+        """Closest listed symbol for a mistyped one (None when nothing is close)."""
+        rows = self._fuzzy_rows(symbol.strip().upper(), 1) if len(self) else []
+        return self.symbol[rows[0]].decode() if rows else None
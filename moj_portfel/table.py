@@ -0,0 +1,235 @@
+# coding: utf-8
+import hashlib
+import html
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# HTML table: server-side sort + pagination, column-wise row building
+# Column order requested:
+# Name, Value Since Purchase (VPN) PLN, %, 1M, 1W, Ticker, Category, Currency, Qty, Buy, Price
+# ======================================================
+TABLE_STYLE = """
+  body { font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Arial; margin: 0; }
+  .table-wrap{
+    background:#fff; border:1px solid #e5e7eb; border-radius:16px;
+    box-shadow:0 10px 25px rgba(15,23,42,0.05);
+    padding:10px 10px 2px 10px; overflow-x:auto;
+  }
+  table{ width:100%; border-collapse:collapse; min-width: 980px; }
+  th{
+    text-align:left; font-size:0.85rem; color:#334155; background:#f8fafc;
+    border-bottom:1px solid #e5e7eb; padding:10px 10px; position:sticky; top:0;
+    white-space:nowrap;
+  }
+  td{
+    font-size:0.9rem; color:#0f172a; border-bottom:1px solid #eef2f7;
+    padding:10px 10px; white-space:nowrap; vertical-align:middle;
+  }
+  .muted{ color:#64748b; }
+  .right{ text-align:right; }
+  .pos{ color:#166534; font-weight:900; }
+  .neg{ color:#991b1b; font-weight:900; }
+  .badge{ display:inline-block; padding:3px 10px; border-radius:999px; font-size:0.82rem; font-weight:900; }
+  .up{ background:rgba(22,163,74,0.12); color:#166534; }
+  .down{ background:rgba(220,38,38,0.12); color:#991b1b; }
+  .flat{ background:rgba(100,116,139,0.14); color:#475569; }
+"""
+TABLE_HEAD = """
+<tr>
+  <th>Name</th>
+  <th class="right">Value Since Purchase (VPN) PLN</th>
+  <th class="right">%</th>
+  <th>1M</th>
+  <th>1W</th>
+  <th>Ticker</th>
+  <th>Category</th>
+  <th>Currency</th>
+  <th class="right">Qty</th>
+  <th class="right">Buy</th>
+  <th class="right">Price</th>
+</tr>
+"""
+
+# etykieta w UI -> kolumna do sortowania
+SORT_COLUMNS = {
+    "Name": "Name",
+    "VPN (PLN)": "PL_Value_PLN",
+    "%": "PL_Percent",
+    "Value (PLN)": "Value_PLN",
+    "Ticker": "Ticker",
+    "Category": "Category",
+    "Currency": "Currency",
+    "Qty": "Quantity",
+}
+
+TABLE_COLUMNS = [
+    "Name",
+    "PL_Value_PLN",
+    "PL_Percent",
+    "Trend1m",
+    "Trend1w",
+    "Ticker",
+    "Category",
+    "Currency",
+    "Quantity",
+    "PurchasePrice",
+    "Price",
+]
+
+BADGES = {
+    "up": '<span class="badge up">↑</span>',
+    "down": '<span class="badge down">↓</span>',
+    "flat": '<span class="badge flat">→</span>',
+}
+NO_BADGE = '<span class="badge flat">–</span>'
+
+PAGE_CACHE_SIZE = 64
+_page_cache: OrderedDict[str, np.ndarray] = OrderedDict()  # skrót treści strony -> komórki wierszy
+_page_lock = threading.Lock()  # cache wspólny dla wszystkich sesji
+
+
+def fmt_col(values: pd.Series, digits: int = 2) -> pd.Series:
+    """fmt_num for a whole column: thousands separators, '—' for NaN."""
+    out = pd.Series("—", index=values.index, dtype=object)
+    known = values.notna()
+    out[known] = values[known].astype(float).map(f"{{:,.{digits}f}}".format)
+    return out
+
+
+def text_col(values: pd.Series) -> pd.Series:
+    return values.astype(str).map(html.escape)
+
+
+def sort_view(view: pd.DataFrame, sort_by: str, ascending: bool) -> pd.DataFrame:
+    col = SORT_COLUMNS.get(sort_by)
+    if col is None or col not in view.columns:
+        return view
+    return view.sort_values(col, ascending=ascending, na_position="last", kind="stable")
+
+
+def page_count(n_rows: int, page_size: int) -> int:
+    return max(1, -(-n_rows // page_size))
+
+
+def row_cells(page: pd.DataFrame) -> pd.Series:
+    """Inner HTML (the <td> cells) of every row of the page."""
+    vpn = page["PL_Value_PLN"]
+    vpn_cls = pd.Series(
+        np.select([vpn.notna() & (vpn >= 0), vpn.notna()], ["pos", "neg"], default="muted"),
+        index=page.index,
+    )
+
+    return (
+        "<td>" + text_col(page["Name"]) + "</td>"
+        + '<td class="right ' + vpn_cls + '">' + fmt_col(vpn, 2) + "</td>"
+        + '<td class="right">' + fmt_col(page["PL_Percent"], 2) + "</td>"
+        + "<td>" + page["Trend1m"].map(BADGES).fillna(NO_BADGE) + "</td>"
+        + "<td>" + page["Trend1w"].map(BADGES).fillna(NO_BADGE) + "</td>"
+        + '<td class="muted">' + text_col(page["Ticker"]) + "</td>"
+        + "<td>" + text_col(page["Category"]) + "</td>"
+        + "<td>" + text_col(page["Currency"]) + "</td>"
+        + '<td class="right">' + fmt_col(page["Quantity"], 4) + "</td>"
+        + '<td class="right">' + fmt_col(page["PurchasePrice"], 4) + "</td>"
+        + '<td class="right">' + fmt_col(page["Price"], 4) + "</td>"
+    )
+
+
+def page_cells(page: pd.DataFrame) -> np.ndarray:
+    """row_cells of the page as an array, cached by a content hash of that page."""
+    if page.empty:
+        return np.empty(0, dtype=object)
+    digest = hashlib.blake2b(
+        pd.util.hash_pandas_object(page[TABLE_COLUMNS], index=False).to_numpy().tobytes(),
+        digest_size=16,
+    ).hexdigest()
+    with _page_lock:
+        if digest in _page_cache:
+            _page_cache.move_to_end(digest)
+            return _page_cache[digest]
+
+    cells = row_cells(page).to_numpy(dtype=object)
+    with _page_lock:
+        _page_cache[digest] = cells
+        if len(_page_cache) > PAGE_CACHE_SIZE:
+            _page_cache.popitem(last=False)
+    return cells
+
+
+# ======================================================
+# Live table (st.components.v2): DOM stays mounted, reruns push only the rows that changed
+# ======================================================
+LIVE_STYLE = TABLE_STYLE + """
+  .table-wrap{ max-height:760px; overflow:auto; }
+  @keyframes flash{ from{ background:#fef9c3; } to{ background:transparent; } }
+  tr.flash td{ animation:flash 1.5s ease-out; }
+"""
+
+LIVE_HTML = f"""
+<div class="table-wrap">
+  <table>
+    <thead>{TABLE_HEAD}</thead>
+    <tbody data-rev="0"></tbody>
+  </table>
+</div>
+"""
+
+# data: {rev, full} – cała strona, albo {rev, base, rows: [[nr wiersza, komórki], ...]} – łatka do wersji `base`
+LIVE_JS = """
+export default function (component) {
+  const { data, parentElement, setTriggerValue } = component;
+  const body = parentElement.querySelector("tbody");
+  if (!data || !body) return;
+  const rev = Number(body.dataset.rev);
+  if (data.rev === rev) return;
+  if (data.full !== undefined) {
+    body.innerHTML = data.full;
+  } else if (data.base === rev) {
+    for (const [i, cells] of data.rows) {
+      const tr = body.rows[i];
+      if (!tr) continue;
+      tr.innerHTML = cells;
+      tr.classList.remove("flash");
+      void tr.offsetWidth;  // restart animacji
+      tr.classList.add("flash");
+    }
+  } else {
+    setTriggerValue("resync", data.rev);  // ominięta łatka (np. po ponownym połączeniu) – poproś o całość
+    return;
+  }
+  body.dataset.rev = String(data.rev);
+}
+"""
+
+
+class TableFeed:
+    """Per-session diff of the rendered page for the live table.
+
+    The first push (and any push after the page's rows were reordered,
+    filtered or paged) carries the whole body; later pushes carry only
+    the rows whose cells changed, e.g. price, value or trend.
+    """
+
+    def __init__(self):
+        self.rev = 0
+        self._keys: list | None = None
+        self._cells = np.empty(0, dtype=object)
+
+    def reset(self):
+        """Next push sends the whole body (the browser lost the previous state)."""
+        self._keys = None
+
+    def push(self, page: pd.DataFrame) -> dict:
+        cells = page_cells(page)  # rerun bez zmian na stronie nie formatuje komórek od nowa
+        keys = page.index.tolist()
+        self.rev += 1
+        if keys != self._keys:
+            msg = {"rev": self.rev, "full": "\n".join("<tr>" + c + "</tr>" for c in cells)}
+        else:
+            changed = np.flatnonzero(cells != self._cells)
+            msg = {"rev": self.rev, "base": self.rev - 1, "rows": [[int(i), cells[i]] for i in changed]}
+        self._keys, self._cells = keys, cells
+        return msg
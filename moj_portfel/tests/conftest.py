@@ -0,0 +1,6 @@
+# coding: utf-8
+import sys
+from pathlib import Path
+
+# moduły aplikacji importują się płasko (jak w app.py uruchamianym z moj_portfel/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
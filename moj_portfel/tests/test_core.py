@@ -0,0 +1,28 @@
+# coding: utf-8
+from core import Pricer
+from price_store import PriceStore
+from providers import FakeProvider
+
+
+class FlakyProvider(FakeProvider):
+    """History downloads fail until `failures` runs out."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def download(self, symbols, **kwargs):
+        if "start" in kwargs and self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("offline")
+        return super().download(symbols, **kwargs)
+
+
+def test_anchors_are_retried_after_a_failed_download(tmp_path):
+    pricer = Pricer(FlakyProvider(failures=1), PriceStore(tmp_path / "history.sqlite"))
+
+    first = pricer.quotes(["AAPL"])
+    second = pricer.quotes(["AAPL"])
+
+    assert first[["First1m", "First1w"]].isna().all(axis=None)
+    assert second[["Price", "First1m", "First1w"]].notna().all(axis=None)
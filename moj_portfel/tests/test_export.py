@@ -0,0 +1,27 @@
+# coding: utf-8
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export
+from export import write_frame
+
+
+@pytest.mark.parametrize("engine", ["xlsxwriter", "openpyxl"])
+def test_xlsx_keeps_every_cell_across_chunks(monkeypatch, engine):
+    pytest.importorskip(engine)
+    pytest.importorskip("openpyxl")  # odczyt
+    if engine == "openpyxl":
+        monkeypatch.setattr(export, "_has", lambda module: module != "xlsxwriter")
+    monkeypatch.setattr(export, "EXPORT_CHUNK", 2)
+    df = pd.DataFrame(
+        {"Ticker": ["A", "B", "C", "D", "E"], "Quantity": [1, 2, 3, 4, 5], "Price": [1.5, np.nan, 3.25, 4.0, 5.125]}
+    )
+
+    out = io.BytesIO()
+    write_frame(df, "xlsx", out)
+    out.seek(0)
+
+    pd.testing.assert_frame_equal(pd.read_excel(out, sheet_name="Portfel"), df)
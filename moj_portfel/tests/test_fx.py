@@ -0,0 +1,23 @@
+# coding: utf-8
+from datetime import date
+
+import numpy as np
+
+from fake_market import FakeMarket
+from fx import FxCache
+
+
+def test_failed_refresh_keeps_last_good_rate():
+    market = FakeMarket(today=date(2024, 6, 3))
+    cache = FxCache(ttl=0)
+    good = cache.get(["USD"], lambda symbols: market.download(symbols, period="5d"))[0].loc["USD", "PLN"]
+
+    def offline(symbols):
+        raise ConnectionError("offline")
+
+    matrix, fetched = cache.get(["USD"], offline)
+
+    assert np.isfinite(good)
+    assert fetched == ["USD"]
+    assert matrix.loc["USD", "PLN"] == good
+    assert cache.stale(["USD"]) == ["USD"]  # następne przejście spróbuje znowu
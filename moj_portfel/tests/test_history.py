@@ -0,0 +1,38 @@
+# coding: utf-8
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from history import CloseMatrix, ValueHistory, sync
+
+START = date(2024, 1, 1)
+DAYS = pd.bdate_range("2024-01-01", periods=5)
+
+
+def test_new_symbol_after_read_resizes_matrix(tmp_path):
+    matrix = CloseMatrix(tmp_path, START)
+    history = ValueHistory(matrix)
+    positions = pd.DataFrame(
+        {"Ticker": ["A", "B"], "Quantity": [2.0, 3.0], "CurrencyHint": "PLN", "Account": "STANDARD", "Category": "STOCK"}
+    )
+
+    matrix.write(pd.DataFrame({"A": 10.0}, index=DAYS))
+    history.values(positions)  # odczyt mapuje plik z jedną kolumną
+    matrix.write(pd.DataFrame({"B": 20.0}, index=DAYS))
+
+    assert matrix.array().shape == (len(DAYS), 2)
+    values = history.values(positions)
+    assert np.allclose(values[("Account", "STANDARD")], 2 * 10.0 + 3 * 20.0)
+
+
+def test_failed_download_is_not_marked_synced(tmp_path):
+    matrix = CloseMatrix(tmp_path, START)
+    today = DAYS[-1].date()
+
+    sync(matrix, ["AAPL"], lambda symbols, start: pd.DataFrame(), today)  # paczka nie przyszła
+    assert matrix.synced == {}
+
+    sync(matrix, ["AAPL"], lambda symbols, start: pd.DataFrame({("AAPL", "Close"): 100.0}, index=DAYS), today)
+    assert matrix.rows == len(DAYS)
+    assert matrix.synced == {"AAPL": today.isoformat()}
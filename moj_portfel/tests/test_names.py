@@ -0,0 +1,37 @@
+# coding: utf-8
+import time
+
+import pytest
+
+from download import request_timeout, shared_session
+from names import NameResolver
+
+
+def test_queued_lookups_do_not_expire(tmp_path):
+    def lookup(ticker):
+        time.sleep(0.05)
+        return {"name": f"Spółka {ticker}"}
+
+    # jeden worker, 6 zapytań po 50 ms: ostatnie czeka w kolejce dłużej niż timeout
+    resolver = NameResolver(tmp_path / "names.json", lookup, workers=1, timeout=0.2)
+    tickers = [f"T{i}" for i in range(6)]
+    resolver.names(tickers)
+
+    deadline = time.monotonic() + 5
+    while resolver.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert resolver.names(tickers) == {t: f"Spółka {t}" for t in tickers}
+
+
+def test_request_timeout_caps_the_session(monkeypatch):
+    curl_requests = pytest.importorskip("curl_cffi.requests")
+    seen = []
+    monkeypatch.setattr(curl_requests.Session, "request", lambda self, *a, **kw: seen.append(kw.get("timeout")))
+    session = shared_session()
+
+    session.get("https://example.invalid", timeout=30)
+    with request_timeout(5.0):
+        session.get("https://example.invalid", timeout=30)
+
+    assert seen == [30, 5.0]
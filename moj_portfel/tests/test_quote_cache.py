@@ -0,0 +1,14 @@
+# coding: utf-8
+import pandas as pd
+
+from quote_cache import QuoteCache
+from valuation import classify_trend
+
+
+def test_unchanged_price_is_flat():
+    cache = QuoteCache()
+    quotes = pd.DataFrame({"Ticker": ["A", "B"], "Price": [123.45, 0.1], "First1m": [123.45, 0.1], "First1w": [123.45, 0.1]})
+    frame = cache.get(["A", "B"], lambda tickers: quotes)[0].frame
+
+    assert classify_trend(frame["Price"], frame["First1m"]).tolist() == ["flat", "flat"]
+    assert classify_trend(frame["Price"], frame["First1w"]).tolist() == ["flat", "flat"]
@@ -0,0 +1,26 @@
+# coding: utf-8
+import pandas as pd
+
+from rebalance import rebalance
+
+
+def test_buys_never_exceed_cash_when_funding_sells_are_below_minimum():
+    # trzy koszyki po 10 000 PLN, cele przesunięte o ±70 PLN: sprzedaże poniżej MIN_TRADE, zakup powyżej
+    df = pd.DataFrame(
+        {
+            "Ticker": ["AAPL", "BTC-USD", "C.WA"],
+            "Name": ["A", "B", "C"],
+            "Account": "STANDARD",
+            "Quantity": [100.0, 1.0, 100.0],
+            "Price": [25.0, 2500.0, 100.0],
+            "Currency": ["USD", "USD", "PLN"],
+            "Value_PLN": [10000.0] * 3,
+        }
+    )
+    targets = pd.DataFrame({"Class": ["STOCK", "CRYPTO", "STOCK"], "Currency": ["USD", "USD", "PLN"], "Weight": [9930.0, 9930.0, 10140.0]})
+    accounts = pd.DataFrame({"Account": ["STANDARD"], "Cash_PLN": [0.0], "AllowSells": [True]})
+
+    trades, _ = rebalance(df, targets, accounts)
+
+    signed = trades["Value_PLN"].where(trades["Side"] == "BUY", -trades["Value_PLN"])
+    assert signed.sum() <= 1e-6
@@ -0,0 +1,30 @@
+# coding: utf-8
+import pandas as pd
+
+from alerts import AlertEngine
+from scheduler import Refresher
+
+
+def test_alerts_evaluated_after_each_pass(tmp_path):
+    engine = AlertEngine(tmp_path / "alerts.json", tmp_path / "alerts.jsonl")
+    engine.set_rules(pd.DataFrame([{"Ticker": "A", "Field": "Price", "Op": "above", "Threshold": 10.0}]))
+    prices = iter([9.0, 11.0])
+
+    def evaluate(portfolios):
+        price = next(prices)
+        for positions, _ in portfolios:
+            engine.evaluate(
+                positions.assign(
+                    Price=price, PurchaseValue_PLN=1.0, PL_Value_PLN=0.0, Trend1w="flat", Trend1m="flat"
+                )
+            )
+
+    refresher = Refresher(lambda tickers: None, lambda currencies: None, on_refresh=evaluate)
+    refresher.register(["A"], ["PLN"], pd.DataFrame({"Ticker": ["A"]}))
+    seen = engine.seq
+    refresher.run_once()  # 9 < 10: reguła się uzbraja
+    refresher.run_once()  # 11 > 10: przejście, bez żadnej otwartej sesji
+
+    fired, seq = engine.since(seen)
+    assert fired["Ticker"].tolist() == ["A"] and fired["Value"].tolist() == [11.0]
+    assert engine.since(seq)[0].empty
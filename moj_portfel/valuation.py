@@ -0,0 +1,92 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# Vectorized valuation (no row-wise apply)
+# ======================================================
+# sufiks tickera -> waluta notowań
+SUFFIX_CURRENCY = {
+    "-USD": "USD",
+    ".WA": "PLN",
+    ".PL": "PLN",
+    ".DE": "EUR",
+    ".F": "EUR",
+    ".AS": "EUR",
+    ".PA": "EUR",
+    ".MI": "EUR",
+    ".BR": "EUR",
+    ".MC": "EUR",
+    ".VI": "EUR",
+    ".HE": "EUR",
+    ".LS": "EUR",
+    ".L": "GBp",
+    ".SW": "CHF",
+    ".ST": "SEK",
+    ".CO": "DKK",
+    ".OL": "NOK",
+    ".PR": "CZK",
+    ".BD": "HUF",
+    ".T": "JPY",
+    ".HK": "HKD",
+    ".TO": "CAD",
+    ".AX": "AUD",
+}
+DEFAULT_CURRENCY = "USD"
+
+
+def currency_hint(tickers: pd.Series) -> pd.Series:
+    t = tickers.astype(str).str.upper()
+    out = pd.Series(DEFAULT_CURRENCY, index=tickers.index, dtype=object)
+    for suffix, curr in SUFFIX_CURRENCY.items():
+        out[t.str.endswith(suffix)] = curr
+    return out
+
+
+def category(tickers: pd.Series, accounts: pd.Series) -> pd.Series:
+    cat = np.select(
+        [accounts.isin(["IKE", "IKZE"]).to_numpy(), tickers.astype(str).str.endswith("-USD").to_numpy()],
+        [accounts.to_numpy(dtype=object), "CRYPTO"],
+        default="STOCK",
+    )
+    return pd.Series(cat, index=tickers.index, dtype=object)
+
+
+def classify_trend(price: pd.Series, first: pd.Series) -> pd.Series:
+    """'up' / 'down' / 'flat', None when either side is missing or first == 0."""
+    p = price.to_numpy(dtype=float)
+    f = first.to_numpy(dtype=float)
+    known = ~np.isnan(p) & ~np.isnan(f) & (f != 0)
+    trend = np.select(
+        [known & (p > f), known & (p < f), known],
+        ["up", "down", "flat"],
+        default=None,
+    )
+    return pd.Series(trend, index=price.index, dtype=object)
+
+
+def fx_vector(currencies: pd.Series, fx_to_pln: dict[str, float | None]) -> np.ndarray:
+    """Rate to PLN aligned with the rows; NaN for unknown currencies or missing quotes."""
+    rates = {"PLN": 1.0, **{c: np.nan if r is None else float(r) for c, r in fx_to_pln.items()}}
+    return currencies.map(rates).to_numpy(dtype=float, na_value=np.nan)
+
+
+def value_positions(df: pd.DataFrame, fx_to_pln: dict[str, float | None]) -> pd.DataFrame:
+    """Adds Trend1m/1w, Value_PLN, PurchaseValue_PLN and P/L columns to the merged frame.
+
+    Expects Ticker, Quantity, PurchasePrice, Currency, Price, First1m, First1w.
+    """
+    df = df.copy()
+    df["Trend1m"] = classify_trend(df["Price"], df["First1m"])
+    df["Trend1w"] = classify_trend(df["Price"], df["First1w"])
+
+    rate = fx_vector(df["Currency"], fx_to_pln)
+    qty = df["Quantity"].to_numpy(dtype=float)
+    df["Value_PLN"] = df["Price"].to_numpy(dtype=float) * qty * rate
+    df["PurchaseValue_PLN"] = df["PurchasePrice"].to_numpy(dtype=float) * qty * rate
+
+    df["PL_Value_PLN"] = df["Value_PLN"] - df["PurchaseValue_PLN"]
+    purchase = df["PurchaseValue_PLN"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["PL_Percent"] = np.where(purchase > 0, df["PL_Value_PLN"].to_numpy() / purchase * 100, np.nan)
+    return df